@@ -0,0 +1,278 @@
+"""Rules that flag overlapping entries, weekly overtime and sessions left open.
+
+Findings are rows of the alert table, one per (kind, key). Rules run on
+what just changed and never rescan history, and they run in a
+check_alerts job rather than in the request that made the change:
+
+- A commit that touches time entries queues the touched (employee_id,
+  date) pairs. The overlap rule reads that employee's entries from the
+  day before to the day after and compares their started_at/ended_at
+  instants. The overtime rule sums the touched weeks from
+  employee_weekly_total.
+- A clock-out that closes a session older than ALERT_OPEN_SESSION_HOURS
+  flags it as left open.
+- sweep_open_sessions() runs every ALERT_SWEEP_SECONDS in the job
+  supervisor (or by ``flask sweep-sessions``). It flags sessions open
+  longer than ALERT_OPEN_SESSION_HOURS and closes those open longer than
+  SESSION_AUTO_CLOSE_HOURS. An auto-closed session is recorded as ending
+  ALERT_OPEN_SESSION_HOURS after its start and stays pending approval.
+
+The importer and the duration backfill write entries with Core
+statements and report them with commit_hooks.entries_written(), which
+queues the same job. Re-evaluating a scope updates its findings in
+place and resolves the ones that no longer hold. An alert an admin
+resolved stays resolved.
+"""
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, func, and_, tuple_, bindparam
+from sqlalchemy.exc import IntegrityError
+from app import db
+from durations import as_utc, local_date, utc_now
+from jobs import periodic, job_kind, enqueue
+from models import Alert, ActiveSession, Employee, TimeEntry, EmployeeWeeklyTotal, week_start
+from commit_hooks import on_change
+
+logger = logging.getLogger(__name__)
+
+_alerts = Alert.__table__
+
+# Employees (or employee weeks) per IN (...) list
+ALERT_CHUNK_SIZE = 400
+
+def settings_from_env():
+    """Alert rule app.config values read from the environment"""
+    return {
+        'ALERT_OVERTIME_HOURS': float(os.environ.get('ALERT_OVERTIME_HOURS', 40)),
+        'ALERT_OPEN_SESSION_HOURS': float(os.environ.get('ALERT_OPEN_SESSION_HOURS', 12)),
+        # 0 only flags forgotten sessions and never closes them
+        'SESSION_AUTO_CLOSE_HOURS': float(os.environ.get('SESSION_AUTO_CLOSE_HOURS', 24)),
+        'ALERT_SWEEP_SECONDS': float(os.environ.get('ALERT_SWEEP_SECONDS', 300)),
+    }
+
+
+def _reconcile(conn, kind, findings, scope=None):
+    """Make the alerts of ``kind`` match ``findings`` ({key: column values}).
+
+    New findings are inserted, known ones updated, and ones the rules
+    resolved earlier reopened. Open alerts matching ``scope`` that are no
+    longer found are resolved. Returns the number of new alerts.
+    """
+    now = datetime.utcnow()
+    existing = {}
+    keys = list(findings)
+    for i in range(0, len(keys), ALERT_CHUNK_SIZE):
+        query = select(_alerts.c.id, _alerts.c.key, _alerts.c.resolved_at, _alerts.c.resolved_by)\
+            .where(_alerts.c.kind == kind, _alerts.c.key.in_(keys[i:i + ALERT_CHUNK_SIZE]))
+        existing.update((row.key, row) for row in conn.execute(query))
+    stale = []
+    if scope is not None:
+        open_in_scope = conn.execute(select(_alerts.c.id, _alerts.c.key)
+                                     .where(_alerts.c.kind == kind, _alerts.c.resolved_at.is_(None), scope))
+        stale = [{'alert_id': alert_id} for alert_id, key in open_in_scope if key not in findings]
+
+    inserts, updates = [], []
+    for key, values in findings.items():
+        row = existing.get(key)
+        if row is None:
+            inserts.append(dict(values, kind=kind, key=key, created_at=now, updated_at=now))
+        elif row.resolved_by is None:
+            updates.append(dict(values, alert_id=row.id, updated_at=now, resolved_at=None))
+    if inserts:
+        conn.execute(_alerts.insert(), inserts)
+    if updates:
+        conn.execute(_alerts.update().where(_alerts.c.id == bindparam('alert_id')), updates)
+    if stale:
+        conn.execute(_alerts.update().where(_alerts.c.id == bindparam('alert_id'))
+                     .values(resolved_at=now, updated_at=now), stale)
+    return len(inserts)
+
+
+def _overlap_findings(conn, employee_ids, first_day, last_day):
+    """Overlapping pairs among the employees' entries whose later entry is dated in [first_day, last_day]"""
+    live = TimeEntry.__table__
+    rows = conn.execute(select(live.c.id, live.c.employee_id, live.c.date, live.c.started_at, live.c.ended_at)
+                        .where(live.c.employee_id.in_(employee_ids),
+                               live.c.date >= first_day - timedelta(days=1), live.c.date <= last_day,
+                               live.c.started_at.isnot(None))
+                        .order_by(live.c.employee_id, live.c.started_at, live.c.id)).all()
+    findings = {}
+    latest = {}  # employee_id -> the entry ending last so far
+    for row in rows:
+        previous = latest.get(row.employee_id)
+        if previous is not None and previous.ended_at > row.started_at and row.date >= first_day:
+            overlap = (min(previous.ended_at, row.ended_at) - row.started_at).total_seconds() / 3600
+            findings[f"{previous.id}:{row.id}"] = {
+                'employee_id': row.employee_id, 'date': row.date, 'entry_id': row.id,
+                'hours': round(overlap, 2),
+                'message': f"Entry {row.id} overlaps entry {previous.id} by {overlap:.2f}h",
+            }
+        if previous is None or row.ended_at > previous.ended_at:
+            latest[row.employee_id] = row
+    return findings
+
+
+def _overtime_findings(conn, weeks, threshold):
+    weekly = EmployeeWeeklyTotal.__table__
+    rows = conn.execute(select(weekly.c.employee_id, weekly.c.week_start, func.sum(weekly.c.hours))
+                        .where(tuple_(weekly.c.employee_id, weekly.c.week_start).in_(weeks))
+                        .group_by(weekly.c.employee_id, weekly.c.week_start))
+    return {
+        f"{employee_id}:{week.isoformat()}": {
+            'employee_id': employee_id, 'date': week, 'entry_id': None, 'hours': round(hours, 2),
+            'message': f"{hours:.2f}h in the week of {week.isoformat()}, over {threshold:g}h",
+        }
+        for employee_id, week, hours in rows if hours > threshold
+    }
+
+
+def check_entries(changes):
+    """Re-evaluate the entry rules for the (employee_id, date) pairs in ``changes``.
+
+    Runs in its own transaction; returns the number of new alerts.
+    """
+    days_by_employee = defaultdict(set)
+    for employee_id, day in changes:
+        if employee_id is not None and day is not None:
+            days_by_employee[employee_id].add(day)
+    if not days_by_employee:
+        return 0
+    threshold = current_app.config['ALERT_OVERTIME_HOURS']
+    employee_ids = sorted(days_by_employee)
+    weeks = sorted({(employee_id, week_start(day))
+                    for employee_id, days in days_by_employee.items() for day in days})
+    created = 0
+    with db.engine.begin() as conn:
+        for i in range(0, len(employee_ids), ALERT_CHUNK_SIZE):
+            chunk = employee_ids[i:i + ALERT_CHUNK_SIZE]
+            days = set().union(*(days_by_employee[employee_id] for employee_id in chunk))
+            # The day after a touched day can gain or lose an overlap with it
+            first_day, last_day = min(days), max(days) + timedelta(days=1)
+            findings = _overlap_findings(conn, chunk, first_day, last_day)
+            created += _reconcile(conn, Alert.OVERLAP, findings, and_(
+                _alerts.c.employee_id.in_(chunk), _alerts.c.date >= first_day, _alerts.c.date <= last_day))
+        for i in range(0, len(weeks), ALERT_CHUNK_SIZE):
+            chunk = weeks[i:i + ALERT_CHUNK_SIZE]
+            created += _reconcile(conn, Alert.OVERTIME, _overtime_findings(conn, chunk, threshold),
+                                  tuple_(_alerts.c.employee_id, _alerts.c.date).in_(chunk))
+    return created
+
+
+def _open_session_finding(session_id, employee_id, start_time, age_hours):
+    return {f"{session_id}": {
+        'employee_id': employee_id, 'date': local_date(start_time), 'entry_id': None,
+        'hours': round(age_hours, 2), 'message': f"Session open for {age_hours:.1f}h",
+    }}
+
+
+def check_closed_sessions(sessions, closed_at=None):
+    """Flag sessions, given as (id, employee_id, start_time) of ones closed at ``closed_at``, that were open too long"""
+    limit = current_app.config['ALERT_OPEN_SESSION_HOURS']
+    now = as_utc(closed_at) if closed_at else utc_now()
+    findings = {}
+    for session_id, employee_id, start_time in sessions:
+        age = (now - as_utc(start_time)).total_seconds() / 3600
+        if age > limit:
+            findings.update(_open_session_finding(session_id, employee_id, start_time, age))
+    if not findings:
+        return 0
+    with db.engine.begin() as conn:
+        return _reconcile(conn, Alert.OPEN_SESSION, findings)
+
+
+@periodic('ALERT_SWEEP_SECONDS')
+def sweep_open_sessions():
+    """Flag sessions open longer than ALERT_OPEN_SESSION_HOURS and close those past SESSION_AUTO_CLOSE_HOURS.
+
+    Returns {'flagged': new alerts, 'closed': sessions closed}.
+    """
+    from timeclock import clock_out, PunchError
+    from session_registry import active_sessions
+    config = current_app.config
+    limit = config['ALERT_OPEN_SESSION_HOURS']
+    auto_close = config['SESSION_AUTO_CLOSE_HOURS']
+    now = utc_now()
+    # active_session start times are naive UTC
+    rows = db.session.execute(select(ActiveSession.id, ActiveSession.employee_id, ActiveSession.start_time)
+                              .where(ActiveSession.start_time < now.replace(tzinfo=None) - timedelta(hours=limit))
+                              ).all()
+    db.session.rollback()
+    findings = {}
+    for session_id, employee_id, start_time in rows:
+        age = (now - as_utc(start_time)).total_seconds() / 3600
+        findings.update(_open_session_finding(session_id, employee_id, start_time, age))
+    with db.engine.begin() as conn:
+        flagged = _reconcile(conn, Alert.OPEN_SESSION, findings)
+
+    closed = 0
+    overdue = [row for row in rows if auto_close and as_utc(row.start_time) < now - timedelta(hours=auto_close)]
+    if overdue:
+        # Another worker may have opened these, so make sure this registry knows them
+        active_sessions.rebuild()
+    for session_id, employee_id, start_time in overdue:
+        employee = db.session.get(Employee, employee_id)
+        try:
+            result = clock_out(employee, end_time=start_time + timedelta(hours=min(limit, auto_close)))
+        except PunchError:
+            # Closed meanwhile by the employee or another worker
+            db.session.rollback()
+            continue
+        except Exception:
+            db.session.rollback()
+            logger.exception("Could not auto-close session %s", session_id)
+            continue
+        closed += 1
+        with db.engine.begin() as conn:
+            flagged += _reconcile(conn, Alert.AUTO_CLOSED, {f"{session_id}": {
+                'employee_id': employee_id, 'date': local_date(start_time), 'entry_id': result['entry_id'],
+                'hours': result['hours_worked'],
+                'message': f"Closed after {auto_close:g}h open and recorded as {result['hours_worked']}h",
+            }})
+    if flagged or closed:
+        logger.info("Open session sweep: %s new alert(s), %s session(s) closed", flagged, closed)
+    return {'flagged': flagged, 'closed': closed}
+
+
+def open_alerts():
+    """Unresolved alerts, newest first"""
+    return Alert.query.filter(Alert.resolved_at.is_(None)).order_by(Alert.id.desc())
+
+
+def resolve(alert, employee):
+    alert.resolved_at = datetime.utcnow()
+    alert.resolved_by = employee.id
+
+
+@on_change
+def _queue_checks(changes):
+    """Hand what a commit changed to a check_alerts job, keeping the rules off the punch path"""
+    if not changes.entries and not changes.closed_sessions:
+        return
+    enqueue('check_alerts', {
+        'entries': sorted((employee_id, day.isoformat()) for employee_id, day in changes.entries
+                          if employee_id is not None and day is not None),
+        'sessions': [(session_id, employee_id, start_time.isoformat())
+                     for session_id, employee_id, start_time in changes.closed_sessions],
+        'closed_at': utc_now().isoformat(),
+    })
+
+
+@job_kind('check_alerts', 'Alert rules', internal=True)
+def run_checks(context, params):
+    """Re-evaluate the rules for the entries and closed sessions of one commit"""
+    entries = [(employee_id, date.fromisoformat(day)) for employee_id, day in params.get('entries', ())]
+    sessions = [(session_id, employee_id, datetime.fromisoformat(start_time))
+                for session_id, employee_id, start_time in params.get('sessions', ())]
+    created = 0
+    try:
+        if entries:
+            created += check_entries(entries)
+        if sessions:
+            created += check_closed_sessions(sessions, datetime.fromisoformat(params['closed_at']))
+    except IntegrityError:
+        # Another worker recorded the same finding first
+        logger.info("Alert already recorded by another worker")
+    return {'created': created}
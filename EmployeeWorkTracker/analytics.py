@@ -0,0 +1,252 @@
+"""Department, project and overtime analytics over long ranges of time entries.
+
+Everything is read from employee_weekly_total, which holds one row per
+employee, week and project instead of one per entry. Each figure is one
+grouped query that the database evaluates in a single pass. No entries are
+loaded into Python, only the finished pivot cells:
+
+- department x period hours: week order along a covering index, one
+  CASE-summed column per department (a grouped join past
+  PIVOT_DEPARTMENT_LIMIT departments)
+- project x period hours: week order along the (week_start, project)
+  covering index
+- overtime: weekly hours per employee above the threshold, grouped along
+  the unique (employee_id, week_start, project) index. Only the
+  employee-weeks over the threshold are returned.
+- utilization: department hours against STANDARD_WEEK_HOURS for every
+  active employee hired by the end of the week. No termination dates are
+  recorded, so deactivated employees count toward hours but not capacity.
+
+Ranges cover whole weeks, Monday to Sunday. A 'month' period groups
+weeks by the month their Monday falls in.
+"""
+import heapq
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import func, case
+from app import db
+from models import Employee, EmployeeWeeklyTotal, week_start
+
+PERIODS = ('week', 'month')
+
+OVERTIME_WEEKLY_HOURS = 40.0
+STANDARD_WEEK_HOURS = 40.0
+TOP_OVERTIME_EMPLOYEES = 10
+
+# More departments than this are pivoted with a grouped join instead of CASE columns
+PIVOT_DEPARTMENT_LIMIT = 32
+
+UNASSIGNED = 'Unassigned'
+NO_PROJECT = 'No project'
+
+_weekly = EmployeeWeeklyTotal
+
+
+def _weeks(first, last):
+    weeks = []
+    while first <= last:
+        weeks.append(first)
+        first += timedelta(days=7)
+    return weeks
+
+
+def _percent(part, whole):
+    return round(part / whole * 100, 1) if whole else None
+
+
+class _Periods:
+    """Maps each week of the range to the column of its period"""
+
+    def __init__(self, weeks, period):
+        self.labels = []
+        self.column = {}
+        for week in weeks:
+            label = week.isoformat() if period == 'week' else week.strftime('%Y-%m')
+            if not self.labels or self.labels[-1] != label:
+                self.labels.append(label)
+            self.column[week] = len(self.labels) - 1
+
+    def row(self):
+        return [0.0] * len(self.labels)
+
+
+def _department_hours(first, last, periods):
+    """{department: [hours per period]}"""
+    in_range = _weekly.week_start.between(first, last)
+    departments = [name for name, in db.session.query(Employee.department).distinct() if name]
+    hours = defaultdict(periods.row)
+
+    if len(departments) <= PIVOT_DEPARTMENT_LIMIT:
+        columns = [func.sum(case((Employee.department == name, _weekly.hours), else_=0.0))
+                   for name in departments]
+        rows = db.session.query(_weekly.week_start, func.sum(_weekly.hours), *columns)\
+            .join(Employee, Employee.id == _weekly.employee_id)\
+            .filter(in_range).group_by(_weekly.week_start)
+        for week, total, *by_department in rows:
+            column = periods.column[week]
+            for name, value in zip(departments, by_department):
+                hours[name][column] += value or 0.0
+            unassigned = (total or 0.0) - sum(value or 0.0 for value in by_department)
+            if unassigned > 0.005:
+                hours[UNASSIGNED][column] += unassigned
+    else:
+        rows = db.session.query(_weekly.week_start, Employee.department, func.sum(_weekly.hours))\
+            .join(Employee, Employee.id == _weekly.employee_id)\
+            .filter(in_range).group_by(_weekly.week_start, Employee.department)
+        for week, name, value in rows:
+            hours[name or UNASSIGNED][periods.column[week]] += value or 0.0
+    return hours
+
+
+def _project_hours(first, last, periods):
+    """{project: ([hours per period], entries)}"""
+    rows = db.session.query(_weekly.week_start, _weekly.project,
+                            func.sum(_weekly.hours), func.sum(_weekly.entries_count))\
+        .filter(_weekly.week_start.between(first, last))\
+        .group_by(_weekly.week_start, _weekly.project)
+    projects = defaultdict(lambda: [periods.row(), 0])
+    for week, name, value, entries in rows:
+        project = projects[name or NO_PROJECT]
+        project[0][periods.column[week]] += value or 0.0
+        project[1] += entries or 0
+    return projects
+
+
+def _overtime_weeks(first, last, threshold):
+    """(employee_id, week_start, hours) for every employee-week above ``threshold``"""
+    weekly_hours = func.sum(_weekly.hours)
+    return db.session.query(_weekly.employee_id, _weekly.week_start, weekly_hours)\
+        .filter(_weekly.week_start.between(first, last))\
+        .group_by(_weekly.employee_id, _weekly.week_start)\
+        .having(weekly_hours > threshold).all()
+
+
+def _capacity(weeks, periods, standard_week_hours):
+    """{department: ([capacity hours per period], current headcount)} of active employees"""
+    hired = defaultdict(list)
+    rows = db.session.query(Employee.department, Employee.hire_date, func.count(Employee.id))\
+        .filter(Employee.is_active.is_(True))\
+        .group_by(Employee.department, Employee.hire_date)
+    for name, hire_date, count in rows:
+        hired[name or UNASSIGNED].append((hire_date or date.min, count))
+
+    capacity = {}
+    for name, hires in hired.items():
+        hires.sort()
+        dates = [hire_date for hire_date, _ in hires]
+        running = []
+        total = 0
+        for _, count in hires:
+            total += count
+            running.append(total)
+        row = periods.row()
+        for week in weeks:
+            index = bisect_right(dates, week + timedelta(days=6))
+            headcount = running[index - 1] if index else 0
+            row[periods.column[week]] += headcount * standard_week_hours
+        capacity[name] = (row, total)
+    return capacity
+
+
+def build_report(start, end, period='week', overtime_hours=OVERTIME_WEEKLY_HOURS,
+                 standard_week_hours=STANDARD_WEEK_HOURS, top=TOP_OVERTIME_EMPLOYEES):
+    """Department, project, utilization and overtime figures for the weeks touching [start, end].
+
+    Returns a JSON-serializable dict. Hours are rounded to 2 decimals and
+    percentages to 1.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {PERIODS}")
+    first, last = week_start(start), week_start(end)
+    weeks = _weeks(first, last)
+    periods = _Periods(weeks, period)
+
+    department_hours = _department_hours(first, last, periods)
+    project_hours = _project_hours(first, last, periods)
+    capacity = _capacity(weeks, periods, standard_week_hours)
+    overtime_rows = _overtime_weeks(first, last, overtime_hours)
+
+    # Overtime per employee, department and period
+    department_of = {}
+    if overtime_rows:
+        department_of = dict(db.session.query(Employee.id, Employee.department))
+    employee_overtime = defaultdict(lambda: [0.0, 0])
+    department_overtime = defaultdict(lambda: [0.0, 0])
+    overtime_by_period = periods.row()
+    for employee_id, week, hours in overtime_rows:
+        extra = hours - overtime_hours
+        employee_overtime[employee_id][0] += extra
+        employee_overtime[employee_id][1] += 1
+        department = department_of.get(employee_id) or UNASSIGNED
+        department_overtime[department][0] += extra
+        department_overtime[department][1] += 1
+        overtime_by_period[periods.column[week]] += extra
+
+    top_ids = heapq.nlargest(top, employee_overtime, key=lambda employee_id: employee_overtime[employee_id][0])
+    names = {}
+    if top_ids:
+        names = {row.id: row for row in db.session.query(
+            Employee.id, Employee.employee_id, Employee.first_name, Employee.last_name, Employee.department
+        ).filter(Employee.id.in_(top_ids))}
+
+    departments = []
+    for name in sorted(set(department_hours) | set(capacity)):
+        hours = department_hours.get(name) or periods.row()
+        capacity_row, headcount = capacity.get(name, (periods.row(), 0))
+        overtime, overtime_weeks = department_overtime.get(name, (0.0, 0))
+        departments.append({
+            'department': name,
+            'headcount': headcount,
+            'hours': [round(value, 2) for value in hours],
+            'total_hours': round(sum(hours), 2),
+            'capacity_hours': round(sum(capacity_row), 2),
+            'utilization': [_percent(value, cap) for value, cap in zip(hours, capacity_row)],
+            'total_utilization': _percent(sum(hours), sum(capacity_row)),
+            'overtime_hours': round(overtime, 2),
+            'overtime_employee_weeks': overtime_weeks,
+        })
+
+    total_hours = sum(department['total_hours'] for department in departments)
+    total_capacity = sum(department['capacity_hours'] for department in departments)
+    projects = [
+        {
+            'project': name,
+            'hours': [round(value, 2) for value in hours],
+            'total_hours': round(sum(hours), 2),
+            'entries': entries,
+            'share': _percent(sum(hours), total_hours),
+        }
+        for name, (hours, entries) in sorted(project_hours.items(), key=lambda item: -sum(item[1][0]))
+    ]
+
+    return {
+        'start': first.isoformat(),
+        'end': (last + timedelta(days=6)).isoformat(),
+        'period': period,
+        'periods': periods.labels,
+        'thresholds': {'overtime_weekly_hours': overtime_hours, 'standard_week_hours': standard_week_hours},
+        'totals': {
+            'hours': round(total_hours, 2),
+            'entries': sum(project['entries'] for project in projects),
+            'capacity_hours': round(total_capacity, 2),
+            'utilization': _percent(total_hours, total_capacity),
+            'overtime_hours': round(sum(overtime_by_period), 2),
+            'overtime_employee_weeks': len(overtime_rows),
+        },
+        'departments': departments,
+        'projects': projects,
+        'overtime': {
+            'by_period': [round(value, 2) for value in overtime_by_period],
+            'top_employees': [
+                {
+                    'employee_id': names[employee_id].employee_id,
+                    'name': f"{names[employee_id].first_name} {names[employee_id].last_name}",
+                    'department': names[employee_id].department,
+                    'overtime_hours': round(employee_overtime[employee_id][0], 2),
+                    'weeks': employee_overtime[employee_id][1],
+                }
+                for employee_id in top_ids if employee_id in names
+            ],
+        },
+    }
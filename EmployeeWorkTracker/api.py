@@ -0,0 +1,278 @@
+"""JSON API for kiosks, badge readers and other devices.
+
+Requests authenticate with ``Authorization: Bearer <token>`` (see
+ApiToken) and no session cookie, templates or redirects are involved, so
+a punch is a token lookup, an employee lookup and one commit. A device
+token may punch for any active employee by code; a token issued to an
+employee only acts for that employee.
+
+Endpoints under /api/v1:
+    POST /sessions/start        {"employee_id", "project", "description", "at"}
+    POST /sessions/stop         {"employee_id", "at"}
+    POST /entries               manual entry, same fields as the importer
+    GET  /employees/<code>/totals
+    POST /punches               {"punches": [{"employee_id", "action": "in"|"out", "at", ...}]}
+
+Timestamps are ISO 8601; values without an offset are taken as UTC.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from flask import Blueprint, request, jsonify, g
+from app import db
+from models import Employee, TimeEntry, ApiToken, HoursRollup
+from query_budget import query_budget
+from session_registry import active_sessions
+from importer import parse_record, ImportRowError
+from durations import as_utc
+from timeclock import clock_in, clock_out, PunchError
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Punches accepted in one /punches request
+MAX_BATCH_PUNCHES = 500
+
+# How far ahead of the server clock a device timestamp may be
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+# last_used_at is refreshed at most this often, not written on every punch
+LAST_USED_RESOLUTION = timedelta(minutes=5)
+
+ApiClient = namedtuple('ApiClient', 'token_id name employee_id')
+
+
+class ApiError(Exception):
+    def __init__(self, code, message, status=400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+@api.errorhandler(ApiError)
+def handle_api_error(e):
+    return jsonify(error=e.code, message=e.message), e.status
+
+
+def token_required(view):
+    """Authenticate the request with a bearer token and set g.api_client"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        scheme, _, raw_token = request.headers.get('Authorization', '').partition(' ')
+        token = ApiToken.find_active(raw_token.strip()) if scheme.lower() == 'bearer' else None
+        if token is None:
+            raise ApiError('unauthorized', 'A valid API token is required.', 401)
+
+        # Plain values, so the commits below do not reload the token row
+        g.api_client = ApiClient(token.id, token.name, token.employee_id)
+
+        now = datetime.utcnow()
+        if token.last_used_at is None or now - token.last_used_at > LAST_USED_RESOLUTION:
+            token.last_used_at = now
+            db.session.commit()
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp into naive UTC, or None if not given"""
+    if value in (None, ''):
+        return None
+    try:
+        moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise ApiError('invalid_timestamp', f"'at' must be an ISO 8601 timestamp, got {value!r}")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    if moment > datetime.utcnow() + MAX_CLOCK_SKEW:
+        raise ApiError('invalid_timestamp', "'at' is in the future")
+    return moment
+
+
+def check_employee(employee, code):
+    """Apply the token's scope to an employee looked up by ``code``"""
+    client = g.api_client
+    if employee is None:
+        raise ApiError('unknown_employee', f"Unknown employee {code!r}", 404)
+    if client.employee_id is not None and client.employee_id != employee.id:
+        raise ApiError('forbidden', 'This token cannot act for that employee.', 403)
+    if not employee.is_active:
+        raise ApiError('inactive_employee', 'This employee account is deactivated.', 403)
+    return employee
+
+
+def resolve_employee(code):
+    """The employee a request acts for; employee tokens may omit the code"""
+    client = g.api_client
+    if not code:
+        if client.employee_id is None:
+            raise ApiError('missing_employee', 'employee_id is required for device tokens.')
+        return check_employee(db.session.get(Employee, client.employee_id), code)
+    return check_employee(Employee.query.filter_by(employee_id=code).first(), code)
+
+
+def json_body():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ApiError('invalid_json', 'Expected a JSON object body.')
+    return data
+
+
+@api.route('/sessions/start', methods=['POST'])
+@query_budget(6)
+@token_required
+def start_session():
+    data = json_body()
+    employee = resolve_employee(data.get('employee_id'))
+    code = employee.employee_id
+    try:
+        result = clock_in(employee, data.get('description', ''), data.get('project', ''),
+                          parse_timestamp(data.get('at')))
+    except PunchError as e:
+        raise ApiError(e.code, str(e), 409)
+    return jsonify(employee_id=code, session_id=result['session_id'],
+                   start_time=result['start_time']), 201
+
+
+@api.route('/sessions/stop', methods=['POST'])
+# Token refresh, lookups, one upsert each for the daily and weekly totals,
+# the entry, the session delete and the queued alert check
+@query_budget(9)
+@token_required
+def stop_session():
+    data = json_body()
+    employee = resolve_employee(data.get('employee_id'))
+    code = employee.employee_id
+    try:
+        result = clock_out(employee, parse_timestamp(data.get('at')))
+    except PunchError as e:
+        raise ApiError(e.code, str(e), 409)
+    return jsonify(employee_id=code, entry_id=result['entry_id'], date=result['date'],
+                   start_time=result['start_time'], end_time=result['end_time'],
+                   hours_worked=result['hours_worked'])
+
+
+@api.route('/entries', methods=['POST'])
+@query_budget(8)
+@token_required
+def add_entry():
+    data = json_body()
+    employee = resolve_employee(data.get('employee_id'))
+    record = dict(data, employee_id=employee.employee_id)
+    # Approval is for admins in the web UI, not something a device can set
+    record.pop('is_approved', None)
+    try:
+        values = parse_record(record, {employee.employee_id: employee.id})
+    except ImportRowError as e:
+        raise ApiError('invalid_entry', str(e))
+
+    entry = TimeEntry(**values)
+    db.session.add(entry)
+    db.session.flush()
+    response = jsonify(
+        employee_id=employee.employee_id,
+        entry_id=entry.id,
+        date=entry.date.isoformat(),
+        start_time=entry.start_time.isoformat() if entry.start_time else None,
+        end_time=entry.end_time.isoformat() if entry.end_time else None,
+        hours_worked=entry.hours_worked,
+    )
+    db.session.commit()
+    return response, 201
+
+
+@api.route('/employees/<code>/totals')
+@query_budget(6)
+@token_required
+def employee_totals(code):
+    employee = resolve_employee(code)
+    session = active_sessions.get(employee.id)
+    return jsonify(
+        employee_id=employee.employee_id,
+        name=employee.full_name,
+        clocked_in=session is not None,
+        session_start=session.start_time.isoformat() if session else None,
+        hours=HoursRollup().totals_for_employee(employee.id),
+    )
+
+
+def _is_replayed(employee, action, at):
+    """True if this punch was already recorded, i.e. the device is retrying a batch"""
+    moment = as_utc(at)
+    if action == 'in':
+        session = active_sessions.get(employee.id)
+        if session is not None and as_utc(session.start_time) == moment:
+            return True
+        # The session may since have been closed; its first entry starts at the punch
+        recorded = TimeEntry.query.filter_by(employee_id=employee.id, started_at=moment)
+    else:
+        recorded = TimeEntry.query.filter_by(employee_id=employee.id, ended_at=moment)
+    return db.session.query(recorded.exists()).scalar()
+
+
+def _apply_punch(punch, employees):
+    if not isinstance(punch, dict):
+        raise ApiError('invalid_punch', 'Each punch must be an object.')
+    action = punch.get('action')
+    if action not in ('in', 'out'):
+        raise ApiError('invalid_punch', "action must be 'in' or 'out'")
+    at = parse_timestamp(punch.get('at'))
+    if at is None:
+        raise ApiError('invalid_timestamp', "Batched punches need an 'at' timestamp.")
+
+    code = punch.get('employee_id')
+    if not code and g.api_client.employee_id is not None:
+        employee = check_employee(db.session.get(Employee, g.api_client.employee_id), code)
+    else:
+        employee = check_employee(employees.get(code), code)
+
+    if _is_replayed(employee, action, at):
+        return {'status': 'duplicate'}
+
+    try:
+        if action == 'in':
+            result = clock_in(employee, punch.get('description', ''), punch.get('project', ''), at)
+            return {'status': 'ok', 'session_id': result['session_id']}
+        result = clock_out(employee, at)
+        return {'status': 'ok', 'entry_id': result['entry_id'], 'hours_worked': result['hours_worked']}
+    except PunchError as e:
+        raise ApiError(e.code, str(e), 409)
+
+
+@api.route('/punches', methods=['POST'])
+@query_budget(None)  # statements scale with the batch size
+@token_required
+def punch_batch():
+    """Replay punches a device stored while offline.
+
+    Punches are applied in timestamp order, each in its own transaction,
+    and the response has one result per punch in request order. Sending
+    the same batch again is safe: replayed punches come back as
+    "duplicate" and are not applied twice.
+    """
+    punches = json_body().get('punches')
+    if not isinstance(punches, list):
+        raise ApiError('invalid_json', "Expected a 'punches' list.")
+    if len(punches) > MAX_BATCH_PUNCHES:
+        raise ApiError('batch_too_large', f"At most {MAX_BATCH_PUNCHES} punches per request.", 413)
+
+    # One query resolves every employee code in the batch
+    codes = {p.get('employee_id') for p in punches if isinstance(p, dict) and p.get('employee_id')}
+    employees = {e.employee_id: e for e in Employee.query.filter(Employee.employee_id.in_(codes))} \
+        if codes else {}
+
+    def sort_key(index):
+        try:
+            return parse_timestamp(punches[index].get('at')) or datetime.min
+        except (ApiError, AttributeError):
+            return datetime.min
+
+    results = [None] * len(punches)
+    for index in sorted(range(len(punches)), key=sort_key):
+        try:
+            results[index] = _apply_punch(punches[index], employees)
+        except ApiError as e:
+            results[index] = {'status': 'error', 'error': e.code, 'message': e.message}
+
+    accepted = sum(1 for result in results if result['status'] != 'error')
+    return jsonify(accepted=accepted, rejected=len(results) - accepted, results=results)
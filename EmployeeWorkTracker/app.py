@@ -6,8 +6,8 @@ from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_login import LoginManager
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging; LOG_LEVEL=DEBUG restores the verbose output
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 
 class Base(DeclarativeBase):
     pass
@@ -19,17 +19,30 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key_change_in_production")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
-# Configure the database - SQLite for portability
-database_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'employee_tracking.db')
-app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{database_path}"
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+# Configure the database - SQLite file by default, DATABASE_URL for a server database
+from database import database_url_from_env, engine_options_from_env
+app.config["SQLALCHEMY_DATABASE_URI"] = database_url_from_env()
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options_from_env(app.config["SQLALCHEMY_DATABASE_URI"])
+
+from sqlite_tuning import pragmas_from_env, configure_engine
+app.config["SQLITE_PRAGMAS"] = pragmas_from_env()
 
 # Initialize extensions
 db.init_app(app)
 
+with app.app_context():
+    configure_engine(db.engine, app.config["SQLITE_PRAGMAS"])
+
+# Per-request SQL statement budget (debug/testing only)
+from query_budget import init_query_budget
+init_query_budget(app)
+
+# Request latency, SQL and template metrics served at /metrics
+from metrics import init_metrics
+app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+app.config["SLOW_REQUEST_SECONDS"] = float(os.environ.get("SLOW_REQUEST_SECONDS", 1.0))
+init_metrics(app)
+
 # Setup Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -37,38 +50,62 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'warning'
 
+# Login settings: identity cache TTL, password hash cost, verification queue
+from auth import settings_from_env, init_auth, load_employee
+app.config.update(settings_from_env())
+init_auth(app)
+
+# Cached admin counts and report fragments; entries expire after the TTL
+from cache import init_cache
+app.config["RESPONSE_CACHE_TTL"] = int(os.environ.get("RESPONSE_CACHE_TTL", 60))
+app.config["RESPONSE_CACHE_SIZE"] = int(os.environ.get("RESPONSE_CACHE_SIZE", 256))
+init_cache(app)
+
+# Live dashboard updates; one stream response lasts at most this long, then the browser reconnects
+app.config["EVENT_STREAM_SECONDS"] = int(os.environ.get("EVENT_STREAM_SECONDS", 300))
+
+# Background jobs: queue in the job table, worker threads start with the first request
+from jobs import settings_from_env as job_settings_from_env, init_jobs
+app.config.update(job_settings_from_env())
+init_jobs(app)
+
+# Approved entries older than ARCHIVE_AFTER_DAYS can be moved to per-year archive tables
+from archive import settings_from_env as archive_settings_from_env
+app.config.update(archive_settings_from_env())
+
+# Work is attributed to calendar days in WORK_TIMEZONE; durations are computed from UTC instants
+from durations import settings_from_env as duration_settings_from_env
+app.config.update(duration_settings_from_env())
+
+# Alert rules run on each committed change; open sessions are swept by the job supervisor
+from alerts import settings_from_env as alert_settings_from_env
+app.config.update(alert_settings_from_env())
+
+# Department, project and overtime analytics read from the weekly rollup; the
+# overtime threshold is ALERT_OVERTIME_HOURS, the same one the alert rule uses
+app.config["ANALYTICS_STANDARD_WEEK_HOURS"] = float(os.environ.get("ANALYTICS_STANDARD_WEEK_HOURS", 40))
+
 @login_manager.user_loader
 def load_user(user_id):
-    from models import Employee
-    return Employee.query.get(int(user_id))
+    return load_employee(int(user_id))
 
-# Import routes after app initialization
-from routes import *
+def create_app():
+    """Return the app with its views, API and CLI commands registered.
 
-with app.app_context():
-    # Import models to ensure tables are created
-    import models
-    db.create_all()
-    
-    # Create admin user if doesn't exist
-    from models import Employee
-    from werkzeug.security import generate_password_hash
-    
-    admin = Employee.query.filter_by(email='admin@company.com').first()
-    if not admin:
-        admin = Employee(
-            first_name='Admin',
-            last_name='User',
-            email='admin@company.com',
-            employee_id='ADMIN001',
-            department='IT',
-            position='System Administrator',
-            is_admin=True,
-            password_hash=generate_password_hash('admin123')
-        )
-        db.session.add(admin)
-        db.session.commit()
-        print("Admin user created: admin@company.com / admin123")
+    Importing this module only configures the app, so scripts that just
+    need ``db`` and the models skip the views. Neither touches the
+    database: the schema and the default admin are set up by
+    ``flask --app main init-db``, and open sessions load on first use.
+    """
+    if 'api' not in app.blueprints:
+        import routes  # noqa: F401  views register themselves on app
+        import commands  # noqa: F401
+        from api import api
+        from session_registry import active_sessions, DEFAULT_SYNC_SECONDS
+        app.register_blueprint(api)
+        active_sessions.sync_interval = float(os.environ.get('ACTIVE_SESSION_SYNC_SECONDS', DEFAULT_SYNC_SECONDS)) or None
+    return app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    from main import run_dev_server
+    run_dev_server()
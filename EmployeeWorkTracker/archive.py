@@ -0,0 +1,210 @@
+"""Archival of old, approved time entries into per-year tables.
+
+time_entry keeps recent work and everything still awaiting approval.
+archive_entries() moves approved entries dated more than
+ARCHIVE_AFTER_DAYS ago into time_entry_archive_<year> tables. Those
+tables have the same columns and keep the entry ids. Each batch is
+copied and deleted in one transaction with Core statements, so the ORM
+flush hook never sees the rows. The daily and weekly totals keep
+counting archived work, and the dashboard, summaries and analytics show
+the same figures as before.
+
+archive_partition lists every archive table with the span of dates it
+holds. Code that reads individual entries asks entry_source(start, end).
+When no partition overlaps the range, it gets TimeEntry itself and the
+query is unchanged. Otherwise it gets a UNION ALL of time_entry and the
+overlapping partitions, with the range filter repeated in every branch.
+Archived entries can be read this way but not edited, approved or
+deleted.
+
+The archive tables stay in the main database, so a batch moves
+atomically on SQLite and on server databases alike.
+"""
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import MetaData, Table, Column, Index, select, union_all, func, and_
+from sqlalchemy.orm import aliased
+from app import db
+from cache import invalidate_all
+from models import TimeEntry, ArchivePartition
+from durations import work_today
+
+logger = logging.getLogger(__name__)
+
+# Entries newer than this stay in time_entry whatever ARCHIVE_AFTER_DAYS says:
+# the dashboard, timesheets and approval views read recent months from it
+MIN_ARCHIVE_AFTER_DAYS = 93
+
+# Ids per IN (...) list, well under every driver's bound parameter limit
+ARCHIVE_ID_CHUNK = 500
+
+
+def settings_from_env():
+    """Archival app.config values read from the environment"""
+    return {
+        'ARCHIVE_AFTER_DAYS': int(os.environ.get('ARCHIVE_AFTER_DAYS', 730)),
+        'ARCHIVE_BATCH_SIZE': int(os.environ.get('ARCHIVE_BATCH_SIZE', 5000)),
+    }
+
+
+# Archive tables are created when first needed, never by create_all()
+archive_metadata = MetaData()
+_tables_lock = threading.Lock()
+
+
+def archive_table_name(year):
+    return f"time_entry_archive_{year:04d}"
+
+
+def archive_table(name):
+    """Table object for an archive table, with time_entry's columns"""
+    with _tables_lock:
+        table = archive_metadata.tables.get(name)
+        if table is None:
+            columns = [Column(column.name, column.type, primary_key=column.primary_key,
+                              nullable=column.nullable, autoincrement=False)
+                       for column in TimeEntry.__table__.columns]
+            table = Table(name, archive_metadata, *columns,
+                          Index(f"ix_{name}_employee_date", 'employee_id', 'date'),
+                          Index(f"ix_{name}_date_id", 'date', 'id'))
+        return table
+
+
+def partitions(start=None, end=None, conn=None):
+    """Names of the archive tables holding entries dated in [start, end], oldest first"""
+    query = select(ArchivePartition.table_name).order_by(ArchivePartition.year)
+    if start is not None:
+        query = query.where(ArchivePartition.last_date >= start)
+    if end is not None:
+        query = query.where(ArchivePartition.first_date <= end)
+    return list((conn or db.session).execute(query).scalars())
+
+
+def entry_selectable(start=None, end=None, conn=None):
+    """time_entry, or a UNION ALL of it and the archives overlapping [start, end].
+
+    Either way the result has time_entry's columns and only rows dated in
+    the range when one is given.
+    """
+    live = TimeEntry.__table__
+    names = partitions(start, end, conn)
+    if not names:
+        return live
+    branches = []
+    for table in (live, *(archive_table(name) for name in names)):
+        query = select(*table.c)
+        if start is not None:
+            query = query.where(table.c.date >= start)
+        if end is not None:
+            query = query.where(table.c.date <= end)
+        branches.append(query)
+    return union_all(*branches).subquery('time_entry_all')
+
+
+def entry_source(start=None, end=None):
+    """What ORM queries over entries dated in [start, end] should select from.
+
+    TimeEntry when the range is all live, otherwise an alias of it over
+    entry_selectable(). Attributes and relationships work the same on both.
+    """
+    selectable = entry_selectable(start, end)
+    if selectable is TimeEntry.__table__:
+        return TimeEntry
+    return aliased(TimeEntry, selectable)
+
+
+def archive_cutoff(after_days, today=None):
+    """First date that stays in time_entry when archiving entries older than ``after_days``"""
+    return (today or work_today()) - timedelta(days=max(after_days, MIN_ARCHIVE_AFTER_DAYS))
+
+
+def _archivable(cutoff):
+    live = TimeEntry.__table__
+    # != rather than IS TRUE so SQLite walks the primary key instead of
+    # ix_time_entry_approved_created, which matches most of the table
+    return and_(live.c.is_approved != False, live.c.date < cutoff)  # noqa: E712
+
+
+def count_archivable(cutoff):
+    with db.engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(TimeEntry.__table__)
+                            .where(_archivable(cutoff))).scalar()
+
+
+def _record_partition(conn, year, name, rows, hours, first_date, last_date):
+    partitions_table = ArchivePartition.__table__
+    existing = conn.execute(select(partitions_table).where(partitions_table.c.year == year)).first()
+    if existing is None:
+        conn.execute(partitions_table.insert().values(
+            year=year, table_name=name, first_date=first_date, last_date=last_date,
+            rows=rows, hours=hours, archived_at=datetime.utcnow()))
+    else:
+        conn.execute(partitions_table.update().where(partitions_table.c.year == year).values(
+            first_date=min(existing.first_date, first_date), last_date=max(existing.last_date, last_date),
+            rows=existing.rows + rows, hours=round(existing.hours + hours, 4), archived_at=datetime.utcnow()))
+
+
+def _move_year(conn, year, ids, cutoff):
+    """Copy then delete the given entries of ``year`` that are still archivable; returns the count"""
+    live = TimeEntry.__table__
+    table = archive_table(archive_table_name(year))
+    in_year = and_(_archivable(cutoff), live.c.date >= date(year, 1, 1), live.c.date <= date(year, 12, 31))
+    moved, hours, first_date, last_date = 0, 0.0, None, None
+    for i in range(0, len(ids), ARCHIVE_ID_CHUNK):
+        where = and_(in_year, live.c.id.in_(ids[i:i + ARCHIVE_ID_CHUNK]))
+        conn.execute(table.insert().from_select([column.name for column in live.c], select(*live.c).where(where)))
+        rows, chunk_hours, chunk_first, chunk_last = conn.execute(
+            select(func.count(), func.coalesce(func.sum(live.c.hours_worked), 0.0),
+                   func.min(live.c.date), func.max(live.c.date)).where(where)).one()
+        conn.execute(live.delete().where(where))
+        if rows:
+            moved += rows
+            hours += chunk_hours
+            first_date = chunk_first if first_date is None else min(first_date, chunk_first)
+            last_date = chunk_last if last_date is None else max(last_date, chunk_last)
+    if moved:
+        _record_partition(conn, year, table.name, moved, hours, first_date, last_date)
+    return moved
+
+
+def archive_entries(cutoff, batch_size=5000, progress=None):
+    """Move approved entries dated before ``cutoff`` into the per-year archive tables.
+
+    Every batch of up to ``batch_size`` entries commits on its own, so an
+    interrupted run leaves each entry in exactly one table and can be run
+    again. ``progress(done, total)`` is called after each batch. Returns
+    {year: entries moved}.
+    """
+    live = TimeEntry.__table__
+    total = count_archivable(cutoff)
+    moved = defaultdict(int)
+    created = set()
+    last_id = 0
+    done = 0
+    while True:
+        with db.engine.begin() as conn:
+            batch = conn.execute(select(live.c.id, live.c.date)
+                                 .where(_archivable(cutoff), live.c.id > last_id)
+                                 .order_by(live.c.id).limit(batch_size)).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            by_year = defaultdict(list)
+            for entry_id, day in batch:
+                by_year[day.year].append(entry_id)
+            for year, ids in sorted(by_year.items()):
+                if year not in created:
+                    archive_table(archive_table_name(year)).create(conn, checkfirst=True)
+                    created.add(year)
+                moved[year] += _move_year(conn, year, ids, cutoff)
+        done += len(batch)
+        if progress:
+            progress(done, total)
+    if moved:
+        # Pages listing an employee's latest entries may have lost some
+        invalidate_all()
+        logger.info("Archived %s time entries dated before %s", sum(moved.values()), cutoff)
+    return dict(moved)
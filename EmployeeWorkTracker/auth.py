@@ -0,0 +1,212 @@
+"""Login helpers: a cache behind load_user and throttled password checks.
+
+load_user runs on every authenticated request. IdentityCache keeps a
+detached copy of recently seen employees and merges it into the request's
+session without a query. Copies are dropped when a commit changes the
+employee, the same way the session registry follows ActiveSession. Other
+worker processes see such a change once their copy expires, so the TTL
+bounds how stale they can be.
+
+Password hashing is deliberately slow. PASSWORD_HASH_METHOD sets its cost.
+PasswordVerifier lets at most LOGIN_CONCURRENCY checks run at once. Other
+requests queue for a slot for up to LOGIN_QUEUE_TIMEOUT seconds and then
+fail with LoginBusy, so a shift-start login storm waits in line and does
+not pin every CPU. LoginThrottle refuses to hash at all for a client that
+keeps failing.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import db
+from models import Employee
+from commit_hooks import on_change
+
+
+def settings_from_env():
+    """Login-related app.config values read from the environment"""
+    return {
+        'IDENTITY_CACHE_TTL': float(os.environ.get('IDENTITY_CACHE_TTL', 60)),
+        'IDENTITY_CACHE_SIZE': int(os.environ.get('IDENTITY_CACHE_SIZE', 1024)),
+        # Any werkzeug method string, e.g. "scrypt:16384:8:1" or "pbkdf2:sha256:600000"
+        'PASSWORD_HASH_METHOD': os.environ.get('PASSWORD_HASH_METHOD', 'scrypt'),
+        # Concurrent password checks; 0 means one per CPU
+        'LOGIN_CONCURRENCY': int(os.environ.get('LOGIN_CONCURRENCY', 0)),
+        'LOGIN_QUEUE_TIMEOUT': float(os.environ.get('LOGIN_QUEUE_TIMEOUT', 5)),
+        'LOGIN_MAX_FAILURES': int(os.environ.get('LOGIN_MAX_FAILURES', 10)),
+        'LOGIN_FAILURE_WINDOW': float(os.environ.get('LOGIN_FAILURE_WINDOW', 300)),
+    }
+
+
+def _detached_copy(employee):
+    """A standalone copy of the column values that can be shared between requests"""
+    values = {attr.key: getattr(employee, attr.key) for attr in inspect(Employee).column_attrs}
+    copy = Employee(**values)
+    make_transient_to_detached(copy)
+    return copy
+
+
+class IdentityCache:
+    """TTL + LRU cache of detached Employee copies keyed by id"""
+
+    def __init__(self, ttl=60, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, employee_id):
+        with self._lock:
+            item = self._entries.get(employee_id)
+            if item is None:
+                return None
+            expires_at, employee = item
+            if expires_at < time.monotonic():
+                del self._entries[employee_id]
+                return None
+            self._entries.move_to_end(employee_id)
+            return employee
+
+    def put(self, employee):
+        if not self.ttl or not self.maxsize:
+            return
+        copy = _detached_copy(employee)
+        with self._lock:
+            self._entries[employee.id] = (time.monotonic() + self.ttl, copy)
+            self._entries.move_to_end(employee.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, employee_id):
+        with self._lock:
+            self._entries.pop(employee_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class LoginBusy(Exception):
+    """No password check slot became free within the queue timeout"""
+
+
+class PasswordVerifier:
+    def __init__(self, concurrency=None, queue_timeout=5.0):
+        self.configure(concurrency, queue_timeout)
+
+    def configure(self, concurrency=None, queue_timeout=5.0):
+        self.concurrency = concurrency or os.cpu_count() or 2
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+
+    def verify(self, password_hash, password):
+        """check_password_hash, waiting for a free slot; raises LoginBusy"""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise LoginBusy()
+        try:
+            return check_password_hash(password_hash, password)
+        finally:
+            self._slots.release()
+
+
+class LoginThrottle:
+    """Sliding-window count of failed sign-ins per key"""
+
+    def __init__(self, max_failures=10, window=300):
+        self.max_failures = max_failures
+        self.window = window
+        self._lock = threading.Lock()
+        self._failures = {}
+
+    def _recent(self, key, now):
+        failures = self._failures.get(key)
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        return failures
+
+    def is_limited(self, key):
+        with self._lock:
+            failures = self._recent(key, time.monotonic())
+            return bool(failures) and len(failures) >= self.max_failures
+
+    def record_failure(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._failures) > 10000:
+                # Forget keys whose failures have all aged out
+                for stale in [k for k in self._failures if not self._recent(k, now)]:
+                    del self._failures[stale]
+            self._failures.setdefault(key, deque()).append(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+
+identity_cache = IdentityCache()
+password_verifier = PasswordVerifier()
+login_throttle = LoginThrottle()
+
+_password_hash_method = 'scrypt'
+_hash_prefix = None
+
+
+def init_auth(app):
+    """Apply the login settings in app.config to the module-level helpers"""
+    global _password_hash_method, _hash_prefix
+    identity_cache.ttl = app.config['IDENTITY_CACHE_TTL']
+    identity_cache.maxsize = app.config['IDENTITY_CACHE_SIZE']
+    identity_cache.clear()
+    password_verifier.configure(app.config['LOGIN_CONCURRENCY'], app.config['LOGIN_QUEUE_TIMEOUT'])
+    login_throttle.max_failures = app.config['LOGIN_MAX_FAILURES']
+    login_throttle.window = app.config['LOGIN_FAILURE_WINDOW']
+    _password_hash_method = app.config['PASSWORD_HASH_METHOD']
+    _hash_prefix = None
+
+
+def load_employee(employee_id):
+    """Employee for Flask-Login's user_loader, from the cache when possible"""
+    cached = identity_cache.get(employee_id)
+    if cached is not None:
+        return db.session.merge(cached, load=False)
+    employee = db.session.get(Employee, employee_id)
+    if employee is not None:
+        identity_cache.put(employee)
+    return employee
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=_password_hash_method)
+
+
+def _needs_rehash(password_hash):
+    global _hash_prefix
+    if _hash_prefix is None:
+        # werkzeug expands defaults ("scrypt" -> "scrypt:32768:8:1"), so compare
+        # against what it actually writes for the configured method
+        _hash_prefix = hash_password('').split('$', 1)[0]
+    return password_hash.split('$', 1)[0] != _hash_prefix
+
+
+def verify_password(employee, password):
+    """Check a password through the verifier queue; raises LoginBusy.
+
+    A hash made with a different cost than PASSWORD_HASH_METHOD is
+    replaced after a successful check, so changing the setting takes
+    effect as people sign in.
+    """
+    if not employee.password_hash or not password_verifier.verify(employee.password_hash, password):
+        return False
+    if _needs_rehash(employee.password_hash):
+        employee.password_hash = hash_password(password)
+        db.session.commit()
+    return True
+
+
+@on_change
+def _invalidate_changed_employees(changes):
+    for employee_id in changes.employees:
+        identity_cache.invalidate(employee_id)
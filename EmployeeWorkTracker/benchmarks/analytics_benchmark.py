@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Time the /reports/analytics report over every week of a large dataset.
+
+Either points at an existing database (--database, upgraded in place by
+the app's migrations) or seeds a fresh one with datagen. The first
+build reads the rollup from disk; the best of --repeat builds shows the
+cost with its pages already cached. --baseline also times the
+department x week pivot computed straight from time_entry, which is what
+the weekly rollup replaces.
+
+    python benchmarks/analytics_benchmark.py --database /data/big.db --period month
+    python benchmarks/analytics_benchmark.py --employees 20000 --days 365 --output analytics.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(function, repeat):
+    """([seconds per call], last result) of ``repeat`` calls"""
+    seconds, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        seconds.append(round(time.perf_counter() - started, 3))
+    return seconds, result
+
+
+def run(args):
+    sys.path.insert(0, ROOT)
+    from app import app, db
+    from sqlalchemy import func
+    from analytics import build_report
+    from migrations import upgrade
+    from models import Employee, TimeEntry, EmployeeWeeklyTotal, week_start_sql
+
+    with app.app_context():
+        upgrade()
+        dataset = None
+        if not args.database:
+            from datagen import generate_dataset
+            dataset = generate_dataset(args.employees, args.days, 0, args.seed).to_dict()
+
+        first, last, entries = db.session.query(
+            func.min(TimeEntry.date), func.max(TimeEntry.date), func.count(TimeEntry.id)).one()
+        if entries == 0:
+            sys.exit('The database has no time entries.')
+        weekly_rows = db.session.query(func.count(EmployeeWeeklyTotal.id)).scalar()
+
+        def build():
+            result = build_report(first, last, args.period)
+            db.session.rollback()
+            return result
+
+        report_seconds, report = timed(build, max(args.repeat, 1))
+
+        results = {
+            'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'dataset': dataset,
+            'time_entries': entries,
+            'weekly_total_rows': weekly_rows,
+            'range': [first.isoformat(), last.isoformat()],
+            'period': args.period,
+            'periods': len(report['periods']),
+            'departments': len(report['departments']),
+            'projects': len(report['projects']),
+            'overtime_employee_weeks': report['totals']['overtime_employee_weeks'],
+            'first_report_seconds': report_seconds[0],
+            'best_report_seconds': min(report_seconds),
+        }
+
+        if args.baseline:
+            week = week_start_sql(TimeEntry.date, db.engine.dialect.name)
+
+            def from_entries():
+                return db.session.query(week, Employee.department, func.sum(TimeEntry.hours_worked))\
+                    .join(Employee, Employee.id == TimeEntry.employee_id)\
+                    .filter(TimeEntry.hours_worked.isnot(None))\
+                    .group_by(week, Employee.department).all()
+
+            results['entry_pivot_seconds'] = timed(from_entries, 1)[0][0]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='Existing SQLite file to report on instead of seeding one.')
+    parser.add_argument('--employees', type=int, default=10000, help='Employees to seed.')
+    parser.add_argument('--days', type=int, default=365, help='Days of time entry history to seed.')
+    parser.add_argument('--period', choices=('week', 'month'), default='week')
+    parser.add_argument('--repeat', type=int, default=3, help='Report builds to time.')
+    parser.add_argument('--baseline', action='store_true', help='Also pivot straight from time_entry.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='analytics-benchmark.json', help='Where to write the JSON results.')
+    args = parser.parse_args()
+
+    # The database URL is read when app is imported
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.abspath(args.database) if args.database else os.path.join(workdir, 'analytics.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+        if not args.database:
+            print(f"Seeding {args.employees} employees x {args.days} days ...", file=sys.stderr, flush=True)
+        results = run(args)
+
+    print(f"{results['time_entries']} time entries in {results['weekly_total_rows']} weekly total rows, "
+          f"{results['range'][0]} to {results['range'][1]}")
+    print(f"{results['periods']} {results['period']}s x {results['departments']} departments, "
+          f"{results['projects']} projects, {results['overtime_employee_weeks']} overtime employee-weeks")
+    print(f"first report:          {results['first_report_seconds']:>8}s")
+    print(f"best report:           {results['best_report_seconds']:>8}s")
+    if 'entry_pivot_seconds' in results:
+        print(f"pivot from time_entry: {results['entry_pivot_seconds']:>8}s")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Concurrent clock-in/clock-out throughput on SQLite, per pragma profile.
+
+Simulates a shift change: several worker processes (standing in for
+gunicorn workers) punch employees in and out as fast as they can while
+reader processes load dashboard totals. Each profile from sqlite_tuning
+runs against its own fresh database file.
+
+    python benchmarks/clock_in_throughput.py --workers 8 --readers 4 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlite_tuning import PROFILES, apply_pragmas
+
+SCHEMA = """
+CREATE TABLE active_session (
+    id INTEGER PRIMARY KEY, employee_id INTEGER NOT NULL, start_time DATETIME NOT NULL,
+    description TEXT, project VARCHAR(100), created_at DATETIME);
+CREATE UNIQUE INDEX uq_active_session_employee ON active_session (employee_id);
+CREATE TABLE time_entry (
+    id INTEGER PRIMARY KEY, employee_id INTEGER NOT NULL, date DATE NOT NULL,
+    start_time TIME, end_time TIME, hours_worked FLOAT, break_hours FLOAT,
+    description TEXT, project VARCHAR(100), is_approved BOOLEAN,
+    created_at DATETIME, updated_at DATETIME);
+CREATE INDEX ix_time_entry_employee_date ON time_entry (employee_id, date);
+CREATE TABLE employee_daily_total (
+    id INTEGER PRIMARY KEY, employee_id INTEGER NOT NULL, date DATE NOT NULL,
+    hours FLOAT NOT NULL, entries_count INTEGER NOT NULL,
+    UNIQUE (employee_id, date));
+"""
+
+
+def connect(path, pragmas):
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn, pragmas)
+    return conn
+
+
+def punch(conn, employee_id):
+    """One clock-in or clock-out, shaped like start_session/stop_session"""
+    now = datetime.utcnow()
+    row = conn.execute("SELECT id, start_time FROM active_session WHERE employee_id = ?",
+                       (employee_id,)).fetchone()
+    if row is None:
+        conn.execute("INSERT INTO active_session (employee_id, start_time, created_at) VALUES (?, ?, ?)",
+                     (employee_id, now, now))
+    else:
+        day = now.date().isoformat()
+        conn.execute("INSERT INTO time_entry (employee_id, date, hours_worked, is_approved, created_at) "
+                     "VALUES (?, ?, 0.01, 0, ?)", (employee_id, day, now))
+        updated = conn.execute("UPDATE employee_daily_total SET hours = hours + 0.01, "
+                               "entries_count = entries_count + 1 WHERE employee_id = ? AND date = ?",
+                               (employee_id, day)).rowcount
+        if not updated:
+            conn.execute("INSERT INTO employee_daily_total (employee_id, date, hours, entries_count) "
+                         "VALUES (?, ?, 0.01, 1)", (employee_id, day))
+        conn.execute("DELETE FROM active_session WHERE id = ?", (row[0],))
+    conn.commit()
+
+
+def read_dashboard(conn, employee_id):
+    conn.execute("SELECT SUM(hours) FROM employee_daily_total WHERE employee_id = ?", (employee_id,)).fetchone()
+    conn.execute("SELECT COUNT(*) FROM active_session").fetchone()
+    conn.execute("SELECT * FROM time_entry WHERE employee_id = ? ORDER BY date DESC LIMIT 5",
+                 (employee_id,)).fetchall()
+
+
+def worker(path, pragmas, kind, index, stride, employees, seconds, results):
+    conn = connect(path, pragmas)
+    done = errors = 0
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    # Writers own disjoint employees, like badge readers on separate doors
+    own_employees = list(range(index + 1, employees + 1, stride))
+    i = 0
+    while time.perf_counter() < deadline:
+        employee_id = own_employees[i % len(own_employees)]
+        started = time.perf_counter()
+        try:
+            if kind == 'writer':
+                punch(conn, employee_id)
+            else:
+                read_dashboard(conn, employee_id)
+            done += 1
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError:
+            # "database is locked" once busy_timeout runs out
+            conn.rollback()
+            errors += 1
+        i += 1
+    conn.close()
+    results.put((kind, done, errors, latencies))
+
+
+def run_profile(name, args):
+    pragmas = PROFILES[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        conn = connect(path, pragmas)
+        conn.executescript(SCHEMA)
+        conn.close()
+        
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=worker, args=(path, pragmas, kind, i, count,
+                                                         args.employees, args.seconds, results))
+            for kind, count in (('writer', args.workers), ('reader', args.readers))
+            for i in range(count)
+        ]
+        for p in procs:
+            p.start()
+        collected = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+    
+    summary = {'profile': name}
+    for kind in ('writer', 'reader'):
+        rows = [r for r in collected if r[0] == kind]
+        latencies = sorted(l for r in rows for l in r[3])
+        ops = sum(r[1] for r in rows)
+        summary[kind] = {
+            'ops_per_sec': round(ops / args.seconds, 1),
+            'errors': sum(r[2] for r in rows),
+            'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None,
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8, help='concurrent clock-in processes')
+    parser.add_argument('--readers', type=int, default=4, help='concurrent dashboard readers')
+    parser.add_argument('--employees', type=int, default=500)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profiles', nargs='+', default=['default', 'production'], choices=sorted(PROFILES))
+    args = parser.parse_args()
+    
+    print(f"{'profile':<12}{'punches/s':>12}{'p99 ms':>10}{'locked':>8}{'reads/s':>12}{'p99 ms':>10}")
+    for name in args.profiles:
+        s = run_profile(name, args)
+        w, r = s['writer'], s['reader']
+        print(f"{name:<12}{w['ops_per_sec']:>12}{w['p99_ms']:>10}{w['errors']:>8}"
+              f"{r['ops_per_sec']:>12}{r['p99_ms']:>10}")
+
+
+if __name__ == '__main__':
+    main()
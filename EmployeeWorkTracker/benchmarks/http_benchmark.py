@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Throughput and latency of the main pages at several dataset sizes.
+
+For each scale a fresh SQLite database is seeded with datagen and the
+app runs in a child process, since the database URL is fixed when app
+is imported. Flask's test client then times each endpoint:
+- /dashboard, /employees, /reports and /admin as the admin
+- start_session and stop_session as a generated employee
+- /login with a fresh client each time
+
+Results are written as JSON. --compare prints the change against an
+earlier results file.
+
+    python benchmarks/http_benchmark.py --scales 1000,10000,100000 --output results.json
+    python benchmarks/http_benchmark.py --scales 1000 --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ADMIN_PAGES = ['/dashboard', '/employees', '/reports', '/admin']
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(total / len(latencies) * 1000, 3),
+        'requests_per_second': round(len(latencies) / total, 1) if total else None,
+    }
+
+
+def measure(request, requests, max_seconds, before=None, after=None, warmup=2):
+    """Time ``request()`` up to ``requests`` times or ``max_seconds``, at least 5 samples.
+
+    ``request`` returns the status code. ``before`` and ``after`` run
+    untimed around every call.
+    """
+    latencies, errors = [], 0
+    deadline = None
+    for attempt in range(warmup + requests):
+        if attempt == warmup:
+            deadline = time.perf_counter() + max_seconds
+        elif deadline and len(latencies) >= 5 and time.perf_counter() > deadline:
+            break
+        if before:
+            before()
+        started = time.perf_counter()
+        status = request()
+        elapsed = time.perf_counter() - started
+        if after:
+            after()
+        if deadline:
+            latencies.append(elapsed)
+            errors += status >= 400
+    return summarize(latencies, errors)
+
+
+def run_scale(args):
+    """Child process: seed the database named by DATABASE_URL and time every endpoint"""
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from commands import init_database
+    from datagen import generate_dataset, DEFAULT_PASSWORD
+
+    app = create_app()
+    with app.app_context():
+        init_database()
+        dataset = generate_dataset(args.scale, args.history_days, args.open_sessions, args.seed)
+
+    admin = app.test_client()
+    admin.post('/login', data={'email': 'admin@company.com', 'password': 'admin123'})
+    worker = app.test_client()
+    # The first generated employee, made active in case the generator deactivated it
+    with app.app_context():
+        from models import Employee
+        from app import db
+        employee = Employee.query.filter_by(is_admin=False).order_by(Employee.id).first()
+        employee.is_active = True
+        db.session.commit()
+        worker_email = employee.email
+    worker.post('/login', data={'email': worker_email, 'password': DEFAULT_PASSWORD})
+
+    endpoints = {}
+    for path in ADMIN_PAGES:
+        endpoints[path] = measure(lambda: admin.get(path).status_code, args.requests, args.max_seconds)
+
+    def start():
+        return worker.post('/start_session', data={'project': 'Bench'}).status_code
+
+    def stop():
+        return worker.post('/stop_session').status_code
+
+    def login():
+        client = app.test_client()
+        response = client.post('/login', data={'email': worker_email, 'password': DEFAULT_PASSWORD})
+        # A successful login redirects; a re-rendered form means it failed
+        return response.status_code if response.status_code == 302 else 500
+
+    # Each timed start is followed by an untimed stop and vice versa
+    endpoints['start_session'] = measure(start, args.requests, args.max_seconds, after=stop)
+    endpoints['stop_session'] = measure(stop, args.requests, args.max_seconds, before=start)
+    endpoints['/login'] = measure(login, args.requests, args.max_seconds)
+
+    return {'dataset': dataset.to_dict(), 'endpoints': endpoints}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1000,10000,100000', help='Comma-separated employee counts.')
+    parser.add_argument('--history-days', type=int, default=30, help='Days of time entry history per employee.')
+    parser.add_argument('--open-sessions', type=float, default=0.05, help='Share of employees clocked in.')
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint.')
+    parser.add_argument('--max-seconds', type=float, default=30.0, help='Time cap per endpoint.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmark-results.json', help='Where to write the JSON results.')
+    parser.add_argument('--compare', help='Earlier results file to compare against.')
+    parser.add_argument('--scale', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scale:
+        print(json.dumps(run_scale(args)))
+        return
+
+    results = {
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'sqlite_profile': os.environ.get('SQLITE_PROFILE', 'production'),
+        'config': {key: getattr(args, key) for key in ('history_days', 'open_sessions', 'requests',
+                                                       'max_seconds', 'seed')},
+        'scales': {},
+    }
+    for scale in [int(value) for value in args.scales.split(',')]:
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+                       LOG_LEVEL='WARNING', SLOW_REQUEST_SECONDS='3600')
+            command = [sys.executable, os.path.abspath(__file__), '--scale', str(scale)]
+            command += [f'--{name.replace("_", "-")}={value}' for name, value in results['config'].items()]
+            print(f"{scale} employees ...", file=sys.stderr, flush=True)
+            output = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True)
+            if output.returncode:
+                sys.exit(output.stderr)
+            results['scales'][str(scale)] = json.loads(output.stdout.strip().splitlines()[-1])
+        print_scale(scale, results['scales'][str(scale)])
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+def print_scale(scale, result):
+    print(f"\n{scale} employees, {result['dataset']['time_entries']} time entries "
+          f"(seeded in {result['dataset']['elapsed_seconds']}s)")
+    print(f"{'endpoint':<16} {'p50 ms':>10} {'p99 ms':>10} {'req/s':>10} {'errors':>7}")
+    for name, row in result['endpoints'].items():
+        print(f"{name:<16} {row['p50_ms']:>10} {row['p99_ms']:>10} {row['requests_per_second']:>10} "
+              f"{row['errors']:>7}")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nChange against {baseline_path} ({baseline['generated_at']}), p50 / p99:")
+    for scale, result in results['scales'].items():
+        before = baseline['scales'].get(scale)
+        if not before:
+            continue
+        for name, row in result['endpoints'].items():
+            old = before['endpoints'].get(name)
+            if not old:
+                continue
+            changes = [f"{(row[key] - old[key]) / old[key] * 100:+6.1f}%" if old[key] else 'n/a'
+                       for key in ('p50_ms', 'p99_ms')]
+            print(f"{scale:>7} {name:<16} {changes[0]:>9} {changes[1]:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Cold-start time of the app against an import-time budget.
+
+Each sample imports the app in a fresh interpreter, as a gunicorn worker
+or a test run does: ``app`` alone (configuration, extensions, models)
+and ``main`` (create_app() with every view, the API and the CLI
+commands). DATABASE_URL points at a SQLite file in a directory that does
+not exist, so an import that opens a database connection fails instead
+of getting slower with the database.
+
+The median of --repeat samples is compared with --budget-ms; the script
+exits with status 1 when ``main`` goes over it. --profile lists the
+project modules that took longest, from ``python -X importtime``.
+
+    python benchmarks/startup_benchmark.py --repeat 10 --budget-ms 800
+    python benchmarks/startup_benchmark.py --profile --output startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = ('app', 'main')
+
+# Prints the seconds the import took, measured inside the child
+SAMPLE = "import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+
+
+def sample(module, env):
+    """Seconds to import ``module`` in a fresh interpreter"""
+    output = subprocess.run([sys.executable, '-c', SAMPLE.format(module=module)], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def project_modules():
+    return {name[:-3] for name in os.listdir(ROOT) if name.endswith('.py')}
+
+
+def profile(module, env, top):
+    """[(cumulative ms, module)] of the slowest project modules imported by ``module``"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True).stderr
+    own = project_modules()
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.strip() in own and cumulative.strip().isdigit():
+            timings.append((round(int(cumulative) / 1000, 1), name.strip()))
+    return sorted(timings, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per target.')
+    parser.add_argument('--budget-ms', type=float, default=1000, help='Allowed median import time of main.')
+    parser.add_argument('--profile', action='store_true', help='List the slowest project modules.')
+    parser.add_argument('--top', type=int, default=10, help='Modules listed by --profile.')
+    parser.add_argument('--output', help='Where to write the JSON results.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, LOG_LEVEL='WARNING', JOB_RESULT_DIR=workdir,
+                   DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'missing', 'startup.db')}")
+        results = {
+            'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'budget_ms': args.budget_ms,
+        }
+        for module in TARGETS:
+            seconds = [sample(module, env) for _ in range(max(args.repeat, 1))]
+            results[module] = {
+                'median_ms': round(statistics.median(seconds) * 1000, 1),
+                'max_ms': round(max(seconds) * 1000, 1),
+            }
+        if args.profile:
+            results['slowest_modules'] = profile('main', env, args.top)
+
+    for module in TARGETS:
+        print(f"import {module:<5} median {results[module]['median_ms']:>8} ms   max {results[module]['max_ms']:>8} ms")
+    for milliseconds, name in results.get('slowest_modules', []):
+        print(f"  {milliseconds:>8} ms  {name}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+    if results['main']['median_ms'] > args.budget_ms:
+        print(f"main took {results['main']['median_ms']} ms, over the {args.budget_ms:g} ms budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Cached admin counts and report fragments, with ETag validation.
+
+Cache keys embed generation counters instead of being deleted on
+writes. A commit that touches a TimeEntry bumps the counters for that
+employee and for the month of the entry, so keys built from older
+counters are never looked up again and age out of the LRU. A report for
+last year keeps its key while this month's entries change, so historical
+ranges stay cached. Employee changes bump a counter that every key
+includes, because names show up in reports and the navigation bar.
+
+ORM writes are tracked by session events through commit_hooks; the
+importer and the duration backfill report the employees and days of
+their Core writes with entries_written(). Bulk approvals and the data
+generator do not know which rows they touched and call invalidate_all().
+
+The same keys give ETags, so a browser revalidating an unchanged page
+gets a 304 without the page being rendered. Counters live in each
+worker process. ETags and cached entries therefore also roll over every
+RESPONSE_CACHE_TTL seconds, which bounds how long another worker's
+writes can go unseen. For that reason the dashboard, where people check
+a punch they just made, is neither cached nor validated and is read
+from the database on every render.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from flask import request, session, current_app, g
+from commit_hooks import on_change
+from durations import work_today
+
+# Ranges longer than this many months key on the per-owner counter alone
+MAX_TOKEN_MONTHS = 36
+
+# Changes with each deploy so new templates are not answered with 304
+RELEASE = os.environ.get('APP_RELEASE') or str(time.time())
+
+
+class LRUCache:
+    def __init__(self, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if not self.maxsize or not self.ttl:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _months(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield f"{year:04d}-{month:02d}"
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+class CacheGenerations:
+    """Counters that change whenever the data behind a cache key changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+
+    def _get(self, key):
+        return self._counters.get(key, 0)
+
+    def entries_changed(self, changes):
+        """Record changed time entries given as (employee_id, date) pairs"""
+        with self._lock:
+            for employee_id, day in changes:
+                month = f"{day.year:04d}-{day.month:02d}"
+                for key in (('employee', employee_id), ('employee', employee_id, month),
+                            ('all',), ('all', month)):
+                    self._counters[key] += 1
+
+    def employees_changed(self):
+        with self._lock:
+            self._counters[('employees',)] += 1
+
+    def invalidate_all(self):
+        with self._lock:
+            self._counters[('epoch',)] += 1
+
+    def employees_token(self):
+        """Changes with any employee row"""
+        return (self._get(('epoch',)), self._get(('employees',)))
+
+    def employee_token(self, employee_id):
+        """Changes with any of the employee's time entries"""
+        return self.employees_token() + (self._get(('employee', employee_id)),)
+
+    def range_token(self, employee_id, start, end):
+        """Changes with entries of ``employee_id`` (None for everyone) dated in [start, end]"""
+        owner = ('employee', employee_id) if employee_id is not None else ('all',)
+        months = list(_months(start, end))
+        if len(months) > MAX_TOKEN_MONTHS:
+            parts = (self._get(owner),)
+        else:
+            parts = tuple(self._get(owner + (month,)) for month in months)
+        return self.employees_token() + parts
+
+
+response_cache = LRUCache()
+generations = CacheGenerations()
+
+
+def init_cache(app):
+    app.config.setdefault('RESPONSE_CACHE_TTL', 60)
+    app.config.setdefault('RESPONSE_CACHE_SIZE', 256)
+    response_cache.ttl = app.config['RESPONSE_CACHE_TTL']
+    response_cache.maxsize = app.config['RESPONSE_CACHE_SIZE']
+    response_cache.clear()
+
+
+def invalidate_all():
+    """For writes that bypass the ORM session events"""
+    generations.invalidate_all()
+
+
+def view_etag(*parts):
+    """ETag for a page built from ``parts`` as seen by the current user"""
+    ttl = current_app.config['RESPONSE_CACHE_TTL'] or 1
+    window = int(time.time() // ttl)
+    digest = hashlib.sha1(repr((RELEASE, window, work_today(), parts)).encode('utf-8'))
+    return digest.hexdigest()[:24]
+
+
+def not_modified(etag):
+    """A 304 response if the client already has this version of the page, else None.
+
+    Pages with pending flash messages are never validated or tagged:
+    the messages are part of the body and shown only once.
+    """
+    if session.get('_flashes'):
+        return None
+    g.view_etag = etag
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+        return with_validators(response)
+    return None
+
+
+def with_validators(response):
+    """Tag a page response with the ETag chosen by not_modified()"""
+    etag = g.pop('view_etag', None)
+    if etag is not None:
+        response.set_etag(etag)
+        # Let browsers keep the page but revalidate it on every visit
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@on_change
+def _bump_generations(changes):
+    if changes.entries:
+        generations.entries_changed(changes.entries)
+    if changes.employees:
+        generations.employees_changed()
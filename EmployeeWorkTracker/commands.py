@@ -0,0 +1,205 @@
+import click
+from app import app, db
+from models import Employee, EmployeeDailyTotal, EmployeeWeeklyTotal, ApiToken
+
+
+@app.cli.command('rebuild-daily-totals')
+@click.option('--verify', is_flag=True, help='Only report drift, do not rewrite the table.')
+def rebuild_daily_totals(verify):
+    """Recompute employee_daily_total and employee_weekly_total from time_entry and report drift."""
+    drift = EmployeeDailyTotal.find_drift()
+    for employee_id, day, stored, expected in drift:
+        click.echo(f"employee={employee_id} date={day} stored={stored} expected={expected}")
+    click.echo(f"{len(drift)} drifted day(s) found.")
+    
+    if verify:
+        if drift:
+            raise SystemExit(1)
+        return
+    
+    rows = EmployeeDailyTotal.rebuild()
+    click.echo(f"Rebuilt {rows} daily total row(s).")
+    with db.engine.begin() as conn:
+        rows = EmployeeWeeklyTotal.rebuild(conn)
+    click.echo(f"Rebuilt {rows} weekly total row(s).")
+
+
+DEFAULT_ADMIN_EMAIL = 'admin@company.com'
+DEFAULT_ADMIN_PASSWORD = 'admin123'
+
+
+def seed_admin():
+    """Add the default admin account unless it exists; returns True if it was added"""
+    from auth import hash_password
+    if Employee.query.filter_by(email=DEFAULT_ADMIN_EMAIL).first():
+        return False
+    db.session.add(Employee(
+        first_name='Admin',
+        last_name='User',
+        email=DEFAULT_ADMIN_EMAIL,
+        employee_id='ADMIN001',
+        department='IT',
+        position='System Administrator',
+        is_admin=True,
+        password_hash=hash_password(DEFAULT_ADMIN_PASSWORD)
+    ))
+    db.session.commit()
+    return True
+
+
+def init_database(admin=True):
+    """Create or upgrade the schema and optionally add the default admin; returns the applied migrations"""
+    from migrations import upgrade
+    applied = upgrade()
+    if admin and seed_admin():
+        click.echo(f"Admin user created: {DEFAULT_ADMIN_EMAIL} / {DEFAULT_ADMIN_PASSWORD}")
+    return applied
+
+
+@app.cli.command('init-db')
+@click.option('--no-admin', is_flag=True, help='Do not add the default admin account.')
+def init_db(no_admin):
+    """Create or upgrade the database and add the default admin account."""
+    from migrations import LATEST_VERSION
+    applied = init_database(admin=not no_admin)
+    if applied:
+        click.echo(f"Applied migration(s): {', '.join(map(str, applied))}")
+    click.echo(f"Schema is at version {LATEST_VERSION}.")
+
+
+@app.cli.command('seed-admin')
+def seed_admin_command():
+    """Add the default admin account if it does not exist."""
+    if seed_admin():
+        click.echo(f"Admin user created: {DEFAULT_ADMIN_EMAIL} / {DEFAULT_ADMIN_PASSWORD}")
+    else:
+        click.echo(f"{DEFAULT_ADMIN_EMAIL} already exists.")
+
+
+@app.cli.command('upgrade-db')
+def upgrade_db():
+    """Apply pending schema migrations."""
+    from migrations import upgrade, LATEST_VERSION
+    applied = upgrade()
+    if applied:
+        click.echo(f"Applied migration(s): {', '.join(map(str, applied))}")
+    click.echo(f"Schema is at version {LATEST_VERSION}.")
+
+
+@app.cli.command('archive-entries')
+@click.option('--days', type=int, help='Archive approved entries older than this many days '
+                                       '(default ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int, help='Entries moved per transaction (default ARCHIVE_BATCH_SIZE).')
+@click.option('--dry-run', is_flag=True, help='Only count the entries that would move.')
+def archive_entries_command(days, batch_size, dry_run):
+    """Move old approved time entries into per-year archive tables."""
+    from archive import archive_cutoff, count_archivable, archive_entries, MIN_ARCHIVE_AFTER_DAYS
+    days = app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    if days < MIN_ARCHIVE_AFTER_DAYS:
+        raise click.BadParameter(f"Entries younger than {MIN_ARCHIVE_AFTER_DAYS} days are never archived",
+                                 param_hint='--days')
+    cutoff = archive_cutoff(days)
+    if dry_run:
+        click.echo(f"{count_archivable(cutoff)} approved entries dated before {cutoff} would be archived.")
+        return
+    moved = archive_entries(cutoff, batch_size or app.config['ARCHIVE_BATCH_SIZE'])
+    for year, rows in sorted(moved.items()):
+        click.echo(f"{year}: {rows} entries")
+    click.echo(f"Archived {sum(moved.values())} entries dated before {cutoff}.")
+
+
+@app.cli.command('backfill-durations')
+@click.option('--batch-size', type=int, help='Entries updated per transaction '
+                                             '(default DURATION_BACKFILL_BATCH_SIZE).')
+def backfill_durations_command(batch_size):
+    """Give older time entries UTC instants, re-dating and splitting clocked sessions by work day."""
+    from durations import backfill_durations
+    counts = backfill_durations(batch_size or app.config['DURATION_BACKFILL_BATCH_SIZE'],
+                                progress=lambda done, total: click.echo(f"{done}/{total} entries", err=True))
+    click.echo(f"Examined {counts['examined']} entries: {counts['redated']} re-dated, "
+               f"{counts['split']} split across days.")
+
+
+@app.cli.command('sweep-sessions')
+def sweep_sessions_command():
+    """Flag work sessions left open too long and auto-close the oldest."""
+    from alerts import sweep_open_sessions
+    result = sweep_open_sessions()
+    click.echo(f"{result['flagged']} new alert(s), {result['closed']} session(s) closed.")
+
+
+@app.cli.command('import-entries')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']),
+              help='Input format, guessed from the file extension by default.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per insert batch and transaction.')
+def import_entries_command(path, file_format, batch_size):
+    """Bulk import time entries from a CSV or JSON-lines file."""
+    from importer import import_file
+    result = import_file(path, file_format, batch_size)
+    for line_number, message in result.errors:
+        click.echo(f"line {line_number}: {message}", err=True)
+    if result.error_count > len(result.errors):
+        click.echo(f"... {result.error_count - len(result.errors)} more error(s) not shown", err=True)
+    click.echo(f"Read {result.rows_read} row(s), inserted {result.rows_inserted}, "
+               f"{result.error_count} error(s) in {result.elapsed:.2f}s "
+               f"({result.rows_per_second} rows/s).")
+
+
+@app.cli.command('create-api-token')
+@click.argument('name')
+@click.option('--employee', 'employee_code', help='Employee code; without it the token may punch for anyone.')
+def create_api_token(name, employee_code):
+    """Issue a bearer token for a kiosk, badge reader or employee."""
+    employee = None
+    if employee_code:
+        employee = Employee.query.filter_by(employee_id=employee_code).first()
+        if employee is None:
+            raise click.BadParameter(f"Unknown employee {employee_code!r}", param_hint='--employee')
+    token, raw_token = ApiToken.issue(name, employee)
+    db.session.commit()
+    click.echo(f"Token {token.id} ({name}) created. It will not be shown again:")
+    click.echo(raw_token)
+
+
+@app.cli.command('revoke-api-token')
+@click.argument('token_id', type=int)
+def revoke_api_token(token_id):
+    """Deactivate an API token by id."""
+    token = db.session.get(ApiToken, token_id)
+    if token is None:
+        raise click.BadParameter(f"No API token with id {token_id}", param_hint='TOKEN_ID')
+    token.is_active = False
+    db.session.commit()
+    click.echo(f"Token {token_id} ({token.name}) revoked.")
+
+
+@app.cli.command('seed-data')
+@click.option('--employees', default=1000, show_default=True, help='Employees to generate.')
+@click.option('--days', 'history_days', default=90, show_default=True, help='Days of time entry history.')
+@click.option('--open-sessions', 'open_session_ratio', default=0.05, show_default=True,
+              help='Share of employees left clocked in.')
+@click.option('--seed', default=42, show_default=True, help='Random seed; the same seed gives the same data.')
+def seed_data(employees, history_days, open_session_ratio, seed):
+    """Add a synthetic dataset for demos and load tests."""
+    from datagen import generate_dataset, DEFAULT_PASSWORD
+    stats = generate_dataset(employees, history_days, open_session_ratio, seed)
+    click.echo(f"Added {stats.employees} employee(s), {stats.time_entries} time entries and "
+               f"{stats.active_sessions} open session(s) in {stats.elapsed:.1f}s.")
+    click.echo(f"Generated employees sign in as empNNNNNN@example.com / {DEFAULT_PASSWORD}")
+
+
+@app.cli.command('run-jobs')
+@click.option('--workers', default=2, show_default=True, help='Worker threads.')
+def run_jobs(workers):
+    """Run background jobs in this process until interrupted."""
+    import time
+    from jobs import worker_pool
+    worker_pool.start(app, workers)
+    click.echo(f"Running {workers} job worker(s), press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        click.echo("Stopping after the running jobs finish ...")
+        worker_pool.stop()
@@ -0,0 +1,104 @@
+"""Act on what a transaction changed once it has committed.
+
+The view cache, the session registry, the login and directory caches and
+the alert rules keep in step with the database the same way: collect
+what each flush changed into session.info, act on it after the commit,
+and drop it on a rollback. on_commit() registers those three session
+events for one collector.
+
+Most of them only need to know which time entries, employees and open
+sessions changed. on_change() subscribers get that as one Changes per
+commit. Bulk paths that write time entries with Core statements fire no
+session events; they call entries_written() after their commit instead,
+which reaches the same subscribers.
+"""
+import logging
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import Employee, TimeEntry, ActiveSession
+
+logger = logging.getLogger(__name__)
+
+
+class Changes:
+    """What one committed transaction changed"""
+    __slots__ = ('entries', 'employees', 'closed_sessions')
+
+    def __init__(self, entries=(), employees=(), closed_sessions=()):
+        # (employee_id, date) of every time entry inserted, updated or deleted, old values included
+        self.entries = set(entries)
+        self.employees = set(employees)
+        # (id, employee_id, start_time) of deleted active_session rows
+        self.closed_sessions = list(closed_sessions)
+
+    def __bool__(self):
+        return bool(self.entries or self.employees or self.closed_sessions)
+
+
+def on_commit(key, collect, apply, pending=set):
+    """Call ``collect(session, value)`` after each flush and ``apply(value)`` once the transaction commits.
+
+    ``value`` is created by ``pending()`` for each transaction and kept in
+    session.info[key]. ``apply`` is skipped when it is still empty; a
+    rollback drops it.
+    """
+    @event.listens_for(Session, 'after_flush')
+    def _collect(session, flush_context):
+        value = session.info.get(key)
+        if value is None:
+            value = session.info[key] = pending()
+        collect(session, value)
+
+    @event.listens_for(Session, 'after_commit')
+    def _apply(session):
+        value = session.info.pop(key, None)
+        if value:
+            apply(value)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _drop(session):
+        session.info.pop(key, None)
+
+
+_subscribers = []
+
+
+def on_change(apply):
+    """Call ``apply(changes)`` after each commit that changed entries, employees or open sessions"""
+    _subscribers.append(apply)
+    return apply
+
+
+def entries_written(changes):
+    """Report (employee_id, date) pairs of time entries a committed Core statement wrote"""
+    _publish(Changes(entries=changes))
+
+
+def _publish(changes):
+    for apply in _subscribers:
+        # The write has committed; a failing subscriber must not fail it
+        try:
+            apply(changes)
+        except Exception:
+            logger.exception("Commit subscriber %s failed", apply.__qualname__)
+
+
+def _collect(session, changes):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, TimeEntry):
+            changes.entries.add((obj.employee_id, obj.date))
+            # Moving an entry to another day or employee changes the old one too
+            state = inspect(obj)
+            old_employee = state.attrs.employee_id.history.deleted
+            old_date = state.attrs.date.history.deleted
+            if old_employee or old_date:
+                changes.entries.add((old_employee[0] if old_employee else obj.employee_id,
+                                     old_date[0] if old_date else obj.date))
+        elif isinstance(obj, Employee):
+            changes.employees.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, ActiveSession):
+            changes.closed_sessions.append((obj.id, obj.employee_id, obj.start_time))
+
+
+on_commit('committed_changes', _collect, _publish, Changes)
@@ -0,0 +1,222 @@
+"""Reproducible synthetic datasets for demos, load tests and benchmarks.
+
+generate_dataset() adds N employees spread over departments, a history
+of daily time entries with their daily and weekly total rows, and open
+ActiveSession rows for a share of employees. The same seed always gives
+the same data.
+
+Shift patterns:
+- day shifts mostly start between 07:30 and 10:00 and run about 8 hours
+- a few night shifts cross midnight
+- weekends are mostly off and there are occasional absences
+- older entries are mostly approved, the last two weeks mostly pending
+
+Rows go in through Core executemany batches like the importer, so
+100k employees with a month of history load in a few minutes. All
+generated employees share one password hash: hashing 100k passwords
+would take longer than the rest of the run.
+"""
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+from sqlalchemy import func, insert
+from app import db
+from models import Employee, TimeEntry, ActiveSession, EmployeeDailyTotal, EmployeeWeeklyTotal, week_start
+from durations import span, hours as hours_between, work_today
+
+DEFAULT_PASSWORD = 'password'
+BATCH_SIZE = 5000
+
+DEPARTMENTS = {
+    'Engineering': ['Software Engineer', 'Senior Engineer', 'QA Engineer', 'Engineering Manager'],
+    'Operations': ['Operator', 'Shift Lead', 'Logistics Coordinator', 'Operations Manager'],
+    'Sales': ['Account Executive', 'Sales Representative', 'Sales Manager'],
+    'Support': ['Support Agent', 'Support Lead'],
+    'Finance': ['Accountant', 'Payroll Specialist', 'Financial Analyst'],
+    'HR': ['HR Generalist', 'Recruiter'],
+    'Marketing': ['Marketing Specialist', 'Designer', 'Content Writer'],
+    'IT': ['System Administrator', 'Help Desk Technician'],
+}
+
+# Relative department sizes
+DEPARTMENT_WEIGHTS = [30, 25, 12, 10, 6, 4, 8, 5]
+
+PROJECTS = ['Website Redesign', 'Mobile App', 'Data Migration', 'Warehouse Automation',
+            'Q4 Campaign', 'Customer Onboarding', 'Internal Tools', None]
+
+FIRST_NAMES = ['Alex', 'Maria', 'Ivan', 'Olga', 'John', 'Emma', 'Dmitry', 'Anna', 'Sergey', 'Elena',
+               'Michael', 'Sofia', 'David', 'Natalia', 'Pavel', 'Laura', 'Andrei', 'Irina', 'Peter', 'Kate']
+LAST_NAMES = ['Smith', 'Ivanov', 'Petrova', 'Johnson', 'Sokolov', 'Brown', 'Kuznetsova', 'Miller',
+              'Popov', 'Davis', 'Volkova', 'Wilson', 'Morozov', 'Taylor', 'Novikova', 'Clark']
+
+
+class DatasetStats:
+    def __init__(self):
+        self.employees = 0
+        self.time_entries = 0
+        self.daily_totals = 0
+        self.weekly_totals = 0
+        self.active_sessions = 0
+        self.elapsed = 0.0
+
+    def to_dict(self):
+        return {
+            'employees': self.employees,
+            'time_entries': self.time_entries,
+            'daily_totals': self.daily_totals,
+            'weekly_totals': self.weekly_totals,
+            'active_sessions': self.active_sessions,
+            'elapsed_seconds': round(self.elapsed, 2),
+        }
+
+
+def _insert_batches(table, rows, batch_size=BATCH_SIZE):
+    """executemany ``rows`` (an iterable of dicts) in batches; returns the row count"""
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(insert(table), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(table), batch)
+        count += len(batch)
+    db.session.commit()
+    return count
+
+
+def _employee_rows(rng, first_id, count, password_hash, start_date):
+    departments = list(DEPARTMENTS)
+    for employee_id in range(first_id, first_id + count):
+        department = rng.choices(departments, DEPARTMENT_WEIGHTS)[0]
+        yield {
+            'id': employee_id,
+            'employee_id': f"EMP{employee_id:06d}",
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'email': f"emp{employee_id:06d}@example.com",
+            'phone': f"+1-555-{rng.randint(0, 9999):04d}",
+            'department': department,
+            'position': rng.choice(DEPARTMENTS[department]),
+            'hire_date': start_date - timedelta(days=rng.randint(0, 3650)),
+            'is_admin': False,
+            'is_active': rng.random() > 0.02,
+            'password_hash': password_hash,
+            'created_at': datetime.combine(start_date, dt_time(9)),
+        }
+
+
+def _shift(rng, night_worker):
+    """(start_time, end_time, break_hours) for one worked day"""
+    if night_worker:
+        start = dt_time(22, rng.choice((0, 15, 30)))
+        return start, dt_time(6, rng.choice((0, 15, 30))), 0.5
+    start_minutes = int(rng.triangular(450, 600, 510)) // 5 * 5
+    length_minutes = int(rng.gauss(510, 45)) // 5 * 5
+    end_minutes = min(start_minutes + length_minutes, 23 * 60 + 55)
+    start = dt_time(start_minutes // 60, start_minutes % 60)
+    end = dt_time(end_minutes // 60, end_minutes % 60)
+    break_hours = 1.0 if length_minutes > 420 else 0.5
+    return start, end, break_hours
+
+
+def _history_rows(rng, employee_ids, start_date, end_date, pending_after, totals, weekly):
+    """Time entry rows, one per worked day; fills ``totals`` with the matching daily totals
+    and ``weekly`` with {(employee_id, week_start, project): [hours, entries]}"""
+    days = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+    for employee_id in employee_ids:
+        night_worker = rng.random() < 0.05
+        project = rng.choice(PROJECTS)
+        for day in days:
+            weekend = day.weekday() >= 5
+            if (weekend and rng.random() > 0.05) or (not weekend and rng.random() < 0.04):
+                continue
+            start, end, break_hours = _shift(rng, night_worker)
+            started_at, ended_at = span(day, start, end)
+            hours = hours_between(started_at, ended_at, break_hours)
+            # Recorded after the shift ends, which for night shifts is the next day (naive UTC)
+            recorded_at = ended_at.replace(tzinfo=None) + timedelta(minutes=rng.randint(0, 90))
+            approved = rng.random() < (0.2 if day > pending_after else 0.9)
+            entry_project = project if rng.random() < 0.8 else rng.choice(PROJECTS)
+            totals.append({'employee_id': employee_id, 'date': day, 'hours': hours, 'entries_count': 1})
+            week = weekly[(employee_id, week_start(day), entry_project or '')]
+            week[0] += hours
+            week[1] += 1
+            yield {
+                'employee_id': employee_id,
+                'date': day,
+                'start_time': start,
+                'end_time': end,
+                'started_at': started_at,
+                'ended_at': ended_at,
+                'hours_worked': hours,
+                'break_hours': break_hours,
+                'description': None,
+                'project': entry_project,
+                'is_approved': approved,
+                'created_at': recorded_at,
+                'updated_at': recorded_at,
+            }
+
+
+def generate_dataset(employees=1000, history_days=90, open_session_ratio=0.05, seed=42,
+                     password=DEFAULT_PASSWORD, end_date=None):
+    """Add a synthetic dataset to the current database and return DatasetStats.
+
+    History covers ``history_days`` days ending yesterday (or ``end_date``).
+    Today is left for open sessions, which start earlier the same day.
+    """
+    from auth import hash_password
+
+    stats = DatasetStats()
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    end_date = end_date or work_today() - timedelta(days=1)
+    start_date = end_date - timedelta(days=history_days - 1)
+
+    first_id = (db.session.query(func.max(Employee.id)).scalar() or 0) + 1
+    stats.employees = _insert_batches(
+        Employee, _employee_rows(rng, first_id, employees, hash_password(password), start_date))
+    employee_ids = range(first_id, first_id + employees)
+
+    # Totals are collected per chunk of employees so memory stays bounded
+    pending_after = end_date - timedelta(days=14)
+    chunk = max(1, BATCH_SIZE * 4 // max(history_days, 1))
+    for offset in range(0, employees, chunk):
+        totals = []
+        weekly = defaultdict(lambda: [0.0, 0])
+        stats.time_entries += _insert_batches(TimeEntry, _history_rows(
+            rng, employee_ids[offset:offset + chunk], start_date, end_date, pending_after, totals, weekly))
+        stats.daily_totals += _insert_batches(EmployeeDailyTotal, totals)
+        stats.weekly_totals += _insert_batches(EmployeeWeeklyTotal, (
+            {'employee_id': employee_id, 'week_start': week, 'project': project,
+             'hours': round(hours, 4), 'entries_count': count}
+            for (employee_id, week, project), (hours, count) in weekly.items()
+        ))
+
+    now = datetime.utcnow()
+    clocked_in = rng.sample(employee_ids, int(employees * open_session_ratio))
+    stats.active_sessions = _insert_batches(ActiveSession, (
+        {
+            'employee_id': employee_id,
+            'start_time': now - timedelta(minutes=rng.randint(10, 480)),
+            'description': None,
+            'project': rng.choice(PROJECTS),
+            'created_at': now,
+        }
+        for employee_id in sorted(clocked_in)
+    ))
+
+    # Core inserts bypass the session events that keep these in step
+    from session_registry import active_sessions
+    from directory import department_facet
+    from cache import invalidate_all
+    active_sessions.rebuild()
+    department_facet.invalidate()
+    invalidate_all()
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
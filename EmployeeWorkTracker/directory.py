@@ -0,0 +1,104 @@
+"""Helpers for the /employees directory listing.
+
+The list reads only the columns it shows (no password hash, no ORM
+objects) and pages by keyset on (first_name, last_name, id), which
+ix_employee_name serves directly. The department dropdown comes from a
+cached facet with a count per department. Any committed employee insert,
+update or delete invalidates the facet. Other worker processes refresh
+theirs after FACET_TTL seconds.
+"""
+import base64
+import binascii
+import json
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import func
+from app import db
+from models import Employee
+from commit_hooks import on_change
+
+EMPLOYEE_PAGE_SIZE = 50
+
+# Seconds a worker trusts its facet without a local write invalidating it
+FACET_TTL = 60
+
+LIST_COLUMNS = [
+    Employee.id, Employee.employee_id, Employee.first_name, Employee.last_name,
+    Employee.email, Employee.phone, Employee.department, Employee.position,
+    Employee.hire_date, Employee.is_admin, Employee.is_active,
+]
+
+LIST_ORDER = [Employee.first_name, Employee.last_name, Employee.id]
+
+
+class EmployeeSummary(namedtuple('EmployeeSummary', [column.key for column in LIST_COLUMNS])):
+    __slots__ = ()
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+
+def summaries(rows):
+    return [EmployeeSummary(*row) for row in rows]
+
+
+def format_employee_cursor(employee):
+    """Encode the (first_name, last_name, id) keyset position of a list row"""
+    key = json.dumps([employee.first_name, employee.last_name, employee.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii')
+
+
+def parse_employee_cursor(value):
+    """Decode a cursor produced by format_employee_cursor, or None if invalid"""
+    if not value:
+        return None
+    try:
+        first_name, last_name, employee_id = json.loads(base64.urlsafe_b64decode(value.encode('ascii')))
+        return str(first_name), str(last_name), int(employee_id)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+
+class DepartmentFacet:
+    """Cached employee counts per department, plus the overall headcount"""
+
+    def __init__(self, ttl=FACET_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = None
+        self._generation = 0
+
+    def snapshot(self):
+        """Return ([(department, count)] ordered by name, total employees)"""
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._snapshot
+            generation = self._generation
+        # One pass over ix_employee_department_name
+        rows = db.session.query(Employee.department, func.count(Employee.id))\
+            .group_by(Employee.department).order_by(Employee.department).all()
+        counts = [(department, count) for department, count in rows if department]
+        snapshot = (counts, sum(count for _, count in rows))
+        with self._lock:
+            # Do not cache counts read before a concurrent invalidation
+            if generation == self._generation:
+                self._snapshot = snapshot
+                self._loaded_at = time.monotonic()
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._generation += 1
+
+
+department_facet = DepartmentFacet()
+
+
+@on_change
+def _invalidate_facet(changes):
+    if changes.employees:
+        department_facet.invalidate()
@@ -0,0 +1,256 @@
+"""Work durations: when a piece of work happened, which days it counts toward
+and how many hours it was.
+
+Instants are timezone-aware UTC datetimes; naive values are taken to be
+UTC, which is how active_session and the API punches store them. Work is
+attributed to calendar days in WORK_TIMEZONE (an IANA name, UTC by
+default). A time entry's date, start_time and end_time are local wall
+times in that zone; started_at and ended_at are the exact UTC instants.
+
+hours() is the one place a duration becomes hours_worked. Sessions that
+run past local midnight become one entry per local day (entry_values), so
+the daily and weekly totals get each day's share. Manual and imported
+entries stay one row dated by their start, with an end earlier than the
+start falling on the next day.
+
+backfill_durations() fills started_at/ended_at on entries written before
+they existed, fixing the dates and hours of the ones it can prove came
+from a clocked session.
+"""
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORK_TIMEZONE = 'UTC'
+
+# A clocked-out entry's created_at lands this close after the end of its session
+SESSION_RECORD_SLACK = timedelta(minutes=2)
+
+
+def _zone(name):
+    try:
+        return _cached_zone(name)
+    except ZoneInfoNotFoundError:
+        if name.upper() == 'UTC':
+            # No tz database installed, which UTC does not need
+            return timezone.utc
+        raise ValueError(f"Unknown WORK_TIMEZONE {name!r}")
+
+
+@lru_cache(maxsize=None)
+def _cached_zone(name):
+    return ZoneInfo(name)
+
+
+def settings_from_env():
+    """Duration app.config values read from the environment"""
+    name = os.environ.get('WORK_TIMEZONE', DEFAULT_WORK_TIMEZONE)
+    _zone(name)
+    return {
+        'WORK_TIMEZONE': name,
+        'DURATION_BACKFILL_BATCH_SIZE': int(os.environ.get('DURATION_BACKFILL_BATCH_SIZE', 5000)),
+    }
+
+
+def work_timezone():
+    """The zone whose calendar days work is attributed to"""
+    if has_app_context():
+        name = current_app.config.get('WORK_TIMEZONE', DEFAULT_WORK_TIMEZONE)
+    else:
+        name = os.environ.get('WORK_TIMEZONE', DEFAULT_WORK_TIMEZONE)
+    return _zone(name)
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+def as_utc(moment):
+    """An aware UTC datetime; naive values are already UTC"""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def local_date(moment, tz=None):
+    """Calendar day of an instant in the work timezone"""
+    return as_utc(moment).astimezone(tz or work_timezone()).date()
+
+
+def work_today():
+    """Today in the work timezone, the date new entries and 'today' totals use"""
+    return local_date(utc_now())
+
+
+def span(day, start_time, end_time, tz=None):
+    """(started_at, ended_at) in UTC for wall times on ``day``; an end before the start is the next day"""
+    tz = tz or work_timezone()
+    started_at = datetime.combine(day, start_time, tzinfo=tz)
+    end_day = day + timedelta(days=1) if end_time < start_time else day
+    ended_at = datetime.combine(end_day, end_time, tzinfo=tz)
+    return started_at.astimezone(timezone.utc), ended_at.astimezone(timezone.utc)
+
+
+def hours(started_at, ended_at, break_hours=0):
+    """Hours worked between two instants, less breaks, rounded to 2 decimals"""
+    elapsed = as_utc(ended_at) - as_utc(started_at)
+    return round(elapsed.total_seconds() / 3600 - (break_hours or 0), 2)
+
+
+def split_by_day(started_at, ended_at, tz=None):
+    """[(local date, segment start, segment end)] cutting [started_at, ended_at] at local midnights"""
+    tz = tz or work_timezone()
+    started_at, ended_at = as_utc(started_at), as_utc(ended_at)
+    segments = []
+    cursor = started_at
+    while True:
+        day = cursor.astimezone(tz).date()
+        midnight = datetime.combine(day + timedelta(days=1), time(), tzinfo=tz).astimezone(timezone.utc)
+        if ended_at <= midnight:
+            segments.append((day, cursor, ended_at))
+            return segments
+        segments.append((day, cursor, midnight))
+        cursor = midnight
+
+
+def entry_values(started_at, ended_at, break_hours=0, tz=None):
+    """time_entry values for the work between two instants, one dict per local day.
+
+    Breaks are taken out of the earliest days first. Segments that
+    start at midnight begin at 00:00, and every segment but the last ends
+    at 00:00 of the next day.
+    """
+    tz = tz or work_timezone()
+    remaining_break = break_hours or 0
+    values = []
+    for day, segment_start, segment_end in split_by_day(started_at, ended_at, tz):
+        worked = (segment_end - segment_start).total_seconds() / 3600
+        segment_break = min(remaining_break, worked)
+        remaining_break -= segment_break
+        values.append({
+            'date': day,
+            'start_time': segment_start.astimezone(tz).time().replace(tzinfo=None),
+            'end_time': segment_end.astimezone(tz).time().replace(tzinfo=None),
+            'started_at': segment_start,
+            'ended_at': segment_end,
+            'break_hours': round(segment_break, 4),
+            'hours_worked': hours(segment_start, segment_end, segment_break),
+        })
+    return values
+
+
+def _session_instants(row):
+    """(started_at, ended_at) of an entry written by the old clock-out, else None.
+
+    That code stored the session's UTC times of day, no break, the exact
+    elapsed hours, and a created_at moments after the end. The date came
+    from the server's local clock, so it is not trusted.
+    """
+    if row.break_hours or row.created_at is None or row.hours_worked is None:
+        return None
+    created_at = row.created_at
+    ended_at = datetime.combine(created_at.date(), row.end_time)
+    if ended_at > created_at:
+        ended_at -= timedelta(days=1)
+    if created_at - ended_at > SESSION_RECORD_SLACK:
+        return None
+    started_at = datetime.combine(ended_at.date(), row.start_time)
+    if started_at > ended_at:
+        started_at -= timedelta(days=1)
+    # Sessions longer than a day wrap around the clock
+    elapsed_hours = (ended_at - started_at).total_seconds() / 3600
+    started_at -= timedelta(days=max(round((row.hours_worked - elapsed_hours) / 24), 0))
+    if abs(hours(started_at, ended_at) - row.hours_worked) > 0.011:
+        return None
+    return as_utc(started_at), as_utc(ended_at)
+
+
+def backfill_durations(batch_size=5000, progress=None):
+    """Give every live entry with start and end times its UTC instants, in one pass.
+
+    Entries from the old clock-out are re-dated and split at local
+    midnights; the rest keep their date and wall times. hours_worked is
+    recomputed from the instants, and the daily and weekly totals, the
+    view cache and the alert rules follow the changes. Each batch of
+    ``batch_size`` entries commits on its own, so the backfill can be
+    interrupted and run again. Archived entries are read-only and left
+    as they are. ``progress(done, total)`` is called after each batch.
+
+    Returns {'examined', 'updated', 'split', 'redated'}.
+    """
+    from sqlalchemy import select, func, bindparam
+    from app import db
+    from commit_hooks import entries_written
+    from models import TimeEntry, apply_daily_total_deltas, apply_weekly_total_deltas, week_start
+
+    live = TimeEntry.__table__
+    pending = (live.c.started_at.is_(None), live.c.start_time.isnot(None), live.c.end_time.isnot(None))
+    total = db.session.execute(select(func.count()).select_from(live).where(*pending)).scalar()
+    db.session.commit()
+
+    tz = work_timezone()
+    # SET takes the columns in each parameter dict; updated_at is passed so it keeps its value
+    update = live.update().where(live.c.id == bindparam('entry_id'))
+    copied = [column.name for column in live.c if column.name != 'id']
+    counts = {'examined': 0, 'updated': 0, 'split': 0, 'redated': 0}
+    last_id = 0
+    while True:
+        batch = db.session.execute(select(live).where(*pending, live.c.id > last_id)
+                                   .order_by(live.c.id).limit(batch_size)).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        updates, inserts = [], []
+        daily = defaultdict(lambda: [0.0, 0])
+        weekly = defaultdict(lambda: [0.0, 0])
+
+        def count(employee_id, day, project, worked, entries):
+            for totals, key in ((daily, (employee_id, day)), (weekly, (employee_id, week_start(day), project or ''))):
+                totals[key][0] += worked
+                totals[key][1] += entries
+
+        for row in batch:
+            instants = _session_instants(row)
+            if instants is not None:
+                segments = entry_values(*instants, tz=tz)
+            else:
+                started_at, ended_at = span(row.date, row.start_time, row.end_time, tz)
+                segments = [{'date': row.date, 'start_time': row.start_time, 'end_time': row.end_time,
+                             'started_at': started_at, 'ended_at': ended_at, 'break_hours': row.break_hours,
+                             'hours_worked': hours(started_at, ended_at, row.break_hours)}]
+            first, *rest = segments
+            updates.append(dict(first, entry_id=row.id, updated_at=row.updated_at))
+            inserts.extend(dict({name: getattr(row, name) for name in copied}, **segment) for segment in rest)
+
+            if first['date'] != row.date:
+                counts['redated'] += 1
+            if rest:
+                counts['split'] += 1
+            if rest or first['date'] != row.date or first['hours_worked'] != row.hours_worked:
+                count(row.employee_id, row.date, row.project, -(row.hours_worked or 0), -1)
+                for segment in segments:
+                    count(row.employee_id, segment['date'], row.project, segment['hours_worked'], 1)
+
+        db.session.execute(update, updates)
+        if inserts:
+            db.session.execute(live.insert(), inserts)
+        apply_daily_total_deltas(db.session, daily)
+        apply_weekly_total_deltas(db.session, weekly)
+        db.session.commit()
+        entries_written(key for key, (worked, entries) in daily.items() if worked or entries)
+
+        counts['examined'] += len(batch)
+        counts['updated'] += len(updates)
+        if progress:
+            progress(counts['examined'], total)
+    if counts['examined']:
+        logger.info("Backfilled durations of %s time entries (%s split, %s re-dated)",
+                    counts['examined'], counts['split'], counts['redated'])
+    return counts
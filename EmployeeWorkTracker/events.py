@@ -0,0 +1,100 @@
+"""In-process publish/subscribe for live dashboard updates.
+
+Events go into one shared ring buffer with increasing sequence numbers.
+A subscriber holds only the sequence number it has seen, so publishing
+costs the same for 10 or 10,000 connected clients: append plus one
+notify_all. Clients that fall further behind than the buffer holds get a
+``resync`` event and reload the page.
+
+Admins see every event; an employee's dashboard only gets that
+employee's own. Each /events/stream response waits on the broker, so
+gunicorn.conf.py serves the app with gevent workers: an open stream is
+an idle greenlet, not an OS thread, and one worker holds thousands of
+them. A response still ends after EVENT_STREAM_SECONDS and the browser
+reconnects, resuming from the last event it saw.
+
+The broker lives in one process. With several gunicorn workers a page
+only hears about punches handled by the worker serving its stream; the
+rest show up on the next page load.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+# Seconds between keep-alive comments, keeps proxies from closing idle streams
+HEARTBEAT_SECONDS = 15
+
+# Default length of one stream response before the browser reconnects
+STREAM_SECONDS = 300
+
+
+class EventBroker:
+    def __init__(self, history=1000):
+        self._condition = threading.Condition()
+        self._events = deque(maxlen=history)
+        self._last_seq = 0
+
+    @property
+    def last_seq(self):
+        return self._last_seq
+
+    def publish(self, event_type, data):
+        """Broadcast an event; ``data`` must be JSON serializable"""
+        with self._condition:
+            self._last_seq += 1
+            self._events.append((self._last_seq, event_type, data))
+            self._condition.notify_all()
+        return self._last_seq
+
+    def wait(self, after_seq, timeout=HEARTBEAT_SECONDS):
+        """Return events newer than ``after_seq``, blocking up to ``timeout``.
+
+        Returns None if events after ``after_seq`` were already dropped
+        from the buffer, meaning the caller has to resync.
+        """
+        with self._condition:
+            if self._last_seq <= after_seq:
+                self._condition.wait(timeout)
+            if not self._events or self._events[-1][0] <= after_seq:
+                return []
+            if self._events[0][0] > after_seq + 1:
+                return None
+            return [event for event in self._events if event[0] > after_seq]
+
+
+broker = EventBroker()
+
+
+def format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def stream_events(last_seq, employee_id=None, max_seconds=STREAM_SECONDS):
+    """Yield SSE frames after ``last_seq`` for up to ``max_seconds``.
+
+    When ``employee_id`` is given only that employee's events are sent;
+    admins subscribe with None and see everything.
+    """
+    deadline = time.monotonic() + max_seconds
+    yield "retry: 5000\n\n"
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        events = broker.wait(last_seq, min(HEARTBEAT_SECONDS, remaining))
+        if events is None:
+            yield format_sse('resync', {}, broker.last_seq)
+            return
+        if not events:
+            yield ": keep-alive\n\n"
+            continue
+        for seq, event_type, data in events:
+            last_seq = seq
+            if employee_id is None or data.get('employee_id') == employee_id:
+                yield format_sse(event_type, data, seq)
@@ -0,0 +1,101 @@
+"""Streaming exports of time entries for payroll.
+
+Rows are fetched with a server-side cursor in ``yield_per`` batches and
+written out as they arrive, so memory stays flat however long the date
+range is, and the first bytes go out before the query finishes.
+"""
+import csv
+import importlib.util
+import io
+import tempfile
+from app import db
+from archive import entry_source
+from models import Employee, TimeEntry
+
+# Rows fetched per round trip and CSV rows per chunk sent to the client
+FETCH_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    ('Employee ID', Employee.employee_id),
+    ('First Name', Employee.first_name),
+    ('Last Name', Employee.last_name),
+    ('Department', Employee.department),
+    ('Position', Employee.position),
+    ('Date', TimeEntry.date),
+    ('Start Time', TimeEntry.start_time),
+    ('End Time', TimeEntry.end_time),
+    ('Hours Worked', TimeEntry.hours_worked),
+    ('Break Hours', TimeEntry.break_hours),
+    ('Project', TimeEntry.project),
+    ('Description', TimeEntry.description),
+    ('Approved', TimeEntry.is_approved),
+]
+
+# XLSX export is optional; openpyxl is only imported once a workbook is built
+XLSX_AVAILABLE = importlib.util.find_spec('openpyxl') is not None
+
+
+def export_query(start_date, end_date, employee_id=None):
+    """Column-projected rows for the range; no ORM objects are built.
+    
+    Archived years are read along with time_entry when the range needs them.
+    """
+    entries = entry_source(start_date, end_date)
+    columns = [getattr(entries, column.key) if column.class_ is TimeEntry else column
+               for _, column in EXPORT_COLUMNS]
+    query = db.session.query(*columns)\
+        .join(Employee, entries.employee_id == Employee.id)\
+        .filter(entries.date >= start_date, entries.date <= end_date)
+    if employee_id is not None:
+        query = query.filter(entries.employee_id == employee_id)
+    return query.order_by(entries.date, entries.id)\
+        .execution_options(stream_results=True, yield_per=FETCH_SIZE)
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(query):
+    """Yield the CSV export in chunks of about FETCH_SIZE rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+
+    for count, row in enumerate(query, start=1):
+        writer.writerow([_format_value(value) for value in row])
+        if count % FETCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_xlsx(query, chunk_size=64 * 1024):
+    """Yield an XLSX workbook built in openpyxl's write-only mode.
+
+    XLSX is a zip archive that is only valid once complete, so rows are
+    spooled to a temporary file with constant memory and then streamed.
+    """
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Time Entries')
+    sheet.append([header for header, _ in EXPORT_COLUMNS])
+    for row in query:
+        # openpyxl stores dates, times and booleans natively
+        sheet.append(list(row))
+
+    with tempfile.TemporaryFile() as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
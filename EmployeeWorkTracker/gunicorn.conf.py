@@ -0,0 +1,27 @@
+"""gunicorn settings, read from the working directory by ``gunicorn main:app``.
+
+Every open dashboard keeps an /events/stream response waiting on the
+event broker. gevent workers make each of those an idle greenlet, so
+one worker serves thousands of them next to the ordinary requests.
+Without gevent installed this falls back to threaded workers, where
+every open stream holds one of the ``threads``.
+"""
+import importlib.util
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+
+if importlib.util.find_spec('gevent'):
+    worker_class = 'gevent'
+    # Open streams and requests in flight per worker
+    worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+
+    def post_fork(server, worker):
+        # psycopg2 waits for PostgreSQL in C and would block every greenlet
+        # of the worker; psycogreen makes it yield to the gevent hub instead
+        if importlib.util.find_spec('psycogreen'):
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+else:
+    worker_class = 'gthread'
+    threads = int(os.environ.get('WORKER_THREADS', 8))
@@ -0,0 +1,224 @@
+"""Bulk import of historical time entries from CSV or JSON lines.
+
+Records are parsed and validated one at a time as the file is read.
+Valid rows are inserted with executemany in batches, and each batch is
+committed together with its daily and weekly total updates. A bad row is
+reported with its line number and does not stop the import.
+
+Recognized fields: employee_id (the employee code, e.g. EMP042), date
+(YYYY-MM-DD), start_time / end_time (HH:MM or HH:MM:SS), break_hours,
+hours_worked (only used without start/end times), project, description
+and is_approved.
+"""
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from app import db
+from models import Employee, TimeEntry, apply_entry_rows
+from durations import span, hours
+from commit_hooks import entries_written
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Keep the summary readable on files with many bad rows
+MAX_REPORTED_ERRORS = 1000
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+
+
+class ImportRowError(ValueError):
+    """A record that cannot be turned into a time entry"""
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_inserted = 0
+        self.error_count = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows_read / self.elapsed, 1) if self.elapsed else 0.0
+
+    def add_error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, message))
+
+    def to_dict(self):
+        return {
+            'rows_read': self.rows_read,
+            'rows_inserted': self.rows_inserted,
+            'error_count': self.error_count,
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': self.rows_per_second,
+        }
+
+
+def iter_records(stream, file_format):
+    """Yield (line_number, dict) pairs from a text stream"""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif file_format == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, ImportRowError(f"invalid JSON: {e.msg}")
+                continue
+            yield line_number, record
+    else:
+        raise ValueError(f"Unsupported import format {file_format!r}, expected 'csv' or 'jsonl'")
+
+
+def _text(record, field):
+    value = record.get(field)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _parse_time(value, field):
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    raise ImportRowError(f"{field} must be HH:MM, got {value!r}")
+
+
+def _parse_float(value, field):
+    try:
+        number = float(value)
+    except ValueError:
+        raise ImportRowError(f"{field} must be a number, got {value!r}")
+    if number < 0:
+        raise ImportRowError(f"{field} cannot be negative")
+    return number
+
+
+def parse_record(record, employee_ids):
+    """Validate one record and return the column values for time_entry.
+
+    ``employee_ids`` maps employee codes to primary keys.
+    """
+    if not isinstance(record, dict):
+        raise ImportRowError("record must be an object")
+
+    code = _text(record, 'employee_id')
+    if not code:
+        raise ImportRowError("employee_id is required")
+    if code not in employee_ids:
+        raise ImportRowError(f"unknown employee_id {code!r}")
+
+    day = _text(record, 'date')
+    try:
+        entry_date = datetime.strptime(day, '%Y-%m-%d').date()
+    except ValueError:
+        raise ImportRowError(f"date must be YYYY-MM-DD, got {day!r}")
+
+    start_text, end_text = _text(record, 'start_time'), _text(record, 'end_time')
+    start_time = _parse_time(start_text, 'start_time') if start_text else None
+    end_time = _parse_time(end_text, 'end_time') if end_text else None
+    if (start_time is None) != (end_time is None):
+        raise ImportRowError("start_time and end_time must be given together")
+
+    break_text = _text(record, 'break_hours')
+    break_hours = _parse_float(break_text, 'break_hours') if break_text else 0.0
+
+    # Same semantics as TimeEntry.calculate_hours, including overnight shifts
+    started_at = ended_at = None
+    if start_time is not None:
+        started_at, ended_at = span(entry_date, start_time, end_time)
+        hours_worked = hours(started_at, ended_at, break_hours)
+        if hours_worked < 0:
+            raise ImportRowError("break_hours is longer than the shift")
+    else:
+        hours_text = _text(record, 'hours_worked')
+        if not hours_text:
+            raise ImportRowError("either start_time/end_time or hours_worked is required")
+        hours_worked = _parse_float(hours_text, 'hours_worked')
+
+    now = datetime.utcnow()
+    return {
+        'employee_id': employee_ids[code],
+        'date': entry_date,
+        'start_time': start_time,
+        'end_time': end_time,
+        'started_at': started_at,
+        'ended_at': ended_at,
+        'hours_worked': hours_worked,
+        'break_hours': break_hours,
+        'description': _text(record, 'description') or None,
+        'project': _text(record, 'project') or None,
+        'is_approved': _text(record, 'is_approved').lower() in TRUE_VALUES,
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+def _flush_batch(rows):
+    """Insert a batch and its daily and weekly total deltas in one transaction"""
+    db.session.execute(insert(TimeEntry), rows)
+    deltas = apply_entry_rows(db.session, rows)
+    db.session.commit()
+    entries_written(deltas)
+
+
+def import_entries(stream, file_format, batch_size=DEFAULT_BATCH_SIZE):
+    """Import time entries from a text stream and return an ImportResult"""
+    result = ImportResult()
+    started = time.perf_counter()
+
+    # One query resolves every employee code for the whole import
+    employee_ids = dict(db.session.query(Employee.employee_id, Employee.id).all())
+
+    batch = []
+    for line_number, record in iter_records(stream, file_format):
+        result.rows_read += 1
+        try:
+            if isinstance(record, ImportRowError):
+                raise record
+            batch.append(parse_record(record, employee_ids))
+        except ImportRowError as e:
+            result.add_error(line_number, str(e))
+            continue
+
+        if len(batch) >= batch_size:
+            _flush_batch(batch)
+            result.rows_inserted += len(batch)
+            batch = []
+
+    if batch:
+        _flush_batch(batch)
+        result.rows_inserted += len(batch)
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def import_file(path, file_format=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Import from a file path; the format defaults to the file extension"""
+    if file_format is None:
+        file_format = 'jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        return import_entries(stream, file_format, batch_size)
+
+
+def import_upload(file_storage, file_format=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Import from a werkzeug FileStorage without reading it all into memory"""
+    if file_format is None:
+        name = file_storage.filename or ''
+        file_format = 'jsonl' if name.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+    stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    return import_entries(stream, file_format, batch_size)
@@ -0,0 +1,506 @@
+"""Background jobs: a queue in the job table and a pool of worker threads.
+
+Exports, per-employee report summaries, bulk approvals and the daily
+totals rebuild can take minutes on a large database. Request handlers
+submit() them as Job rows and return at once. The browser then polls
+/jobs/<id> for progress and downloads the result file when it is done.
+
+Workers claim the oldest queued job with one conditional UPDATE, so any
+number of threads and processes can share the queue. JOB_WORKERS threads
+start with the first request of each web process. Set JOB_WORKERS=0 and
+run ``flask run-jobs`` to keep heavy work out of the web processes
+entirely. A supervisor thread in every pool keeps the heartbeat of its
+running jobs fresh. It puts a job whose worker died (no heartbeat for
+JOB_STALE_SECONDS) back in the queue, up to JOB_MAX_ATTEMPTS runs, and
+deletes finished jobs and their files after JOB_RETENTION_DAYS. It also
+runs the @periodic tasks when they are due.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, func, case
+from app import db
+from models import Job, Employee, TimeEntry, EmployeeDailyTotal, EmployeeWeeklyTotal, \
+    PENDING_FILTERS, pending_entries_query, approves_all_pending
+
+logger = logging.getLogger(__name__)
+
+_jobs = Job.__table__
+
+# Minimum seconds between progress writes from one job
+PROGRESS_INTERVAL = 0.5
+
+# Seconds between supervisor passes: heartbeats, stale jobs, retention
+SUPERVISE_INTERVAL = 30
+
+
+def settings_from_env():
+    """Job-queue app.config values read from the environment"""
+    return {
+        'JOB_WORKERS': int(os.environ.get('JOB_WORKERS', 2)),
+        'JOB_POLL_SECONDS': float(os.environ.get('JOB_POLL_SECONDS', 2)),
+        'JOB_STALE_SECONDS': float(os.environ.get('JOB_STALE_SECONDS', 300)),
+        'JOB_MAX_ATTEMPTS': int(os.environ.get('JOB_MAX_ATTEMPTS', 3)),
+        'JOB_RETENTION_DAYS': float(os.environ.get('JOB_RETENTION_DAYS', 7)),
+        # Defaults to <instance path>/job_results
+        'JOB_RESULT_DIR': os.environ.get('JOB_RESULT_DIR'),
+    }
+
+
+class JobError(Exception):
+    """A job cannot run or failed in an expected way; the message is shown to the user"""
+
+
+JobKind = namedtuple('JobKind', 'run fields admin_only validate title internal')
+
+JOB_KINDS = {}
+
+
+def job_kind(kind, title, fields=(), admin_only=False, validate=None, internal=False):
+    """Register ``run(context, params)`` as the handler of ``kind``.
+
+    ``fields`` are the request parameters copied into the job. ``validate``
+    checks them at submit time and raises JobError to refuse the job.
+    ``internal`` jobs are queued by the app itself with enqueue(): users
+    can neither submit nor list them, and they are deleted once they succeed.
+    """
+    def register(run):
+        JOB_KINDS[kind] = JobKind(run, tuple(fields), admin_only, validate, title, internal)
+        return run
+    return register
+
+
+# (config key holding the interval in seconds, task) run by the supervisor
+PERIODIC_TASKS = []
+
+
+def periodic(interval_key):
+    """Have every pool's supervisor call ``task()`` each app.config[interval_key] seconds.
+
+    Each process runs its own copy, so tasks must tolerate running
+    concurrently. An interval of 0 turns the task off.
+    """
+    def register(task):
+        PERIODIC_TASKS.append((interval_key, task))
+        return task
+    return register
+
+
+def _now():
+    return datetime.utcnow()
+
+
+class JobContext:
+    """Handed to a running job for progress reports and its result file"""
+
+    def __init__(self, job_id, params, result_dir):
+        self.job_id = job_id
+        self.params = params
+        self.result_dir = result_dir
+        self.result_file = None
+        self.result_name = None
+        self.processed = 0
+        self._last_progress = 0.0
+
+    def progress(self, done, total=1, message=None, force=False):
+        """Record ``done`` out of ``total``; writes at most every PROGRESS_INTERVAL seconds"""
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        values = {'progress': max(0.0, min(1.0, done / total)) if total else 0.0, 'heartbeat_at': _now()}
+        if message is not None:
+            values['message'] = message[:255]
+        # Own connection: the job's session may be in the middle of a transaction
+        with db.engine.begin() as conn:
+            conn.execute(update(_jobs).where(_jobs.c.id == self.job_id).values(**values))
+
+    def track(self, rows, total, every=1000):
+        """Pass ``rows`` through, reporting progress every ``every`` rows; counts into self.processed"""
+        self.processed = 0
+        for row in rows:
+            self.processed += 1
+            if self.processed % every == 0:
+                self.progress(self.processed, total, f"{self.processed} of {total} rows")
+            yield row
+
+    def open_result(self, download_name, mode='wb'):
+        """Open the job's result file for writing; it is served as ``download_name``"""
+        suffix = os.path.splitext(download_name)[1]
+        self.result_file = f"job-{self.job_id}{suffix}"
+        self.result_name = download_name
+        # Created by the first job that writes a result, not when the app is imported
+        os.makedirs(self.result_dir, exist_ok=True)
+        return open(os.path.join(self.result_dir, self.result_file), mode)
+
+
+def submit(kind, params=None, submitted_by=None):
+    """Queue a job and return it; raises JobError for an unknown kind or bad params"""
+    spec = JOB_KINDS.get(kind)
+    if spec is None:
+        raise JobError(f"Unknown job kind {kind!r}.")
+    params = dict(params or {})
+    if spec.validate:
+        spec.validate(params)
+    job = Job(kind=kind, params=json.dumps(params, default=str), submitted_by=submitted_by)
+    db.session.add(job)
+    db.session.commit()
+    worker_pool.wake()
+    return job
+
+
+def enqueue(kind, params):
+    """Queue an internal job on its own connection.
+
+    For callers that cannot use the session, such as commit hooks, and
+    cheap enough for request paths: one INSERT.
+    """
+    with db.engine.begin() as conn:
+        conn.execute(_jobs.insert().values(kind=kind, status=Job.QUEUED,
+                                           params=json.dumps(params, default=str)))
+    worker_pool.wake()
+
+
+def internal_kinds():
+    return [kind for kind, spec in JOB_KINDS.items() if spec.internal]
+
+
+def result_path(app, job):
+    return os.path.join(app.config['JOB_RESULT_DIR'], job.result_file) if job.result_file else None
+
+
+def claim_next(worker):
+    """Mark the oldest queued job as running and return its (id, claim token), or None"""
+    token = f"{worker}:{uuid.uuid4().hex[:8]}"
+    oldest = select(_jobs.c.id).where(_jobs.c.status == Job.QUEUED)\
+        .order_by(_jobs.c.id).limit(1).scalar_subquery()
+    now = _now()
+    with db.engine.begin() as conn:
+        # Conditional on the status, so two workers never get the same job
+        claimed = conn.execute(update(_jobs).where(_jobs.c.id == oldest, _jobs.c.status == Job.QUEUED).values(
+            status=Job.RUNNING, worker=token, started_at=now, heartbeat_at=now,
+            attempts=func.coalesce(_jobs.c.attempts, 0) + 1, progress=0.0, message=None,
+        )).rowcount
+        if not claimed:
+            return None
+        job_id = conn.execute(select(_jobs.c.id).where(_jobs.c.worker == token)).scalar()
+    return job_id, token
+
+
+def _finish(job_id, token, **values):
+    values.update(finished_at=_now(), heartbeat_at=_now())
+    with db.engine.begin() as conn:
+        # A job requeued after a missed heartbeat belongs to its new worker now
+        conn.execute(update(_jobs).where(_jobs.c.id == job_id, _jobs.c.worker == token).values(**values))
+
+
+def run_job(app, job_id, token):
+    """Run a claimed job to completion and record its outcome"""
+    job = db.session.get(Job, job_id)
+    kind = job.kind
+    spec = JOB_KINDS.get(kind)
+    params = json.loads(job.params) if job.params else {}
+    context = JobContext(job_id, params, app.config['JOB_RESULT_DIR'])
+    db.session.rollback()
+    started = time.perf_counter()
+    try:
+        if spec is None:
+            raise JobError(f"Unknown job kind {kind!r}.")
+        result = spec.run(context, params)
+    except JobError as e:
+        db.session.rollback()
+        _finish(job_id, token, status=Job.FAILED, error=str(e))
+        logger.info("Job %s (%s) failed: %s", job_id, kind, e)
+        return
+    except Exception:
+        db.session.rollback()
+        logger.exception("Job %s (%s) crashed", job_id, kind)
+        _finish(job_id, token, status=Job.FAILED, error='The job failed unexpectedly; see the server log.')
+        return
+    if spec.internal:
+        with db.engine.begin() as conn:
+            conn.execute(delete(_jobs).where(_jobs.c.id == job_id, _jobs.c.worker == token))
+        return
+    _finish(job_id, token, status=Job.SUCCEEDED, progress=1.0,
+            result=json.dumps(result, default=str) if result is not None else None,
+            result_file=context.result_file, result_name=context.result_name)
+    logger.info("Job %s (%s) finished in %.2fs", job_id, kind, time.perf_counter() - started)
+
+
+class JobWorkerPool:
+    """Worker threads that claim and run queued jobs, plus one supervisor thread"""
+
+    def __init__(self):
+        self.app = None
+        self._threads = []
+        self._running = {}  # job id -> claim token, jobs this pool is running now
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._periodic_due = {}
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def started(self):
+        return bool(self._threads)
+
+    def start(self, app, workers):
+        with self._lock:
+            if self._threads or workers <= 0:
+                return
+            self.app = app
+            self._stopping.clear()
+            # Forked web workers must not keep the parent's name
+            self.name = f"{socket.gethostname()}:{os.getpid()}"
+            for index in range(workers):
+                thread = threading.Thread(target=self._work, args=(f"{self.name}:{index}",),
+                                          name=f"job-worker-{index}", daemon=True)
+                self._threads.append(thread)
+            self._threads.append(threading.Thread(target=self._supervise, name='job-supervisor', daemon=True))
+            for thread in self._threads:
+                thread.start()
+        logger.info("Started %d job worker thread(s)", workers)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        """Let an idle worker look at the queue now instead of after its poll interval"""
+        self._wakeup.set()
+
+    def _work(self, worker):
+        poll = self.app.config['JOB_POLL_SECONDS']
+        while not self._stopping.is_set():
+            claimed = None
+            try:
+                with self.app.app_context():
+                    claimed = claim_next(worker)
+                    if claimed:
+                        job_id, token = claimed
+                        self._running[job_id] = token
+                        try:
+                            run_job(self.app, job_id, token)
+                        finally:
+                            self._running.pop(job_id, None)
+            except Exception:
+                logger.exception("Job worker %s error", worker)
+            if not claimed:
+                self._wakeup.wait(poll)
+                self._wakeup.clear()
+
+    def _supervise(self):
+        while not self._stopping.wait(SUPERVISE_INTERVAL):
+            try:
+                with self.app.app_context():
+                    self.supervise()
+            except Exception:
+                logger.exception("Job supervisor error")
+
+    def supervise(self):
+        """Refresh heartbeats, requeue jobs of dead workers and drop expired jobs"""
+        config = self.app.config
+        now = _now()
+        with db.engine.begin() as conn:
+            for job_id, token in list(self._running.items()):
+                conn.execute(update(_jobs).where(_jobs.c.id == job_id, _jobs.c.worker == token)
+                             .values(heartbeat_at=now))
+
+            stale = (_jobs.c.status == Job.RUNNING) & \
+                (_jobs.c.heartbeat_at < now - timedelta(seconds=config['JOB_STALE_SECONDS']))
+            retry = func.coalesce(_jobs.c.attempts, 0) < config['JOB_MAX_ATTEMPTS']
+            requeued = conn.execute(update(_jobs).where(stale, retry)
+                                    .values(status=Job.QUEUED, worker=None)).rowcount
+            failed = conn.execute(update(_jobs).where(stale, ~retry).values(
+                status=Job.FAILED, finished_at=now,
+                error='The worker running this job stopped responding.')).rowcount
+            if requeued or failed:
+                logger.warning("Requeued %d and failed %d job(s) with no heartbeat", requeued, failed)
+
+            cutoff = now - timedelta(days=config['JOB_RETENTION_DAYS'])
+            expired = (_jobs.c.status.in_((Job.SUCCEEDED, Job.FAILED))) & (_jobs.c.finished_at < cutoff)
+            files = conn.execute(select(_jobs.c.result_file).where(expired, _jobs.c.result_file.isnot(None))).scalars().all()
+            conn.execute(delete(_jobs).where(expired))
+        for name in files:
+            try:
+                os.remove(os.path.join(config['JOB_RESULT_DIR'], name))
+            except FileNotFoundError:
+                pass
+        if requeued:
+            self.wake()
+        self.run_periodic()
+
+    def run_periodic(self):
+        """Call the periodic tasks whose interval has passed since their last run"""
+        now = time.monotonic()
+        for interval_key, task in PERIODIC_TASKS:
+            interval = self.app.config.get(interval_key) or 0
+            if interval <= 0 or self._periodic_due.get(task, 0) > now:
+                continue
+            self._periodic_due[task] = now + interval
+            try:
+                task()
+            except Exception:
+                db.session.rollback()
+                logger.exception("Periodic task %s failed", task.__name__)
+
+
+worker_pool = JobWorkerPool()
+
+
+def init_jobs(app):
+    """Apply the job settings in app.config; web processes start workers on their first request"""
+    if not app.config.get('JOB_RESULT_DIR'):
+        app.config['JOB_RESULT_DIR'] = os.path.join(app.instance_path, 'job_results')
+
+    @app.before_request
+    def _start_job_workers():
+        if not worker_pool.started:
+            worker_pool.start(app, app.config['JOB_WORKERS'])
+
+
+# Job kinds
+
+def _parse_range(params):
+    try:
+        start = datetime.strptime(params.get('start_date') or '', '%Y-%m-%d').date()
+        end = datetime.strptime(params.get('end_date') or '', '%Y-%m-%d').date()
+    except ValueError:
+        raise JobError('Start and end dates must be given as YYYY-MM-DD.')
+    if end < start:
+        raise JobError('The end date is before the start date.')
+    return start, end
+
+
+def _entries_in_range(start, end, employee_id):
+    """Entry count for a range from the daily totals, for progress reporting"""
+    query = db.session.query(func.sum(EmployeeDailyTotal.entries_count))\
+        .filter(EmployeeDailyTotal.date >= start, EmployeeDailyTotal.date <= end)
+    if employee_id is not None:
+        query = query.filter(EmployeeDailyTotal.employee_id == employee_id)
+    return query.scalar() or 0
+
+
+def _validate_export(params):
+    _parse_range(params)
+    if params.get('format', 'csv') not in ('csv', 'xlsx'):
+        raise JobError('Export format must be csv or xlsx.')
+
+
+@job_kind('export_entries', 'Time entry export', fields=('start_date', 'end_date', 'format'),
+          validate=_validate_export)
+def export_entries(context, params):
+    from exports import export_query, iter_csv, iter_xlsx, XLSX_AVAILABLE
+    start, end = _parse_range(params)
+    export_format = params.get('format') or 'csv'
+    if export_format == 'xlsx' and not XLSX_AVAILABLE:
+        raise JobError('XLSX export requires the openpyxl package.')
+    employee_id = params.get('scope')
+    total = _entries_in_range(start, end, employee_id)
+    rows = context.track(export_query(start, end, employee_id), total)
+
+    filename = f"time_entries_{start}_{end}.{export_format}"
+    with context.open_result(filename) as f:
+        for chunk in (iter_xlsx(rows) if export_format == 'xlsx' else iter_csv(rows)):
+            f.write(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+    return {'rows': context.processed}
+
+
+@job_kind('employee_summary', 'Employee hours summary', fields=('start_date', 'end_date'),
+          admin_only=True, validate=_parse_range)
+def employee_summary(context, params):
+    """Hours, entries and approvals per employee for a range, as CSV"""
+    import csv
+    from archive import entry_source
+    start, end = _parse_range(params)
+    entries = entry_source(start, end)
+    approved = func.sum(case((entries.is_approved.is_(True), 1), else_=0))
+    rows = db.session.query(
+        Employee.employee_id, Employee.first_name, Employee.last_name, Employee.department,
+        func.sum(entries.hours_worked), func.count(entries.id), approved,
+        func.count(func.distinct(entries.date)),
+    ).join(entries, entries.employee_id == Employee.id)\
+        .filter(entries.date >= start, entries.date <= end)\
+        .group_by(Employee.id, Employee.employee_id, Employee.first_name, Employee.last_name,
+                  Employee.department)\
+        .order_by(Employee.last_name, Employee.first_name, Employee.id)
+    context.progress(0.1, message='Summing hours', force=True)
+
+    total_hours = 0.0
+    employees = 0
+    with context.open_result(f"employee_summary_{start}_{end}.csv", 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Employee ID', 'First Name', 'Last Name', 'Department', 'Hours',
+                         'Entries', 'Approved Entries', 'Days Worked'])
+        for code, first_name, last_name, department, hours, entries, approved_count, days in rows:
+            writer.writerow([code, first_name, last_name, department or '', round(hours or 0, 2),
+                             entries, approved_count or 0, days])
+            total_hours += hours or 0
+            employees += 1
+    return {'employees': employees, 'total_hours': round(total_hours, 2)}
+
+
+def _validate_approval(params):
+    if not any(params.get(key) for key in PENDING_FILTERS) and not approves_all_pending(params.get('all_pending')):
+        raise JobError('Select a filter or all pending entries to approve.')
+
+
+@job_kind('approve_entries', 'Bulk approval', fields=PENDING_FILTERS + ('all_pending',), admin_only=True,
+          validate=_validate_approval)
+def approve_entries(context, params, chunk_size=500):
+    """Approve matching pending entries in chunks, one short transaction each"""
+    from events import broker
+    from cache import invalidate_all
+    query = pending_entries_query({key: params.get(key) for key in PENDING_FILTERS})
+    total = query.with_entities(func.count(TimeEntry.id)).scalar() or 0
+    approved = 0
+    last_id = 0
+    while True:
+        # Keyset on id, so writers adding pending entries meanwhile cannot stall the loop
+        ids = [entry_id for entry_id, in query.with_entities(TimeEntry.id)
+               .filter(TimeEntry.id > last_id).order_by(TimeEntry.id).limit(chunk_size)]
+        if not ids:
+            break
+        last_id = ids[-1]
+        approved += TimeEntry.query.filter(TimeEntry.id.in_(ids), TimeEntry.is_approved.is_(False))\
+            .update({TimeEntry.is_approved: True, TimeEntry.updated_at: _now()}, synchronize_session=False)
+        db.session.commit()
+        context.progress(approved, total, f"{approved} of {total} entries approved")
+    invalidate_all()
+    broker.publish('entries_approved', {'count': approved, 'entry_ids': None})
+    return {'approved': approved}
+
+
+@job_kind('rebuild_daily_totals', 'Daily and weekly totals recalculation', admin_only=True)
+def rebuild_daily_totals(context, params):
+    from cache import invalidate_all
+    context.progress(0.1, message='Checking for drift', force=True)
+    drift = EmployeeDailyTotal.find_drift()
+    context.progress(0.5, message=f"{len(drift)} drifted day(s), rebuilding", force=True)
+    rows = EmployeeDailyTotal.rebuild()
+    context.progress(0.75, message='Rebuilding weekly totals', force=True)
+    with db.engine.begin() as conn:
+        weekly_rows = EmployeeWeeklyTotal.rebuild(conn)
+    invalidate_all()
+    return {'drifted_days': len(drift), 'rows': rows, 'weekly_rows': weekly_rows}
+
+
+@job_kind('archive_entries', 'Archival of old approved entries', admin_only=True)
+def archive_entries(context, params):
+    from flask import current_app
+    from archive import archive_cutoff, archive_entries as move_entries
+    cutoff = archive_cutoff(current_app.config['ARCHIVE_AFTER_DAYS'])
+    context.progress(0, message=f"Archiving approved entries dated before {cutoff}", force=True)
+    moved = move_entries(cutoff, current_app.config['ARCHIVE_BATCH_SIZE'],
+                         progress=lambda done, total: context.progress(done, total))
+    return {'cutoff': cutoff.isoformat(), 'archived': sum(moved.values()),
+            'years': ', '.join(str(year) for year in sorted(moved)) or '-'}
@@ -1,4 +1,16 @@
-from app import app
+"""Entry point: ``gunicorn main:app`` or ``flask --app main <command>``"""
+from app import create_app
 
-if __name__ == '__main__':
+app = create_app()
+
+
+def run_dev_server():
+    """Create or upgrade the database, add the default admin, and serve on port 5000"""
+    from commands import init_database
+    with app.app_context():
+        init_database()
     app.run(host='0.0.0.0', port=5000, debug=True)
+
+
+if __name__ == '__main__':
+    run_dev_server()
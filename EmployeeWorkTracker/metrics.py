@@ -0,0 +1,232 @@
+"""Per-request instrumentation exposed in Prometheus text format.
+
+For every request the middleware records, labelled by endpoint:
+- latency and response size histograms
+- the number of SQL statements as a histogram
+- total SQL time and template render time as counters
+
+SQL is timed with before/after_cursor_execute, templates with Flask's
+before_render_template and template_rendered signals. Requests slower
+than SLOW_REQUEST_SECONDS are logged with their statements.
+
+Streamed responses (the SSE feed and exports) are measured up to the
+first byte and have no size. Each worker process keeps its own figures,
+so under gunicorn scrape every worker or read them as per-process
+samples.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from flask import g, request, current_app, has_request_context, before_render_template, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Statements kept per request for the slow-request log
+MAX_LOGGED_STATEMENTS = 100
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.statements = defaultdict(lambda: Histogram(STATEMENT_BUCKETS))
+            self.response_size = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+            self.sql_seconds = defaultdict(float)
+            self.template_seconds = defaultdict(float)
+
+    def observe(self, endpoint, method, status, seconds, stats, size):
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            self.latency[endpoint].observe(seconds)
+            self.statements[endpoint].observe(stats.sql_count)
+            self.sql_seconds[endpoint] += stats.sql_seconds
+            self.template_seconds[endpoint] += stats.template_seconds
+            if size is not None:
+                self.response_size[endpoint].observe(size)
+
+    def render(self, prefix='ewt'):
+        """The current figures in Prometheus text exposition format"""
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+
+        with self._lock:
+            header('http_requests_total', 'counter', 'Requests by endpoint, method and status.')
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'{prefix}_http_requests_total{{endpoint="{_label(endpoint)}",'
+                             f'method="{method}",status="{status}"}} {count}')
+
+            for name, kind, help_text, values in (
+                ('http_request_duration_seconds', 'histogram', 'Time to the first response byte.', self.latency),
+                ('sql_statements_per_request', 'histogram', 'SQL statements issued per request.', self.statements),
+                ('http_response_size_bytes', 'histogram', 'Response body size, streamed bodies excluded.',
+                 self.response_size),
+            ):
+                header(name, kind, help_text)
+                for endpoint, histogram in sorted(values.items()):
+                    lines.extend(histogram.samples(f'{prefix}_{name}', f'endpoint="{_label(endpoint)}"'))
+
+            for name, help_text, values in (
+                ('sql_duration_seconds_total', 'Time spent executing SQL.', self.sql_seconds),
+                ('template_render_seconds_total', 'Time spent rendering templates.', self.template_seconds),
+            ):
+                header(name, 'counter', help_text)
+                for endpoint, seconds in sorted(values.items()):
+                    lines.append(f'{prefix}_{name}{{endpoint="{_label(endpoint)}"}} {seconds:.6f}')
+
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+class RequestStats:
+    """Counters for the request in flight, kept on flask.g"""
+    __slots__ = ('started', 'sql_count', 'sql_seconds', 'statements', 'template_seconds', 'template_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.statements = []
+        self.template_seconds = 0.0
+        self.template_started = None
+
+
+def _current_stats():
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_query_start')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = _current_stats()
+    if stats is None:
+        return
+    stats.sql_count += 1
+    stats.sql_seconds += elapsed
+    if len(stats.statements) < MAX_LOGGED_STATEMENTS:
+        stats.statements.append((statement, elapsed))
+
+
+def _start_template_timer(sender, template, context, **extra):
+    stats = _current_stats()
+    if stats is not None:
+        stats.template_started = time.perf_counter()
+
+
+def _record_template(sender, template, context, **extra):
+    stats = _current_stats()
+    if stats is not None and stats.template_started is not None:
+        stats.template_seconds += time.perf_counter() - stats.template_started
+        stats.template_started = None
+
+
+def _log_slow_request(endpoint, seconds, stats):
+    statements = '\n'.join(f'  {elapsed * 1000:7.2f} ms  {" ".join(statement.split())}'
+                           for statement, elapsed in stats.statements)
+    if stats.sql_count > len(stats.statements):
+        statements += f'\n  ... {stats.sql_count - len(stats.statements)} more'
+    logger.warning("Slow request %s %s (%s): %.0f ms, %d SQL statement(s) in %.0f ms, templates %.0f ms\n%s",
+                   request.method, request.path, endpoint, seconds * 1000, stats.sql_count,
+                   stats.sql_seconds * 1000, stats.template_seconds * 1000, statements)
+
+
+def init_metrics(app):
+    """Instrument every request and register the /metrics endpoint.
+
+    METRICS_TOKEN, when set, is the bearer token a scraper must send;
+    without it /metrics is only shown to signed-in admins.
+    """
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('METRICS_TOKEN', None)
+    app.config.setdefault('SLOW_REQUEST_SECONDS', 1.0)
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    before_render_template.connect(_start_template_timer, app)
+    template_rendered.connect(_record_template, app)
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def record_request_stats(response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        seconds = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+        size = None if response.is_streamed else response.calculate_content_length()
+        request_metrics.observe(endpoint, request.method, response.status_code, seconds, stats, size)
+
+        slow_after = current_app.config['SLOW_REQUEST_SECONDS']
+        if slow_after is not None and seconds >= slow_after:
+            _log_slow_request(endpoint, seconds, stats)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = current_app.config['METRICS_TOKEN']
+        if token:
+            allowed = request.headers.get('Authorization', '') == f'Bearer {token}'
+        else:
+            allowed = current_user.is_authenticated and current_user.is_admin
+        if not allowed:
+            return 'Forbidden\n', 403, {'Content-Type': 'text/plain; charset=utf-8'}
+        return request_metrics.render(), 200, {'Content-Type': CONTENT_TYPE}
@@ -0,0 +1,156 @@
+"""Versioned schema migrations.
+
+db.create_all() only creates missing tables; it never adds indexes or
+constraints to tables that already exist. Each step below upgrades an
+existing database by one version and is recorded in schema_version.
+"""
+import logging
+from sqlalchemy import inspect, text
+from app import db
+from models import (Employee, TimeEntry, ActiveSession, EmployeeDailyTotal, EmployeeWeeklyTotal, ApiToken, Job,
+                    ArchivePartition, Alert)
+
+logger = logging.getLogger(__name__)
+
+schema_version = db.Table(
+    'schema_version',
+    db.Column('version', db.Integer, nullable=False),
+)
+
+
+def _add_daily_totals(conn):
+    EmployeeDailyTotal.__table__.create(conn, checkfirst=True)
+    if conn.execute(text("SELECT COUNT(*) FROM employee_daily_total")).scalar():
+        return
+    conn.execute(text(
+        "INSERT INTO employee_daily_total (employee_id, date, hours, entries_count) "
+        "SELECT employee_id, date, COALESCE(SUM(hours_worked), 0), COUNT(*) "
+        "FROM time_entry GROUP BY employee_id, date"
+    ))
+
+
+def _add_hot_path_indexes(conn):
+    # Keep the oldest session per employee so the unique index can be built.
+    # Nobody knows when the extra ones ended, so they are not turned into
+    # time entries; the log keeps them for an admin to enter by hand.
+    duplicates = conn.execute(text(
+        "SELECT id, employee_id, start_time, project, description FROM active_session "
+        "WHERE id NOT IN (SELECT MIN(id) FROM active_session GROUP BY employee_id) ORDER BY id"
+    )).all()
+    for session_id, employee_id, start_time, project, description in duplicates:
+        logger.warning("Discarding duplicate open session %s of employee %s started %s "
+                       "(project %r, description %r)", session_id, employee_id, start_time,
+                       project, description)
+    if duplicates:
+        conn.execute(ActiveSession.__table__.delete().where(
+            ActiveSession.id.in_([row[0] for row in duplicates])))
+    for table in (TimeEntry.__table__, ActiveSession.__table__):
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _add_api_tokens(conn):
+    ApiToken.__table__.create(conn, checkfirst=True)
+
+
+def _add_employee_search(conn):
+    from search import create_search_index
+    create_search_index(conn)
+
+
+def _add_employee_list_indexes(conn):
+    for index in Employee.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _add_jobs(conn):
+    Job.__table__.create(conn, checkfirst=True)
+
+
+def _add_weekly_totals(conn):
+    EmployeeWeeklyTotal.__table__.create(conn, checkfirst=True)
+    # No archive tables exist before version 8
+    EmployeeWeeklyTotal.rebuild(conn, TimeEntry.__table__)
+
+
+def _add_archive_partitions(conn):
+    ArchivePartition.__table__.create(conn, checkfirst=True)
+
+
+def _add_entry_instants(conn):
+    from archive import partitions
+    tables = ['time_entry', *partitions(conn=conn)]
+    for table in tables:
+        columns = {column['name'] for column in inspect(conn).get_columns(table)}
+        for name in ('started_at', 'ended_at'):
+            if name not in columns:
+                column_type = TimeEntry.__table__.c[name].type.impl.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"))
+    # Filled in afterwards by "flask backfill-durations", which may take a while
+
+
+def _add_alerts(conn):
+    Alert.__table__.create(conn, checkfirst=True)
+
+
+# (version, description, step) in the order they must be applied
+MIGRATIONS = [
+    (1, 'add employee_daily_total', _add_daily_totals),
+    (2, 'add time_entry and active_session indexes', _add_hot_path_indexes),
+    (3, 'add api_token', _add_api_tokens),
+    (4, 'add employee search index', _add_employee_search),
+    (5, 'add employee directory indexes', _add_employee_list_indexes),
+    (6, 'add job', _add_jobs),
+    (7, 'add employee_weekly_total', _add_weekly_totals),
+    (8, 'add archive_partition', _add_archive_partitions),
+    (9, 'add time_entry started_at and ended_at', _add_entry_instants),
+    (10, 'add alert', _add_alerts),
+]
+
+# Schema objects create_all() cannot build from the models (FTS tables,
+# triggers), added to fresh databases after it
+RAW_SCHEMA_STEPS = [_add_employee_search]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    """Return the schema version, 0 for an unversioned legacy database or None if empty"""
+    inspector = inspect(conn)
+    if inspector.has_table('schema_version'):
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    if inspector.has_table('employee'):
+        return 0
+    return None
+
+
+def _stamp(conn, version):
+    conn.execute(schema_version.delete())
+    conn.execute(schema_version.insert().values(version=version))
+
+
+def upgrade():
+    """Bring the database schema up to LATEST_VERSION. Returns the applied step versions."""
+    applied = []
+    with db.engine.begin() as conn:
+        version = current_version(conn)
+        if version is None:
+            # Fresh database: the models plus RAW_SCHEMA_STEPS describe the latest schema
+            db.metadata.create_all(conn)
+            for step in RAW_SCHEMA_STEPS:
+                step(conn)
+            _stamp(conn, LATEST_VERSION)
+            logger.info("Created schema at version %s", LATEST_VERSION)
+            return applied
+        schema_version.create(conn, checkfirst=True)
+    
+    for step_version, description, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        with db.engine.begin() as conn:
+            logger.info("Applying migration %s: %s", step_version, description)
+            step(conn)
+            _stamp(conn, step_version)
+        applied.append(step_version)
+    
+    return applied
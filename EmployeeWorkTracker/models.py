@@ -1,9 +1,38 @@
+import hashlib
+import json
+import secrets
 from app import db
 from flask_login import UserMixin
 from datetime import datetime, date, timedelta
-from sqlalchemy import func
+from collections import defaultdict
+from sqlalchemy import Numeric, func, case, cast, event, inspect, select, tuple_
+from sqlalchemy.orm import Session, column_property
+from sqlalchemy.types import TypeDecorator
+from durations import as_utc, utc_now, span, hours, work_today
+
+
+class UTCDateTime(TypeDecorator):
+    """An aware UTC datetime, stored as naive UTC so every backend compares it the same way"""
+    impl = db.DateTime
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            raise ValueError('UTCDateTime values must be timezone-aware')
+        return as_utc(value).replace(tzinfo=None)
+    
+    def process_result_value(self, value, dialect):
+        return as_utc(value) if value is not None else None
 
 class Employee(UserMixin, db.Model):
+    __table_args__ = (
+        # Keyset order of the employee directory, overall and per department
+        db.Index('ix_employee_name', 'first_name', 'last_name', 'id'),
+        db.Index('ix_employee_department_name', 'department', 'first_name', 'last_name', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.String(20), unique=True, nullable=False)
     first_name = db.Column(db.String(50), nullable=False)
@@ -20,70 +49,107 @@ class Employee(UserMixin, db.Model):
     
     # Relationship with time entries
     time_entries = db.relationship('TimeEntry', backref='employee', lazy=True, cascade='all, delete-orphan')
+    daily_totals = db.relationship('EmployeeDailyTotal', lazy=True, cascade='all, delete-orphan')
     
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
     
+    def get_hours_totals(self):
+        """Today/week/month totals for this employee in a single query"""
+        return HoursRollup().totals_for_employee(self.id)
+    
     def get_total_hours_today(self):
-        today = date.today()
-        total = db.session.query(func.sum(TimeEntry.hours_worked)).filter(
-            TimeEntry.employee_id == self.id,
-            TimeEntry.date == today
-        ).scalar()
-        return total or 0
+        return self.get_hours_totals()['today']
     
     def get_total_hours_week(self):
-        from datetime import timedelta
-        today = date.today()
-        week_start = today - timedelta(days=today.weekday())
-        total = db.session.query(func.sum(TimeEntry.hours_worked)).filter(
-            TimeEntry.employee_id == self.id,
-            TimeEntry.date >= week_start,
-            TimeEntry.date <= today
-        ).scalar()
-        return total or 0
+        return self.get_hours_totals()['week']
     
     def get_total_hours_month(self):
-        today = date.today()
-        month_start = today.replace(day=1)
-        total = db.session.query(func.sum(TimeEntry.hours_worked)).filter(
-            TimeEntry.employee_id == self.id,
-            TimeEntry.date >= month_start,
-            TimeEntry.date <= today
-        ).scalar()
-        return total or 0
+        return self.get_hours_totals()['month']
 
 class TimeEntry(db.Model):
+    __table_args__ = (
+        db.Index('ix_time_entry_employee_date', 'employee_id', 'date'),
+        db.Index('ix_time_entry_approved_created', 'is_approved', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False, default=date.today)
+    # The totals are built from employee_id, date, hours_worked and project. active_history
+    # loads the old value when one is overwritten after a commit expired it, so the flush
+    # hook can subtract it
+    employee_id = column_property(db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False),
+                                  active_history=True)
+    # Day the work counts toward and its wall times, in WORK_TIMEZONE
+    date = column_property(db.Column(db.Date, nullable=False, default=work_today), active_history=True)
     start_time = db.Column(db.Time)
     end_time = db.Column(db.Time)
-    hours_worked = db.Column(db.Float, default=0.0)
+    # The same span as UTC instants; None for entries given only as hours
+    started_at = db.Column(UTCDateTime)
+    ended_at = db.Column(UTCDateTime)
+    hours_worked = column_property(db.Column(db.Float, default=0.0), active_history=True)
     break_hours = db.Column(db.Float, default=0.0)
     description = db.Column(db.Text)
-    project = db.Column(db.String(100))
+    project = column_property(db.Column(db.String(100)), active_history=True)
     is_approved = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def calculate_hours(self):
-        """Calculate hours worked based on start and end time"""
+        """Set the instants and hours worked from the date, wall times and break"""
         if self.start_time and self.end_time:
-            start_datetime = datetime.combine(date.today(), self.start_time)
-            end_datetime = datetime.combine(date.today(), self.end_time)
-            
-            # Handle overnight shifts
-            if end_datetime < start_datetime:
-                end_datetime += timedelta(days=1)
-            
-            duration = end_datetime - start_datetime
-            hours = duration.total_seconds() / 3600
-            self.hours_worked = round(hours - (self.break_hours or 0), 2)
+            self.started_at, self.ended_at = span(self.date or work_today(), self.start_time, self.end_time)
+            self.hours_worked = hours(self.started_at, self.ended_at, self.break_hours)
         return self.hours_worked
 
+
+PENDING_FILTERS = ('employee', 'department', 'start_date', 'end_date')
+
+
+def approves_all_pending(value):
+    """True only for an explicit all_pending flag: JSON true or the form value 'true'"""
+    return value is True or value == 'true'
+
+
+def _filter_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
+
+def pending_entries_query(filters):
+    """Unapproved entries matching the employee/department/date filters.
+
+    Shared by the admin approval queue and the bulk approval job; values
+    are the raw strings of PENDING_FILTERS, invalid dates are ignored.
+    """
+    query = TimeEntry.query.filter(TimeEntry.is_approved.is_(False))
+    
+    if filters.get('employee'):
+        query = query.filter(TimeEntry.employee_id.in_(
+            db.session.query(Employee.id).filter(Employee.employee_id == filters['employee'])
+        ))
+    if filters.get('department'):
+        query = query.filter(TimeEntry.employee_id.in_(
+            db.session.query(Employee.id).filter(Employee.department == filters['department'])
+        ))
+    
+    start = _filter_date(filters.get('start_date'))
+    end = _filter_date(filters.get('end_date'))
+    if start:
+        query = query.filter(TimeEntry.date >= start)
+    if end:
+        query = query.filter(TimeEntry.date <= end)
+    return query
+
+
 class ActiveSession(db.Model):
+    __table_args__ = (
+        # One open session per employee; also makes concurrent starts race-safe
+        db.Index('uq_active_session_employee', 'employee_id', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -95,5 +161,497 @@ class ActiveSession(db.Model):
     
     def get_duration_hours(self):
         """Get current session duration in hours"""
-        duration = datetime.utcnow() - self.start_time
-        return round(duration.total_seconds() / 3600, 2)
+        return hours(self.start_time, utc_now())
+
+
+class ApiToken(db.Model):
+    """Bearer token for kiosks, badge readers and other API clients.
+    
+    Only a SHA-256 digest of the token is stored. Tokens are 256 random
+    bits, so a fast hash is as safe as a password hash here and keeps the
+    lookup a single indexed equality match on every request.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    # None for a device token that may punch for any active employee
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'))
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime)
+    
+    employee = db.relationship('Employee')
+    
+    PREFIX = 'ewt_'
+    
+    @staticmethod
+    def hash_token(raw_token):
+        return hashlib.sha256(raw_token.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def issue(cls, name, employee=None):
+        """Create a token and return (ApiToken, raw token); the raw token is shown only once"""
+        raw_token = cls.PREFIX + secrets.token_urlsafe(32)
+        token = cls(name=name, token_hash=cls.hash_token(raw_token),
+                    employee_id=employee.id if employee else None)
+        db.session.add(token)
+        return token, raw_token
+    
+    @classmethod
+    def find_active(cls, raw_token):
+        return cls.query.filter_by(token_hash=cls.hash_token(raw_token), is_active=True).first()
+
+
+class Job(db.Model):
+    """A unit of background work, queued here and run by the jobs worker pool"""
+    __table_args__ = (
+        db.Index('ix_job_status_id', 'status', 'id'),
+        db.Index('ix_job_submitted_by_id', 'submitted_by', 'id'),
+    )
+    
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=QUEUED)
+    params = db.Column(db.Text)  # JSON
+    progress = db.Column(db.Float, default=0.0)
+    message = db.Column(db.String(255))
+    result = db.Column(db.Text)  # JSON
+    # File name inside JOB_RESULT_DIR and the name offered on download
+    result_file = db.Column(db.String(255))
+    result_name = db.Column(db.String(255))
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0)
+    worker = db.Column(db.String(100))
+    submitted_by = db.Column(db.Integer, db.ForeignKey('employee.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    submitter = db.relationship('Employee')
+    
+    @property
+    def is_finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'params': json.loads(self.params) if self.params else {},
+            'progress': round(self.progress or 0.0, 4),
+            'message': self.message,
+            'result': json.loads(self.result) if self.result else None,
+            'has_file': bool(self.result_file),
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() + 'Z' if self.created_at else None,
+            'started_at': self.started_at.isoformat() + 'Z' if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() + 'Z' if self.finished_at else None,
+        }
+
+
+class ArchivePartition(db.Model):
+    """One per-year table of archived time entries; see archive.py"""
+    year = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(64), nullable=False, unique=True)
+    # Date span of the rows in the table, checked before a read unions it in
+    first_date = db.Column(db.Date, nullable=False)
+    last_date = db.Column(db.Date, nullable=False)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    hours = db.Column(db.Float, nullable=False, default=0.0)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Alert(db.Model):
+    """A finding of the alert rules about an employee's time; see alerts.py"""
+    __table_args__ = (
+        # One row per finding: rules re-evaluate and update it instead of adding another
+        db.Index('uq_alert_kind_key', 'kind', 'key', unique=True),
+        db.Index('ix_alert_employee_kind_date', 'employee_id', 'kind', 'date'),
+        db.Index('ix_alert_resolved_id', 'resolved_at', 'id'),
+    )
+
+    OVERLAP = 'overlap'
+    OVERTIME = 'overtime'
+    OPEN_SESSION = 'open_session'
+    AUTO_CLOSED = 'auto_closed'
+
+    TITLES = {
+        OVERLAP: 'Overlapping entries',
+        OVERTIME: 'Weekly overtime',
+        OPEN_SESSION: 'Session left open',
+        AUTO_CLOSED: 'Session closed automatically',
+    }
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    # Work day of the finding; the Monday for weekly overtime
+    date = db.Column(db.Date, nullable=False)
+    # Not a foreign key: the entry may since have been archived or deleted
+    entry_id = db.Column(db.Integer)
+    hours = db.Column(db.Float)
+    message = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    resolved_at = db.Column(db.DateTime)
+    # None when the rules resolved it because the condition went away
+    resolved_by = db.Column(db.Integer, db.ForeignKey('employee.id'))
+
+    employee = db.relationship('Employee', foreign_keys=[employee_id])
+
+    @property
+    def title(self):
+        return self.TITLES.get(self.kind, self.kind)
+
+
+class EmployeeDailyTotal(db.Model):
+    """Pre-summed hours per employee per day, maintained from TimeEntry changes"""
+    __table_args__ = (
+        db.UniqueConstraint('employee_id', 'date', name='uq_employee_daily_total'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    hours = db.Column(db.Float, nullable=False, default=0.0)
+    entries_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Hours are summed incrementally, so compare with a small tolerance
+    DRIFT_TOLERANCE = 0.005
+    
+    @classmethod
+    def expected_totals(cls):
+        """Recompute {(employee_id, date): (hours, entries)} from time_entry and its archives"""
+        from archive import entry_selectable
+        entries = entry_selectable().c
+        rows = db.session.query(
+            entries.employee_id,
+            entries.date,
+            func.coalesce(func.sum(entries.hours_worked), 0),
+            func.count(entries.id)
+        ).group_by(entries.employee_id, entries.date).all()
+        return {(emp_id, day): (hours, count) for emp_id, day, hours, count in rows}
+    
+    @classmethod
+    def find_drift(cls):
+        """Compare stored totals with time_entry.
+        
+        Returns a list of (employee_id, date, stored, expected) tuples where
+        stored/expected are (hours, entries) pairs or None when missing.
+        """
+        expected = cls.expected_totals()
+        stored = {
+            (row.employee_id, row.date): (row.hours, row.entries_count)
+            for row in cls.query.all()
+        }
+        drift = []
+        for key in sorted(set(expected) | set(stored)):
+            have = stored.get(key)
+            want = expected.get(key)
+            if have is None or want is None or have[1] != want[1] \
+                    or abs(have[0] - want[0]) > cls.DRIFT_TOLERANCE:
+                drift.append((key[0], key[1], have, want))
+        return drift
+    
+    @classmethod
+    def rebuild(cls):
+        """Replace every stored total with values recomputed from time_entry"""
+        expected = cls.expected_totals()
+        cls.query.delete(synchronize_session=False)
+        db.session.bulk_insert_mappings(cls, [
+            {'employee_id': emp_id, 'date': day, 'hours': round(hours, 4), 'entries_count': count}
+            for (emp_id, day), (hours, count) in expected.items()
+        ])
+        db.session.commit()
+        return len(expected)
+
+
+def week_start(day):
+    """Monday of the week ``day`` falls in"""
+    return day - timedelta(days=day.weekday())
+
+
+def week_start_sql(column, dialect):
+    """SQL expression for the Monday of a date column, or None if the dialect has none here"""
+    if dialect == 'sqlite':
+        # Back six days, then forward to the next Monday (a Monday stays put)
+        return func.date(column, '-6 days', 'weekday 1')
+    if dialect == 'postgresql':
+        return cast(func.date_trunc('week', column), db.Date)
+    return None
+
+
+class EmployeeWeeklyTotal(db.Model):
+    """Pre-summed hours per employee, week and project, for analytics over long ranges.
+    
+    Maintained from TimeEntry changes together with EmployeeDailyTotal.
+    A year of 40,000 employees is about 2-4 million rows where time_entry
+    has 10 million. The covering indexes let the department and project
+    pivots read them in week order without sorting.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('employee_id', 'week_start', 'project', name='uq_employee_weekly_total'),
+        db.Index('ix_employee_weekly_total_week_employee', 'week_start', 'employee_id', 'hours'),
+        db.Index('ix_employee_weekly_total_week_project', 'week_start', 'project', 'hours', 'entries_count'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    week_start = db.Column(db.Date, nullable=False)
+    # '' for entries without a project, so the unique constraint holds
+    project = db.Column(db.String(100), nullable=False, default='')
+    hours = db.Column(db.Float, nullable=False, default=0.0)
+    entries_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    @classmethod
+    def rebuild(cls, conn, entries=None):
+        """Replace every stored total with values recomputed from time_entry and its archives.
+        
+        ``entries`` overrides the table the totals are computed from.
+        Returns the row count.
+        """
+        if entries is None:
+            from archive import entry_selectable
+            entries = entry_selectable(conn=conn)
+        entries = entries.c
+        conn.execute(cls.__table__.delete())
+        week = week_start_sql(entries.date, conn.dialect.name)
+        project = func.coalesce(entries.project, '')
+        hours = func.coalesce(func.sum(entries.hours_worked), 0)
+        if week is not None:
+            conn.execute(cls.__table__.insert().from_select(
+                ['employee_id', 'week_start', 'project', 'hours', 'entries_count'],
+                select(entries.employee_id, week, project, hours, func.count(entries.id))
+                .group_by(entries.employee_id, week, project)))
+        else:
+            totals = defaultdict(lambda: [0.0, 0])
+            for emp_id, day, name, day_hours, count in conn.execute(
+                    select(entries.employee_id, entries.date, project, hours, func.count(entries.id))
+                    .group_by(entries.employee_id, entries.date, project)):
+                total = totals[(emp_id, week_start(day), name)]
+                total[0] += day_hours
+                total[1] += count
+            if totals:
+                conn.execute(cls.__table__.insert(), [
+                    {'employee_id': emp_id, 'week_start': week, 'project': name,
+                     'hours': round(week_hours, 4), 'entries_count': count}
+                    for (emp_id, week, name), (week_hours, count) in totals.items()
+                ])
+        return conn.execute(select(func.count()).select_from(cls.__table__)).scalar()
+
+
+# (employee_id, date) pairs per lookup query, two bound parameters each
+DAILY_TOTAL_LOOKUP_CHUNK = 400
+
+
+def _committed_value(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    values = history.deleted or history.unchanged
+    if values:
+        return values[0]
+    # Expired attribute: load the value that is still in the database
+    return getattr(obj, attr)
+
+
+@event.listens_for(Session, 'before_flush')
+def _maintain_daily_totals(session, flush_context, instances):
+    """Fold TimeEntry inserts, updates and deletes into the daily and weekly totals.
+    
+    Runs inside the flush, so the summary rows are written in the same
+    transaction as the time entries they describe.
+    """
+    deltas = defaultdict(lambda: [0.0, 0])
+    weekly = defaultdict(lambda: [0.0, 0])
+    
+    def add(employee_id, day, project, hours, count):
+        for totals, key in ((deltas, (employee_id, day)), (weekly, (employee_id, week_start(day), project or ''))):
+            totals[key][0] += hours
+            totals[key][1] += count
+    
+    for obj in session.new:
+        if isinstance(obj, TimeEntry):
+            add(obj.employee_id, obj.date or work_today(), obj.project, obj.hours_worked or 0, 1)
+    
+    for obj in session.deleted:
+        if isinstance(obj, TimeEntry):
+            add(_committed_value(obj, 'employee_id'), _committed_value(obj, 'date'),
+                _committed_value(obj, 'project'), -(_committed_value(obj, 'hours_worked') or 0), -1)
+    
+    for obj in session.dirty:
+        if isinstance(obj, TimeEntry) and session.is_modified(obj):
+            old = (_committed_value(obj, 'employee_id'), _committed_value(obj, 'date'),
+                   _committed_value(obj, 'project') or '')
+            new = (obj.employee_id, obj.date, obj.project or '')
+            old_hours = _committed_value(obj, 'hours_worked') or 0
+            new_hours = obj.hours_worked or 0
+            if old == new and old_hours == new_hours:
+                continue
+            add(*old, -old_hours, -1)
+            add(*new, new_hours, 1)
+    
+    if deltas:
+        with session.no_autoflush:
+            apply_daily_total_deltas(session, deltas)
+            apply_weekly_total_deltas(session, weekly)
+
+
+def _upsert(dialect):
+    """The dialect's INSERT .. ON CONFLICT construct, or None"""
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def _apply_total_deltas(session, model, key_columns, deltas, chunk_size):
+    """Add the deltas with one upsert statement, then drop totals left without entries.
+    
+    Runs on the session's connection, so it commits with the time
+    entries. Dialects without ON CONFLICT fall back to per-row ORM updates.
+    """
+    keys = [key for key, (hours, count) in deltas.items() if hours or count]
+    if not keys:
+        return
+    table = model.__table__
+    columns = [table.c[name] for name in key_columns]
+    insert = _upsert(session.get_bind().dialect.name)
+    if insert is None:
+        return _apply_total_deltas_orm(session, model, key_columns, keys, deltas, chunk_size)
+    
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(index_elements=columns, set_={
+        # numeric, since PostgreSQL only rounds numerics to a number of places
+        'hours': func.round(cast(table.c.hours + statement.excluded.hours, Numeric), 4),
+        'entries_count': table.c.entries_count + statement.excluded.entries_count,
+    })
+    session.execute(statement, [
+        dict(zip(key_columns, key), hours=round(deltas[key][0], 4), entries_count=deltas[key][1])
+        for key in keys
+    ])
+    
+    # Only a removed entry can leave a total empty
+    emptied = [key for key in keys if deltas[key][1] < 0]
+    for i in range(0, len(emptied), chunk_size):
+        session.execute(table.delete().where(tuple_(*columns).in_(emptied[i:i + chunk_size]),
+                                             table.c.entries_count <= 0))
+
+
+def _apply_total_deltas_orm(session, model, key_columns, keys, deltas, chunk_size):
+    columns = [getattr(model, name) for name in key_columns]
+    existing = {}
+    for i in range(0, len(keys), chunk_size):
+        chunk = keys[i:i + chunk_size]
+        rows = session.query(model).filter(tuple_(*columns).in_(chunk))
+        existing.update((tuple(getattr(row, name) for name in key_columns), row) for row in rows)
+    
+    for key in keys:
+        hours, count = deltas[key]
+        total = existing.get(key)
+        if total is None:
+            total = model(**dict(zip(key_columns, key)), hours=0.0, entries_count=0)
+            session.add(total)
+        total.hours = round(total.hours + hours, 4)
+        total.entries_count += count
+        if total.entries_count <= 0:
+            if inspect(total).persistent:
+                session.delete(total)
+            else:
+                session.expunge(total)
+
+
+def apply_daily_total_deltas(session, deltas):
+    """Add {(employee_id, date): (hours, entries)} deltas to EmployeeDailyTotal.
+    
+    One INSERT .. ON CONFLICT statement adds them all; the caller commits.
+    Used by the flush hook and by bulk paths that insert time entries
+    without the ORM.
+    """
+    _apply_total_deltas(session, EmployeeDailyTotal, ('employee_id', 'date'), deltas,
+                        DAILY_TOTAL_LOOKUP_CHUNK)
+
+
+def apply_weekly_total_deltas(session, deltas):
+    """Add {(employee_id, week_start, project): (hours, entries)} deltas to EmployeeWeeklyTotal"""
+    _apply_total_deltas(session, EmployeeWeeklyTotal, ('employee_id', 'week_start', 'project'), deltas,
+                        DAILY_TOTAL_LOOKUP_CHUNK * 2 // 3)
+
+
+def apply_entry_rows(session, rows):
+    """Fold time entries inserted as Core row dicts into the daily and weekly totals"""
+    deltas = defaultdict(lambda: [0.0, 0])
+    weekly = defaultdict(lambda: [0.0, 0])
+    for row in rows:
+        hours = row.get('hours_worked') or 0
+        employee_id, day = row['employee_id'], row['date']
+        for totals, key in ((deltas, (employee_id, day)),
+                            (weekly, (employee_id, week_start(day), row.get('project') or ''))):
+            totals[key][0] += hours
+            totals[key][1] += 1
+    apply_daily_total_deltas(session, deltas)
+    apply_weekly_total_deltas(session, weekly)
+    return deltas
+
+class HoursRollup:
+    """Computes today/week/month hour totals for many employees at once.
+    
+    All three windows are summed with conditional aggregation in one grouped
+    query over EmployeeDailyTotal, so listing N employees costs one query per
+    chunk of ids and reads at most ~31 pre-summed rows per employee.
+    """
+    
+    # Keeps the IN (...) list well below SQLite's bound parameter limit
+    CHUNK_SIZE = 500
+    
+    def __init__(self, today=None):
+        self.today = today or work_today()
+        self.week_start = self.today - timedelta(days=self.today.weekday())
+        self.month_start = self.today.replace(day=1)
+    
+    @staticmethod
+    def empty_totals():
+        return {'today': 0, 'week': 0, 'month': 0}
+    
+    def _window_sum(self, start):
+        return func.sum(case((EmployeeDailyTotal.date >= start, EmployeeDailyTotal.hours), else_=0))
+    
+    def totals_for(self, employee_ids):
+        """Return {employee_pk: {'today': h, 'week': h, 'month': h}}"""
+        employee_ids = list(dict.fromkeys(employee_ids))
+        totals = {emp_id: self.empty_totals() for emp_id in employee_ids}
+        window_start = min(self.week_start, self.month_start)
+        
+        for i in range(0, len(employee_ids), self.CHUNK_SIZE):
+            chunk = employee_ids[i:i + self.CHUNK_SIZE]
+            rows = db.session.query(
+                EmployeeDailyTotal.employee_id,
+                self._window_sum(self.today),
+                self._window_sum(self.week_start),
+                self._window_sum(self.month_start),
+            ).filter(
+                EmployeeDailyTotal.employee_id.in_(chunk),
+                EmployeeDailyTotal.date >= window_start,
+                EmployeeDailyTotal.date <= self.today
+            ).group_by(EmployeeDailyTotal.employee_id).all()
+            
+            for emp_id, today_hours, week_hours, month_hours in rows:
+                totals[emp_id] = {
+                    'today': today_hours or 0,
+                    'week': week_hours or 0,
+                    'month': month_hours or 0,
+                }
+        return totals
+    
+    def totals_for_employee(self, employee_id):
+        return self.totals_for([employee_id])[employee_id]
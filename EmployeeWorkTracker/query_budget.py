@@ -0,0 +1,59 @@
+import logging
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Statements allowed per request unless a view sets its own budget
+DEFAULT_QUERY_BUDGET = 25
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in testing mode when a view issues more SQL than allowed"""
+
+
+def query_budget(max_statements):
+    """Set the per-request SQL statement budget for a view"""
+    def decorator(view):
+        view.query_budget = max_statements
+        return view
+    return decorator
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements.append(statement)
+
+
+def init_query_budget(app):
+    """Count SQL statements per request when running in debug or testing mode.
+    
+    Exceeding the budget logs a warning in debug mode and raises
+    QueryBudgetExceeded in testing mode, so an N+1 regression fails tests.
+    """
+    app.config.setdefault('SQL_QUERY_BUDGET', DEFAULT_QUERY_BUDGET)
+    
+    @app.before_request
+    def start_statement_count():
+        if current_app.debug or current_app.testing:
+            g.sql_statements = []
+    
+    @app.after_request
+    def check_statement_count(response):
+        statements = g.pop('sql_statements', None)
+        if statements is None:
+            return response
+        
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', current_app.config['SQL_QUERY_BUDGET'])
+        response.headers['X-SQL-Statements'] = str(len(statements))
+        
+        if budget is not None and len(statements) > budget:
+            message = (f"{request.endpoint} issued {len(statements)} SQL statements "
+                       f"(budget {budget})")
+            if current_app.testing:
+                raise QueryBudgetExceeded(message + ":\n" + "\n".join(statements))
+            logger.warning(message)
+        return response
@@ -1,10 +1,91 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify
+import os
+from flask import (render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context,
+                   make_response, send_file, abort)
+from markupsafe import Markup
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from app import app, db
-from models import Employee, TimeEntry, ActiveSession
-from datetime import datetime, date, timedelta
-from sqlalchemy import func, desc
+from models import Employee, TimeEntry, EmployeeDailyTotal, HoursRollup, Job, Alert, \
+    PENDING_FILTERS, pending_entries_query, approves_all_pending
+from datetime import datetime, timedelta
+from sqlalchemy import func, desc, tuple_
+from sqlalchemy.orm import joinedload
+from query_budget import query_budget
+from session_registry import active_sessions as session_registry
+from events import broker, stream_events
+from exports import export_query, iter_csv, iter_xlsx, XLSX_AVAILABLE
+from importer import import_upload
+from timeclock import clock_in, clock_out, PunchError
+from auth import hash_password, verify_password, login_throttle, LoginBusy
+from search import ranked_employee_query
+from directory import (LIST_COLUMNS, LIST_ORDER, EMPLOYEE_PAGE_SIZE, summaries,
+                       format_employee_cursor, parse_employee_cursor, department_facet)
+from cache import (response_cache, generations as cache_generations, view_etag, not_modified,
+                   with_validators, invalidate_all as invalidate_cached_views)
+from jobs import JOB_KINDS, JobError, submit as submit_job, result_path as job_result_path, internal_kinds
+from analytics import PERIODS as ANALYTICS_PERIODS, build_report as build_analytics_report
+from archive import entry_source
+from durations import work_today
+from alerts import open_alerts, resolve as resolve_alert
+
+REPORT_PAGE_SIZE = 50
+MAX_REPORT_PAGE_SIZE = 500
+PENDING_PAGE_SIZE = 50
+APPROVE_CHUNK_SIZE = 500
+SEARCH_PAGE_SIZE = 50
+TYPEAHEAD_LIMIT = 10
+TYPEAHEAD_MIN_CHARS = 2
+JOB_LIST_SIZE = 50
+ALERT_LIST_SIZE = 20
+ANALYTICS_DEFAULT_WEEKS = 12
+MAX_ANALYTICS_WEEKS = 260
+
+def format_entry_cursor(entry):
+    """Encode the (date, id) keyset position of a time entry"""
+    return f"{entry.date.isoformat()}_{entry.id}"
+
+def parse_entry_cursor(value):
+    """Decode a cursor produced by format_entry_cursor, or None if invalid"""
+    if not value:
+        return None
+    try:
+        day, entry_id = value.split('_', 1)
+        return datetime.strptime(day, '%Y-%m-%d').date(), int(entry_id)
+    except ValueError:
+        return None
+
+def format_pending_cursor(entry):
+    """Encode the (created_at, id) keyset position of a pending entry"""
+    return f"{entry.created_at.isoformat()}_{entry.id}"
+
+def parse_pending_cursor(value):
+    """Decode a cursor produced by format_pending_cursor, or None if invalid"""
+    if not value:
+        return None
+    try:
+        created_at, entry_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(entry_id)
+    except ValueError:
+        return None
+
+def parse_date_arg(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
+def report_date_range():
+    """Date range from request args, defaulting to the current month"""
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    
+    if not start_date or not end_date:
+        today = work_today()
+        start_date = today.replace(day=1).strftime('%Y-%m-%d')
+        end_date = today.strftime('%Y-%m-%d')
+    
+    start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+    return start_date, end_date, start_date_obj, end_date_obj
 
 @app.route('/')
 def index():
@@ -18,9 +99,22 @@ def login():
         email = request.form['email']
         password = request.form['password']
         
+        # Refuse before hashing anything once a client keeps failing
+        throttle_key = (request.remote_addr, email.strip().lower())
+        if login_throttle.is_limited(throttle_key):
+            flash('Too many failed sign-in attempts. Please wait a few minutes and try again.', 'error')
+            return render_template('login.html'), 429
+        
         employee = Employee.query.filter_by(email=email).first()
         
-        if employee and check_password_hash(employee.password_hash, password):
+        try:
+            valid = employee is not None and verify_password(employee, password)
+        except LoginBusy:
+            flash('Many people are signing in right now. Please try again in a moment.', 'warning')
+            return render_template('login.html'), 503, {'Retry-After': '5'}
+        
+        if valid:
+            login_throttle.reset(throttle_key)
             if employee.is_active:
                 login_user(employee)
                 next_page = request.args.get('next')
@@ -28,6 +122,7 @@ def login():
             else:
                 flash('Your account has been deactivated. Please contact HR.', 'error')
         else:
+            login_throttle.record_failure(throttle_key)
             flash('Invalid email or password.', 'error')
     
     return render_template('login.html')
@@ -75,7 +170,7 @@ def register():
             phone=phone,
             department=department,
             position=position,
-            password_hash=generate_password_hash(password)
+            password_hash=hash_password(password)
         )
         
         db.session.add(employee)
@@ -89,30 +184,35 @@ def register():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Get current user's statistics
-    today_hours = current_user.get_total_hours_today()
-    week_hours = current_user.get_total_hours_week()
-    month_hours = current_user.get_total_hours_month()
-    
     # Get active session if any
-    active_session = ActiveSession.query.filter_by(employee_id=current_user.id).first()
-    
-    # Get recent time entries
-    recent_entries = TimeEntry.query.filter_by(employee_id=current_user.id)\
+    active_session = session_registry.get(current_user.id)
+    
+    # Get current user's statistics and recent time entries. Neither cached nor answered
+    # with a 304: this is the page people check right after punching, possibly through
+    # another worker's process, whose writes this process's counters never saw
+    recent_entries = db.session.query(
+        TimeEntry.date, TimeEntry.start_time, TimeEntry.end_time,
+        TimeEntry.hours_worked, TimeEntry.project, TimeEntry.is_approved
+    ).filter(TimeEntry.employee_id == current_user.id)\
         .order_by(desc(TimeEntry.date), desc(TimeEntry.created_at))\
         .limit(5).all()
+    hours = current_user.get_hours_totals()
     
     # Get admin statistics if admin user
     total_employees = 0
     total_active_sessions = 0
     if current_user.is_admin:
-        total_employees = Employee.query.filter_by(is_active=True).count()
-        total_active_sessions = ActiveSession.query.count()
+        count_key = ('active_employees', work_today(), cache_generations.employees_token())
+        total_employees = response_cache.get(count_key)
+        if total_employees is None:
+            total_employees = Employee.query.filter_by(is_active=True).count()
+            response_cache.set(count_key, total_employees)
+        total_active_sessions = session_registry.count()
     
     return render_template('dashboard.html',
-                         today_hours=today_hours,
-                         week_hours=week_hours,
-                         month_hours=month_hours,
+                         today_hours=hours['today'],
+                         week_hours=hours['week'],
+                         month_hours=hours['month'],
                          active_session=active_session,
                          recent_entries=recent_entries,
                          total_employees=total_employees,
@@ -127,38 +227,87 @@ def employees():
     
     search = request.args.get('search', '')
     department = request.args.get('department', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    cursor = parse_employee_cursor(request.args.get('after'))
+    
+    # Search results are ranked, so they page by offset; the plain list
+    # pages by keyset on (first_name, last_name, id)
+    query = ranked_employee_query(search, LIST_COLUMNS)
+    searching = query is not None
+    if not searching:
+        query = db.session.query(*LIST_COLUMNS).order_by(*LIST_ORDER)
+        if cursor:
+            query = query.filter(tuple_(*LIST_ORDER) > cursor)
     
-    query = Employee.query
+    if department:
+        query = query.filter(Employee.department == department)
     
-    if search:
-        query = query.filter(
-            (Employee.first_name.contains(search)) |
-            (Employee.last_name.contains(search)) |
-            (Employee.email.contains(search)) |
-            (Employee.employee_id.contains(search))
-        )
+    if searching:
+        query = query.offset((page - 1) * SEARCH_PAGE_SIZE)
+        page_size = SEARCH_PAGE_SIZE
+    else:
+        page_size = EMPLOYEE_PAGE_SIZE
     
+    # One extra row tells whether there is a next page
+    employees_list = summaries(query.limit(page_size + 1).all())
+    has_next_page = len(employees_list) > page_size
+    employees_list = employees_list[:page_size]
+    next_cursor = format_employee_cursor(employees_list[-1]) if has_next_page and not searching else None
+    
+    department_counts, total_employees = department_facet.snapshot()
     if department:
-        query = query.filter(Employee.department == department)
+        total_employees = dict(department_counts).get(department, 0)
     
-    employees_list = query.order_by(Employee.first_name, Employee.last_name).all()
-    departments = db.session.query(Employee.department).distinct().all()
-    departments = [d[0] for d in departments if d[0]]
+    # Today/week/month totals for the page in one grouped query
+    hours_totals = HoursRollup().totals_for(e.id for e in employees_list)
     
     return render_template('employees.html', 
                          employees=employees_list, 
-                         departments=departments,
+                         hours_totals=hours_totals,
+                         department_counts=department_counts,
+                         total_employees=total_employees,
                          search=search,
-                         selected_department=department)
+                         searching=searching,
+                         selected_department=department,
+                         page=page,
+                         has_next_page=has_next_page,
+                         next_cursor=next_cursor,
+                         is_first_page=cursor is None)
+
+@app.route('/employees/typeahead')
+@query_budget(2)
+@login_required
+def employee_typeahead():
+    """Ranked employee suggestions for the admin search box, as JSON"""
+    if not current_user.is_admin:
+        return jsonify(error='Admin privileges required.'), 403
+    
+    limit = min(max(request.args.get('limit', TYPEAHEAD_LIMIT, type=int), 1), SEARCH_PAGE_SIZE)
+    columns = [Employee.id, Employee.employee_id, Employee.first_name, Employee.last_name,
+               Employee.email, Employee.department, Employee.position, Employee.is_active]
+    # A single letter matches most of the table, too broad to rank per keystroke
+    q = request.args.get('q', '').strip()
+    query = ranked_employee_query(q, columns) if len(q) >= TYPEAHEAD_MIN_CHARS else None
+    rows = query.limit(limit).all() if query is not None else []
+    
+    return jsonify(results=[{
+        'id': row.id,
+        'employee_id': row.employee_id,
+        'name': f"{row.first_name} {row.last_name}",
+        'email': row.email,
+        'department': row.department,
+        'position': row.position,
+        'is_active': row.is_active,
+    } for row in rows])
 
 @app.route('/time_tracking')
 @login_required
 def time_tracking():
     # Get active session
-    active_session = ActiveSession.query.filter_by(employee_id=current_user.id).first()
+    active_session = session_registry.get(current_user.id)
     
     # Get today's entries
-    today = date.today()
+    today = work_today()
     today_entries = TimeEntry.query.filter_by(
         employee_id=current_user.id,
         date=today
@@ -171,23 +320,14 @@ def time_tracking():
 @app.route('/start_session', methods=['POST'])
 @login_required
 def start_session():
-    # Check if already has active session
-    existing_session = ActiveSession.query.filter_by(employee_id=current_user.id).first()
-    if existing_session:
-        flash('You already have an active session running.', 'warning')
-        return redirect(url_for('time_tracking'))
-    
     description = request.form.get('description', '')
     project = request.form.get('project', '')
     
-    session = ActiveSession(
-        employee_id=current_user.id,
-        description=description,
-        project=project
-    )
-    
-    db.session.add(session)
-    db.session.commit()
+    try:
+        clock_in(current_user, description, project)
+    except PunchError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('time_tracking'))
     
     flash('Work session started successfully!', 'success')
     return redirect(url_for('time_tracking'))
@@ -195,32 +335,13 @@ def start_session():
 @app.route('/stop_session', methods=['POST'])
 @login_required
 def stop_session():
-    active_session = ActiveSession.query.filter_by(employee_id=current_user.id).first()
-    if not active_session:
-        flash('No active session found.', 'error')
+    try:
+        result = clock_out(current_user)
+    except PunchError as e:
+        flash(str(e), 'error')
         return redirect(url_for('time_tracking'))
     
-    # Calculate hours worked
-    end_time = datetime.utcnow()
-    duration = end_time - active_session.start_time
-    hours_worked = round(duration.total_seconds() / 3600, 2)
-    
-    # Create time entry
-    time_entry = TimeEntry(
-        employee_id=current_user.id,
-        date=date.today(),
-        start_time=active_session.start_time.time(),
-        end_time=end_time.time(),
-        hours_worked=hours_worked,
-        description=active_session.description,
-        project=active_session.project
-    )
-    
-    db.session.add(time_entry)
-    db.session.delete(active_session)
-    db.session.commit()
-    
-    flash(f'Session ended. Worked for {hours_worked} hours.', 'success')
+    flash(f"Session ended. Worked for {result['hours_worked']} hours.", 'success')
     return redirect(url_for('time_tracking'))
 
 @app.route('/add_manual_entry', methods=['POST'])
@@ -250,81 +371,241 @@ def add_manual_entry():
     flash('Time entry added successfully!', 'success')
     return redirect(url_for('time_tracking'))
 
-@app.route('/reports')
-@login_required
-def reports():
-    # Date range from request args or default to current month
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    
-    if not start_date or not end_date:
-        today = date.today()
-        start_date = today.replace(day=1).strftime('%Y-%m-%d')
-        end_date = today.strftime('%Y-%m-%d')
-    
-    start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+def render_report_body(start_date, end_date, start_date_obj, end_date_obj, per_page, cursor):
+    """Summary cards and the entries table of /reports, as HTML"""
+    # Archive tables are unioned in only when the range reaches back into them
+    source = entry_source(start_date_obj, end_date_obj)
     
     # Build query based on user role
     if current_user.is_admin:
-        query = TimeEntry.query
+        # The detail table shows each entry's employee, load them in the same query
+        query = db.session.query(source).options(joinedload(source.employee))
     else:
-        query = TimeEntry.query.filter_by(employee_id=current_user.id)
+        query = db.session.query(source).filter(source.employee_id == current_user.id)
+    
+    query = query.filter(
+        source.date >= start_date_obj,
+        source.date <= end_date_obj
+    )
     
-    entries = query.filter(
-        TimeEntry.date >= start_date_obj,
-        TimeEntry.date <= end_date_obj
-    ).order_by(desc(TimeEntry.date)).all()
+    # Approval ratio is counted in the database, not over loaded rows
+    approved_entries = query.with_entities(
+        func.count(source.id)
+    ).enable_eagerloads(False).filter(source.is_approved.is_(True)).scalar() or 0
+    
+    # Keyset pagination on (date, id), newest first
+    if cursor:
+        query = query.filter(tuple_(source.date, source.id) < cursor)
+    
+    entries = query.order_by(desc(source.date), desc(source.id)).limit(per_page + 1).all()
+    next_cursor = None
+    if len(entries) > per_page:
+        entries = entries[:per_page]
+        next_cursor = format_entry_cursor(entries[-1])
+    
+    # Summary statistics come from the pre-summed daily totals
+    totals_query = db.session.query(
+        EmployeeDailyTotal.employee_id,
+        func.sum(EmployeeDailyTotal.hours),
+        func.sum(EmployeeDailyTotal.entries_count)
+    ).filter(
+        EmployeeDailyTotal.date >= start_date_obj,
+        EmployeeDailyTotal.date <= end_date_obj
+    )
+    if not current_user.is_admin:
+        totals_query = totals_query.filter(EmployeeDailyTotal.employee_id == current_user.id)
+    per_employee = totals_query.group_by(EmployeeDailyTotal.employee_id).all()
     
-    # Calculate summary statistics
-    total_hours = sum(entry.hours_worked for entry in entries)
-    total_entries = len(entries)
+    total_hours = sum(hours or 0 for _, hours, _ in per_employee)
+    total_entries = sum(count or 0 for _, _, count in per_employee)
     
     # Group by employee for admin view
     employee_summary = {}
-    if current_user.is_admin:
-        for entry in entries:
-            emp_id = entry.employee_id
-            if emp_id not in employee_summary:
-                employee_summary[emp_id] = {
-                    'employee': entry.employee,
-                    'total_hours': 0,
-                    'entries_count': 0
-                }
-            employee_summary[emp_id]['total_hours'] += entry.hours_worked
-            employee_summary[emp_id]['entries_count'] += 1
-    
-    return render_template('reports.html',
+    if current_user.is_admin and per_employee:
+        employees_by_id = {
+            e.id: e for e in Employee.query.filter(
+                Employee.id.in_([emp_id for emp_id, _, _ in per_employee])
+            )
+        }
+        for emp_id, hours, count in per_employee:
+            employee_summary[emp_id] = {
+                'employee': employees_by_id[emp_id],
+                'total_hours': hours or 0,
+                'entries_count': count or 0
+            }
+    
+    return render_template('reports_body.html',
                          entries=entries,
                          start_date=start_date,
                          end_date=end_date,
+                         days_in_range=(end_date_obj - start_date_obj).days + 1,
                          total_hours=total_hours,
                          total_entries=total_entries,
-                         employee_summary=employee_summary)
+                         approved_entries=approved_entries,
+                         employee_summary=employee_summary,
+                         per_page=per_page,
+                         is_first_page=cursor is None,
+                         next_cursor=next_cursor)
+
+@app.route('/reports')
+@query_budget(8)
+@login_required
+def reports():
+    start_date, end_date, start_date_obj, end_date_obj = report_date_range()
+    per_page = request.args.get('per_page', REPORT_PAGE_SIZE, type=int)
+    per_page = max(1, min(per_page, MAX_REPORT_PAGE_SIZE))
+    cursor = parse_entry_cursor(request.args.get('after'))
+    
+    # Admins share one report of everyone's entries, employees see their own
+    scope = None if current_user.is_admin else current_user.id
+    body_key = ('report', scope, start_date_obj, end_date_obj, per_page, cursor,
+                cache_generations.range_token(scope, start_date_obj, end_date_obj))
+    cached_response = not_modified(view_etag(current_user.id, body_key))
+    if cached_response:
+        return cached_response
+    
+    report_body = response_cache.get(body_key)
+    if report_body is None:
+        report_body = render_report_body(start_date, end_date, start_date_obj, end_date_obj, per_page, cursor)
+        response_cache.set(body_key, report_body)
+    
+    return with_validators(make_response(render_template('reports.html',
+                         report_body=Markup(report_body),
+                         start_date=start_date,
+                         end_date=end_date)))
+
+@app.route('/reports/export')
+@login_required
+def export_report():
+    """Stream the report's time entries as CSV or XLSX for payroll"""
+    start_date, end_date, start_date_obj, end_date_obj = report_date_range()
+    export_format = request.args.get('format', 'csv')
+    
+    # Admins export everyone, employees only their own entries
+    employee_id = None if current_user.is_admin else current_user.id
+    query = export_query(start_date_obj, end_date_obj, employee_id)
+    filename = f"time_entries_{start_date}_{end_date}.{export_format}"
+    
+    if export_format == 'xlsx':
+        if not XLSX_AVAILABLE:
+            flash('XLSX export requires the openpyxl package.', 'error')
+            return redirect(url_for('reports', start_date=start_date, end_date=end_date))
+        body = iter_xlsx(query)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    elif export_format == 'csv':
+        body = iter_csv(query)
+        mimetype = 'text/csv'
+    else:
+        flash('Unknown export format.', 'error')
+        return redirect(url_for('reports', start_date=start_date, end_date=end_date))
+    
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+def analytics_report():
+    """Analytics for the range and thresholds in the request args, cached per data version"""
+    end = parse_date_arg(request.args.get('end_date')) or work_today()
+    start = parse_date_arg(request.args.get('start_date')) or end - timedelta(weeks=ANALYTICS_DEFAULT_WEEKS, days=-1)
+    if start > end:
+        start, end = end, start
+    start = max(start, end - timedelta(weeks=MAX_ANALYTICS_WEEKS))
+    period = request.args.get('period', 'week')
+    if period not in ANALYTICS_PERIODS:
+        period = 'week'
+    overtime_hours = request.args.get('overtime_hours', app.config['ALERT_OVERTIME_HOURS'], type=float)
+    standard_week_hours = request.args.get('standard_week_hours',
+                                           app.config['ANALYTICS_STANDARD_WEEK_HOURS'], type=float)
+    
+    key = ('analytics', start, end, period, overtime_hours, standard_week_hours,
+           cache_generations.range_token(None, start - timedelta(days=6), end + timedelta(days=6)))
+    report = response_cache.get(key)
+    if report is None:
+        report = build_analytics_report(start, end, period, overtime_hours, standard_week_hours)
+        response_cache.set(key, report)
+    return report
+
+@app.route('/reports/analytics')
+@query_budget(10)
+@login_required
+def analytics():
+    """Department, project, utilization and overtime pivots over whole weeks"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('dashboard'))
+    
+    report = analytics_report()
+    return render_template('analytics.html', report=report, periods=ANALYTICS_PERIODS)
+
+@app.route('/reports/analytics.json')
+@query_budget(10)
+@login_required
+def analytics_json():
+    if not current_user.is_admin:
+        return jsonify(error='Admin privileges required.'), 403
+    
+    return jsonify(analytics_report())
 
 @app.route('/admin')
+@query_budget(8)
 @login_required
 def admin():
     if not current_user.is_admin:
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('dashboard'))
     
-    # Get pending approvals
-    pending_entries = TimeEntry.query.filter_by(is_approved=False)\
-        .order_by(desc(TimeEntry.created_at)).all()
+    # Get pending approvals, one keyset page at a time
+    filters = {key: request.args.get(key, '').strip() for key in PENDING_FILTERS}
+    active_filters = {key: value for key, value in filters.items() if value}
+    pending_query = pending_entries_query(filters)
+    pending_total = pending_query.count()
+    
+    cursor = parse_pending_cursor(request.args.get('after'))
+    if cursor:
+        pending_query = pending_query.filter(tuple_(TimeEntry.created_at, TimeEntry.id) < cursor)
+    pending_entries = pending_query.options(joinedload(TimeEntry.employee))\
+        .order_by(desc(TimeEntry.created_at), desc(TimeEntry.id))\
+        .limit(PENDING_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(pending_entries) > PENDING_PAGE_SIZE:
+        pending_entries = pending_entries[:PENDING_PAGE_SIZE]
+        next_cursor = format_pending_cursor(pending_entries[-1])
     
     # Get recent registrations
     recent_employees = Employee.query.order_by(desc(Employee.created_at))\
         .limit(10).all()
     
     # Get active sessions
-    active_sessions = ActiveSession.query.join(Employee)\
-        .order_by(ActiveSession.start_time).all()
+    active_sessions = session_registry.list()
+    
+    # Unresolved findings of the alert rules
+    alerts_total = open_alerts().count()
+    alerts = open_alerts().options(joinedload(Alert.employee)).limit(ALERT_LIST_SIZE).all()
     
     return render_template('admin.html',
                          pending_entries=pending_entries,
+                         pending_total=pending_total,
+                         pending_filters=filters,
+                         active_filters=active_filters,
+                         is_first_page=cursor is None,
+                         next_cursor=next_cursor,
                          recent_employees=recent_employees,
-                         active_sessions=active_sessions)
+                         active_sessions=active_sessions,
+                         alerts=alerts,
+                         alerts_total=alerts_total)
+
+@app.route('/alerts/<int:alert_id>/resolve', methods=['POST'])
+@login_required
+def resolve_alert_view(alert_id):
+    if not current_user.is_admin:
+        flash('Access denied.', 'error')
+        return redirect(url_for('dashboard'))
+    
+    alert = Alert.query.get_or_404(alert_id)
+    resolve_alert(alert, current_user)
+    db.session.commit()
+    
+    flash('Alert resolved.', 'success')
+    return redirect(url_for('admin'))
 
 @app.route('/approve_entry/<int:entry_id>')
 @login_required
@@ -337,9 +618,106 @@ def approve_entry(entry_id):
     entry.is_approved = True
     db.session.commit()
     
+    broker.publish('entry_approved', {'employee_id': entry.employee_id, 'entry_id': entry.id})
+    
     flash('Time entry approved successfully.', 'success')
     return redirect(url_for('admin'))
 
+@app.route('/approve_entries', methods=['POST'])
+@login_required
+def approve_entries():
+    """Approve many entries with one UPDATE, by id list or by filter"""
+    if not current_user.is_admin:
+        if request.is_json:
+            return jsonify({'error': 'Access denied.'}), 403
+        flash('Access denied.', 'error')
+        return redirect(url_for('dashboard'))
+    
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Expected a JSON object body.'}), 400
+        entry_ids = data.get('entry_ids', [])
+        # A string is iterable too; only a real list of ints is a selection
+        if not isinstance(entry_ids, list) or not all(type(entry_id) is int for entry_id in entry_ids):
+            return jsonify({'error': 'entry_ids must be a list of integers.'}), 400
+        if not all(isinstance(data.get(key) or '', str) for key in PENDING_FILTERS):
+            return jsonify({'error': 'Filters must be strings.'}), 400
+    else:
+        data = request.form
+        entry_ids = data.getlist('entry_ids')
+        # The checkboxes only ever send ids; anything else is a forged request
+        if not all(entry_id.isdigit() for entry_id in entry_ids):
+            abort(400)
+        entry_ids = [int(entry_id) for entry_id in entry_ids]
+    filters = {key: (data.get(key) or '').strip() for key in PENDING_FILTERS}
+    
+    if not entry_ids and not any(filters.values()) and not approves_all_pending(data.get('all_pending')):
+        message = 'Select entries or a filter to approve.'
+        if request.is_json:
+            return jsonify({'error': message}), 400
+        flash(message, 'warning')
+        return redirect(url_for('admin'))
+    
+    values = {TimeEntry.is_approved: True, TimeEntry.updated_at: datetime.utcnow()}
+    query = pending_entries_query(filters)
+    if entry_ids:
+        # Chunked to stay under the database's bound parameter limit
+        approved = 0
+        for i in range(0, len(entry_ids), APPROVE_CHUNK_SIZE):
+            chunk = entry_ids[i:i + APPROVE_CHUNK_SIZE]
+            approved += query.filter(TimeEntry.id.in_(chunk))\
+                .update(values, synchronize_session=False)
+    else:
+        approved = query.update(values, synchronize_session=False)
+    db.session.commit()
+    # The bulk UPDATE does not say which employees and days it touched
+    invalidate_cached_views()
+    
+    broker.publish('entries_approved', {'count': approved, 'entry_ids': entry_ids or None})
+    
+    if request.is_json:
+        return jsonify({'approved': approved})
+    flash(f'{approved} time entries approved.', 'success')
+    return redirect(url_for('admin', **{key: value for key, value in filters.items() if value}))
+
+@app.route('/import_entries', methods=['POST'])
+@query_budget(None)  # statements scale with the number of batches
+@login_required
+def import_entries():
+    """Bulk import time entries from an uploaded CSV or JSON-lines file"""
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    if not current_user.is_admin:
+        if wants_json:
+            return jsonify({'error': 'Access denied.'}), 403
+        flash('Access denied.', 'error')
+        return redirect(url_for('dashboard'))
+    
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        if wants_json:
+            return jsonify({'error': 'No file uploaded.'}), 400
+        flash('Choose a CSV or JSON-lines file to import.', 'warning')
+        return redirect(url_for('admin'))
+    
+    file_format = request.form.get('format') or None
+    if file_format not in (None, 'csv', 'jsonl'):
+        if wants_json:
+            return jsonify({'error': 'Format must be csv or jsonl.'}), 400
+        flash('Format must be CSV or JSON lines.', 'error')
+        return redirect(url_for('admin'))
+    
+    result = import_upload(upload, file_format)
+    
+    if wants_json:
+        return jsonify(result.to_dict())
+    category = 'warning' if result.error_count else 'success'
+    flash(f'Imported {result.rows_inserted} of {result.rows_read} rows '
+          f'({result.rows_per_second} rows/s), {result.error_count} errors.', category)
+    for line_number, message in result.errors[:10]:
+        flash(f'Line {line_number}: {message}', 'error')
+    return redirect(url_for('admin'))
+
 @app.route('/toggle_employee_status/<int:employee_id>')
 @login_required
 def toggle_employee_status(employee_id):
@@ -365,8 +743,97 @@ def delete_entry(entry_id):
         flash('Access denied.', 'error')
         return redirect(url_for('time_tracking'))
     
+    employee_id = entry.employee_id
     db.session.delete(entry)
     db.session.commit()
     
+    broker.publish('entry_deleted', {'employee_id': employee_id, 'entry_id': entry_id})
+    
     flash('Time entry deleted successfully.', 'success')
     return redirect(url_for('time_tracking'))
+
+def visible_jobs():
+    """Jobs the current user may see: all for admins, otherwise their own"""
+    query = Job.query.filter(Job.kind.notin_(internal_kinds()))
+    if not current_user.is_admin:
+        query = query.filter(Job.submitted_by == current_user.id)
+    return query
+
+def job_status(job):
+    status = job.to_dict()
+    kind = JOB_KINDS.get(job.kind)
+    status['title'] = kind.title if kind else job.kind
+    status['status_url'] = url_for('job_detail', job_id=job.id)
+    status['result_url'] = url_for('job_result', job_id=job.id) \
+        if job.result_file and job.status == Job.SUCCEEDED else None
+    return status
+
+@app.route('/jobs')
+@login_required
+def jobs():
+    recent = visible_jobs().options(joinedload(Job.submitter))\
+        .order_by(desc(Job.id)).limit(JOB_LIST_SIZE).all()
+    return render_template('jobs.html', jobs=recent, statuses={job.id: job_status(job) for job in recent})
+
+@app.route('/jobs', methods=['POST'])
+@login_required
+def submit_job_request():
+    """Queue a background job; answers 202 with its status URL for JSON clients"""
+    wants_json = request.is_json
+    data = (request.get_json(silent=True) or {}) if wants_json else request.form
+    kind = JOB_KINDS.get(data.get('kind', ''))
+    if kind is not None and kind.internal:
+        kind = None
+    
+    if kind is None or (kind.admin_only and not current_user.is_admin):
+        message = 'Unknown job.' if kind is None else 'Access denied.'
+        if wants_json:
+            return jsonify({'error': message}), 400 if kind is None else 403
+        flash(message, 'error')
+        return redirect(url_for('jobs'))
+    
+    params = {field: data.get(field) for field in kind.fields if data.get(field) not in (None, '')}
+    # Employees only ever get their own entries, whatever the request says
+    params['scope'] = None if current_user.is_admin else current_user.id
+    
+    try:
+        job = submit_job(data['kind'], params, current_user.id)
+    except JobError as e:
+        if wants_json:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('jobs'))
+    
+    if wants_json:
+        return jsonify(job_status(job)), 202, {'Location': url_for('job_detail', job_id=job.id)}
+    flash(f'{kind.title} queued as job #{job.id}.', 'success')
+    return redirect(url_for('jobs'))
+
+@app.route('/jobs/<int:job_id>')
+@query_budget(2)
+@login_required
+def job_detail(job_id):
+    job = visible_jobs().filter(Job.id == job_id).first_or_404()
+    return jsonify(job_status(job))
+
+@app.route('/jobs/<int:job_id>/result')
+@login_required
+def job_result(job_id):
+    job = visible_jobs().filter(Job.id == job_id).first_or_404()
+    path = job_result_path(app, job)
+    if job.status != Job.SUCCEEDED or path is None or not os.path.exists(path):
+        abort(404)
+    return send_file(path, as_attachment=True, download_name=job.result_name)
+
+@app.route('/events/stream')
+@login_required
+def events_stream():
+    # Resume after the last event the browser saw, otherwise start from now
+    last_seq = request.headers.get('Last-Event-ID', type=int)
+    if last_seq is None:
+        last_seq = broker.last_seq
+    employee_id = None if current_user.is_admin else current_user.id
+    
+    return Response(stream_events(last_seq, employee_id, app.config['EVENT_STREAM_SECONDS']),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
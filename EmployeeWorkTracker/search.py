@@ -0,0 +1,112 @@
+"""Ranked prefix search over employees.
+
+On SQLite the employee_search FTS5 table indexes name, email, employee
+code, department and position. It is an external-content table: it
+stores only the index and reads text from the employee table. Triggers
+on employee keep it in sync, so ORM writes, Core bulk inserts and raw SQL
+are all covered. On PostgreSQL a GIN index on a tsvector expression
+plays the same role. Other databases fall back to anchored LIKE
+matching.
+
+Every word typed is a prefix and all words must match, so "jo sm" finds
+"John Smith" and "EMP0004" finds EMP000412. Results are ranked, on
+SQLite by bm25 with matches on the code and name weighted highest.
+"""
+import re
+from sqlalchemy import text, literal_column, func, or_, and_, table, column
+from app import db
+from models import Employee
+
+FTS_TABLE = 'employee_search'
+
+# Indexed columns in FTS5 column order, with their bm25 weights
+SEARCH_COLUMNS = [
+    ('first_name', 5.0),
+    ('last_name', 5.0),
+    ('email', 2.0),
+    ('employee_id', 8.0),
+    ('department', 1.0),
+    ('position', 1.0),
+]
+
+# Words beyond this are ignored; keeps pathological queries cheap
+MAX_TERMS = 6
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+_fts = table(FTS_TABLE, column('rowid'))
+
+# PostgreSQL: the query must repeat this expression exactly for the index to be used
+PG_SEARCH_VECTOR = "to_tsvector('simple', " + " || ' ' || ".join(
+    f"coalesce({name}, '')" for name, _ in SEARCH_COLUMNS) + ")"
+
+
+def _sqlite_ddl():
+    columns = ', '.join(name for name, _ in SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{name}' for name, _ in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{name}' for name, _ in SEARCH_COLUMNS)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{columns}, content='employee', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON employee BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON employee BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        # Only changes to indexed columns touch the index, not is_active or passwords
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {columns} ON employee BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+
+def create_search_index(conn):
+    """Create the search index for the connection's database and fill it"""
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        statements = _sqlite_ddl()
+    elif dialect == 'postgresql':
+        statements = [f"CREATE INDEX IF NOT EXISTS ix_{FTS_TABLE} ON employee USING GIN ({PG_SEARCH_VECTOR})"]
+    else:
+        statements = []
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def search_terms(query_text):
+    """Lower-cased words of a search box entry, the way the index tokenizes them"""
+    return _TERM_RE.findall((query_text or '').lower())[:MAX_TERMS]
+
+
+def ranked_employee_query(query_text, entity=Employee):
+    """Employees matching every word of ``query_text`` as a prefix, best match first.
+
+    ``entity`` may be Employee or a list of its columns for a projected
+    query. Returns None when the text has no searchable words.
+    """
+    terms = search_terms(query_text)
+    if not terms:
+        return None
+    entities = entity if isinstance(entity, (list, tuple)) else [entity]
+    query = db.session.query(*entities)
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for _, weight in SEARCH_COLUMNS)
+        return query.select_from(Employee)\
+            .join(_fts, _fts.c.rowid == Employee.id)\
+            .filter(literal_column(FTS_TABLE).op('MATCH')(match))\
+            .order_by(literal_column(f"bm25({FTS_TABLE}, {weights})"), Employee.id)
+
+    if dialect == 'postgresql':
+        tsquery = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+        vector = literal_column(PG_SEARCH_VECTOR)
+        return query.filter(vector.op('@@')(tsquery))\
+            .order_by(func.ts_rank(vector, tsquery).desc(), Employee.id)
+
+    columns = [getattr(Employee, name) for name, _ in SEARCH_COLUMNS]
+    return query.filter(and_(*(
+        or_(*(func.lower(col).like(f'{term}%') for col in columns)) for term in terms
+    ))).order_by(Employee.first_name, Employee.last_name, Employee.id)
@@ -0,0 +1,154 @@
+"""In-memory registry of open work sessions.
+
+Answers "is this employee clocked in", "how many are clocked in" and
+"who is clocked in" without querying active_session. Each process
+loads the registry from the table on first use and keeps it in step
+with it by session events: changes to ActiveSession rows are collected
+at flush time and applied only once the transaction commits.
+
+A rebuild loads every open session, so the copy also knows who is not
+clocked in: hits and misses alike are answered without a query. With
+several worker processes each keeps its own copy, and sessions another
+worker opened or closed show up once the copy is older than
+ACTIVE_SESSION_SYNC_SECONDS (30 by default, 0 turns resyncing off) and
+reloads. Punches never trust the copy: clock-in relies on the unique
+index on active_session.employee_id and clock-out reads the employee's
+session from the table.
+"""
+import threading
+import time
+from collections import namedtuple
+from app import db
+from durations import hours, utc_now
+from models import Employee, ActiveSession
+from commit_hooks import on_commit
+
+
+class SessionEmployee(namedtuple('SessionEmployee', 'id employee_id first_name last_name department')):
+    __slots__ = ()
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+
+class ActiveSessionInfo:
+    """Read-only snapshot of an ActiveSession row and its employee"""
+    __slots__ = ('id', 'employee_id', 'start_time', 'description', 'project', 'employee')
+
+    def __init__(self, id, employee_id, start_time, description, project, employee):
+        self.id = id
+        self.employee_id = employee_id
+        self.start_time = start_time
+        self.description = description
+        self.project = project
+        self.employee = employee
+
+    def get_duration_hours(self):
+        """Get current session duration in hours"""
+        return hours(self.start_time, utc_now())
+
+
+def _snapshot(session_row, employee):
+    return ActiveSessionInfo(
+        id=session_row.id,
+        employee_id=session_row.employee_id,
+        start_time=session_row.start_time,
+        description=session_row.description,
+        project=session_row.project,
+        employee=SessionEmployee(employee.id, employee.employee_id, employee.first_name,
+                                 employee.last_name, employee.department),
+    )
+
+
+class ActiveSessionRegistry:
+    def __init__(self, sync_interval=None):
+        self.sync_interval = sync_interval
+        self._lock = threading.RLock()
+        self._sessions = {}
+        self._synced_at = None
+
+    def rebuild(self):
+        """Reload every open session from the active_session table"""
+        rows = db.session.query(ActiveSession, Employee)\
+            .join(Employee, ActiveSession.employee_id == Employee.id).all()
+        sessions = {row.employee_id: _snapshot(row, employee) for row, employee in rows}
+        with self._lock:
+            self._sessions = sessions
+            self._synced_at = time.monotonic()
+        return len(sessions)
+
+    def _maybe_resync(self):
+        if self._synced_at is None:
+            # Loaded on first use rather than at boot, so workers start without a query
+            self.rebuild()
+        elif self.sync_interval and time.monotonic() - self._synced_at > self.sync_interval:
+            self.rebuild()
+
+    def is_clocked_in(self, employee_id):
+        return self.get(employee_id) is not None
+
+    def get(self, employee_id):
+        """The employee's open session, or None, answered from memory for hits and misses alike"""
+        self._maybe_resync()
+        return self._sessions.get(employee_id)
+
+    def refresh(self, employee_id):
+        """Reload one employee's open session from the table (indexed on employee_id), for punches"""
+        row = db.session.query(ActiveSession, Employee)\
+            .join(Employee, ActiveSession.employee_id == Employee.id)\
+            .filter(ActiveSession.employee_id == employee_id).first()
+        with self._lock:
+            if row is None:
+                self._sessions.pop(employee_id, None)
+                return None
+            info = self._sessions[employee_id] = _snapshot(*row)
+        return info
+
+    def count(self):
+        self._maybe_resync()
+        return len(self._sessions)
+
+    def list(self):
+        """Open sessions ordered by start time, oldest first"""
+        self._maybe_resync()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return sorted(sessions, key=lambda s: s.start_time)
+
+    def add(self, info):
+        with self._lock:
+            self._sessions[info.employee_id] = info
+
+    def discard(self, employee_id, session_id=None):
+        with self._lock:
+            current = self._sessions.get(employee_id)
+            if current is not None and (session_id is None or current.id == session_id):
+                del self._sessions[employee_id]
+
+
+DEFAULT_SYNC_SECONDS = 30
+
+active_sessions = ActiveSessionRegistry()
+
+
+def _collect_session_changes(session, changes):
+    for obj in session.new:
+        if isinstance(obj, ActiveSession):
+            # Usually already in the identity map as current_user
+            employee = session.get(Employee, obj.employee_id)
+            changes.append(('add', _snapshot(obj, employee)))
+    for obj in session.deleted:
+        if isinstance(obj, ActiveSession):
+            changes.append(('remove', (obj.employee_id, obj.id)))
+
+
+def _apply_session_changes(changes):
+    for action, payload in changes:
+        if action == 'add':
+            active_sessions.add(payload)
+        else:
+            active_sessions.discard(*payload)
+
+
+on_commit('active_session_changes', _collect_session_changes, _apply_session_changes, list)
@@ -91,7 +91,8 @@ email-validator==2.1.0
             from models import Employee, TimeEntry, ActiveSession
             
             with app.app_context():
-                db.create_all()
+                from migrations import upgrade
+                upgrade()
                 print("✅ Таблицы базы данных созданы")
                 
                 # Создаем админа по умолчанию
@@ -405,6 +405,33 @@ function showNotification(message, type = 'info') {
     }, 5000);
 }
 
+/**
+ * Live Updates (Server-Sent Events)
+ *
+ * handlers maps event names (clock_in, clock_out, entry_approved,
+ * entry_deleted) to callbacks receiving the parsed event data.
+ */
+function subscribeToEvents(handlers) {
+    if (!('EventSource' in window)) {
+        return null;
+    }
+    
+    const source = new EventSource('/events/stream');
+    Object.keys(handlers).forEach(eventType => {
+        source.addEventListener(eventType, function(event) {
+            handlers[eventType](JSON.parse(event.data));
+        });
+    });
+    
+    // The server dropped events we never saw, start over from a fresh page
+    source.addEventListener('resync', function() {
+        source.close();
+        location.reload();
+    });
+    
+    return source;
+}
+
 /**
  * Keyboard Shortcuts
  */
@@ -510,5 +537,6 @@ window.WorkTracker = {
     hideLoading,
     validateForm,
     formatTime,
-    formatDuration
+    formatDuration,
+    subscribeToEvents
 };
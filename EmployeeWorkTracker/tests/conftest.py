@@ -0,0 +1,101 @@
+"""Shared fixtures: one app, one database and one generated dataset per run.
+
+app reads DATABASE_URL when it is imported, so it is set here before
+anything imports it. By default the suite runs on a SQLite file in a
+temporary directory. TEST_DATABASE_URL runs it on another database
+instead, e.g. a throwaway PostgreSQL database; every table in it is
+dropped first.
+"""
+import os
+import sys
+import tempfile
+
+WORKDIR = tempfile.mkdtemp(prefix='ewt-tests-')
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL') or f"sqlite:///{WORKDIR}/test.db"
+os.environ['JOB_WORKERS'] = '0'
+os.environ['JOB_RESULT_DIR'] = os.path.join(WORKDIR, 'job_results')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from main import app as flask_app  # noqa: E402
+from app import db  # noqa: E402
+
+# Small enough to seed in a second, large enough that an N+1 shows up
+EMPLOYEES = 80
+HISTORY_DAYS = 21
+
+
+def _drop_everything():
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA public CASCADE"))
+            conn.execute(text("CREATE SCHEMA public"))
+
+
+@pytest.fixture(scope='session')
+def app():
+    from commands import init_database
+    from datagen import generate_dataset
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        _drop_everything()
+        init_database()
+        generate_dataset(EMPLOYEES, HISTORY_DAYS, open_session_ratio=0.1, seed=7)
+    yield flask_app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+def login(app, employee_id):
+    """A test client signed in as the employee with primary key ``employee_id``"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(employee_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def admin_client(app):
+    from models import Employee
+    with app.app_context():
+        admin_id = Employee.query.filter_by(email='admin@company.com').one().id
+    return login(app, admin_id)
+
+
+@pytest.fixture
+def employee(app):
+    """A generated, active, clocked-out employee for tests that punch; each test gets its own"""
+    from models import Employee, ActiveSession
+    with app.app_context():
+        used = app.config.setdefault('TEST_EMPLOYEES_USED', set())
+        open_sessions = db.session.query(ActiveSession.employee_id)
+        candidate = Employee.query.filter(Employee.is_admin.is_(False), Employee.id.notin_(used),
+                                          Employee.id.notin_(open_sessions))\
+            .order_by(Employee.id).first()
+        assert candidate is not None, "every generated employee is taken; raise EMPLOYEES"
+        candidate.is_active = True
+        db.session.commit()
+        used.add(candidate.id)
+        employee_id = candidate.id
+        db.session.remove()
+    return employee_id
+
+
+def run_queued_jobs(app):
+    """Run every queued job in this thread, as a worker would; JOB_WORKERS is 0 here"""
+    from jobs import claim_next, run_job
+    with app.app_context():
+        while True:
+            claimed = claim_next('test')
+            if claimed is None:
+                break
+            run_job(app, *claimed)
+        db.session.remove()
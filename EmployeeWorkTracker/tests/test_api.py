@@ -0,0 +1,91 @@
+from datetime import datetime, time, timedelta
+import pytest
+from app import db
+from durations import as_utc
+from models import Alert, ApiToken, Employee, TimeEntry
+from conftest import run_queued_jobs
+
+
+def test_replayed_batch_is_duplicate_outside_utc(app, employee):
+    with app.app_context():
+        code = db.session.get(Employee, employee).employee_id
+        _, raw_token = ApiToken.issue('test badge reader')
+        db.session.commit()
+
+    # Late evening in New York, already the next day in UTC
+    day = datetime.utcnow().date() - timedelta(days=2)
+    start = datetime.combine(day, time(2, 0))
+    punches = [
+        {'employee_id': code, 'action': 'in', 'at': start.isoformat() + 'Z'},
+        {'employee_id': code, 'action': 'out', 'at': datetime.combine(day, time(3, 30)).isoformat() + 'Z'},
+    ]
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {raw_token}'}
+
+    configured = app.config.get('WORK_TIMEZONE')
+    app.config['WORK_TIMEZONE'] = 'America/New_York'
+    try:
+        first = client.post('/api/v1/punches', json={'punches': punches}, headers=headers).get_json()
+        replay = client.post('/api/v1/punches', json={'punches': punches}, headers=headers).get_json()
+    finally:
+        app.config['WORK_TIMEZONE'] = configured
+
+    assert [result['status'] for result in first['results']] == ['ok', 'ok']
+    assert [result['status'] for result in replay['results']] == ['duplicate', 'duplicate']
+    with app.app_context():
+        recorded = TimeEntry.query.filter_by(employee_id=employee, started_at=as_utc(start)).count()
+    assert recorded == 1
+
+
+def test_clock_out_through_the_api_raises_an_alert(app, employee):
+    with app.app_context():
+        code = db.session.get(Employee, employee).employee_id
+        _, raw_token = ApiToken.issue('test kiosk')
+        db.session.commit()
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {raw_token}'}
+    hours = app.config['ALERT_OPEN_SESSION_HOURS'] + 1
+    started = (datetime.utcnow() - timedelta(hours=hours)).isoformat() + 'Z'
+
+    assert client.post('/api/v1/sessions/start', json={'employee_id': code, 'at': started},
+                       headers=headers).status_code == 201
+    response = client.post('/api/v1/sessions/stop', json={'employee_id': code}, headers=headers)
+    assert response.status_code == 200
+
+    # The rules run in a queued job, not in the request
+    run_queued_jobs(app)
+    with app.app_context():
+        alert = Alert.query.filter_by(employee_id=employee, kind=Alert.OPEN_SESSION).one()
+    assert alert.resolved_at is None
+    assert alert.hours == pytest.approx(hours, abs=0.1)
+
+
+def test_punch_paths_stay_within_budget(app, employee):
+    with app.app_context():
+        code = db.session.get(Employee, employee).employee_id
+        token, raw_token = ApiToken.issue('test kiosk')
+        db.session.commit()
+        token_id = token.id
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {raw_token}'}
+
+    def post(path, payload):
+        # A token unused for a while is refreshed too, the most a punch ever issues
+        with app.app_context():
+            db.session.get(ApiToken, token_id).last_used_at = None
+            db.session.commit()
+        response = client.post(path, json=payload, headers=headers)
+        assert response.status_code in (200, 201), response.get_json()
+        view = app.view_functions[_endpoint(app, path)]
+        assert int(response.headers['X-SQL-Statements']) <= view.query_budget
+        return response
+
+    started = (datetime.utcnow() - timedelta(hours=2)).isoformat() + 'Z'
+    post('/api/v1/sessions/start', {'employee_id': code, 'at': started})
+    post('/api/v1/sessions/stop', {'employee_id': code})
+    day = (datetime.utcnow() - timedelta(days=3)).date().isoformat()
+    post('/api/v1/entries', {'employee_id': code, 'date': day, 'start_time': '09:00', 'end_time': '10:00'})
+
+
+def _endpoint(app, path):
+    return app.url_map.bind('localhost').match(path, method='POST')[0]
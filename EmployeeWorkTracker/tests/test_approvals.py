@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+import pytest
+from app import db
+from models import TimeEntry
+
+
+@pytest.fixture
+def pending(app, employee):
+    """Ids of two new unapproved entries of the employee"""
+    with app.app_context():
+        entries = [TimeEntry(employee_id=employee, date=date.today() - timedelta(days=days), hours_worked=4)
+                   for days in (40, 41)]
+        db.session.add_all(entries)
+        db.session.commit()
+        entry_ids = [entry.id for entry in entries]
+        db.session.remove()
+    return entry_ids
+
+
+def pending_count(app):
+    with app.app_context():
+        count = TimeEntry.query.filter(TimeEntry.is_approved.is_(False)).count()
+        db.session.remove()
+    return count
+
+
+@pytest.mark.parametrize('body', [
+    {'entry_ids': '12'},
+    {'entry_ids': 12},
+    {'entry_ids': ['12']},
+    {'entry_ids': [1.5]},
+    {'entry_ids': [True]},
+    {'all_pending': '0'},
+    {'all_pending': 1},
+    {'employee': 5},
+    ['entry_ids'],
+])
+def test_json_approval_rejects_anything_but_ids_or_all_pending_true(app, admin_client, pending, body):
+    before = pending_count(app)
+    response = admin_client.post('/approve_entries', json=body)
+    assert response.status_code == 400
+    assert pending_count(app) == before
+
+
+def test_json_approval_by_ids(app, admin_client, pending):
+    response = admin_client.post('/approve_entries', json={'entry_ids': pending})
+    assert response.status_code == 200
+    assert response.get_json() == {'approved': 2}
+
+
+@pytest.mark.parametrize('form', [
+    {'entry_ids': ['12', 'abc']},
+    {'entry_ids': ['-1']},
+])
+def test_form_approval_rejects_forged_ids(app, admin_client, pending, form):
+    before = pending_count(app)
+    assert admin_client.post('/approve_entries', data=form).status_code == 400
+    assert pending_count(app) == before
+
+
+@pytest.mark.parametrize('all_pending', ['0', '1', 'false', ''])
+def test_form_approval_needs_all_pending_true(app, admin_client, pending, all_pending):
+    before = pending_count(app)
+    response = admin_client.post('/approve_entries', data={'all_pending': all_pending})
+    assert response.status_code == 302
+    assert pending_count(app) == before
+
+
+def test_form_approval_by_ids(app, admin_client, pending):
+    response = admin_client.post('/approve_entries', data={'entry_ids': [str(entry_id) for entry_id in pending]})
+    assert response.status_code == 302
+    with app.app_context():
+        assert TimeEntry.query.filter(TimeEntry.id.in_(pending), TimeEntry.is_approved.is_(True)).count() == 2
+
+
+def test_approval_job_needs_all_pending_true(app, admin_client):
+    response = admin_client.post('/jobs', json={'kind': 'approve_entries', 'all_pending': '0'})
+    assert response.status_code == 400
@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import event
+from app import db
+from auth import IdentityCache, identity_cache, load_employee
+from models import Employee
+from conftest import login
+
+
+@pytest.fixture
+def statements(app_context):
+    """SQL issued while the test runs"""
+    issued = []
+
+    def count(conn, cursor, statement, *args):
+        issued.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    yield issued
+    event.remove(db.engine, 'before_cursor_execute', count)
+
+
+def test_cached_employee_loads_without_sql(statements, employee):
+    identity_cache.invalidate(employee)
+    first = load_employee(employee)
+    db.session.remove()
+    del statements[:]
+
+    second = load_employee(employee)
+    assert statements == []
+    assert (second.id, second.full_name) == (employee, first.full_name)
+    # Each request gets its own instance, never the shared copy
+    assert second is not identity_cache.get(employee)
+
+
+def test_committed_change_reaches_the_next_request(app, employee):
+    client = login(app, employee)
+    assert client.get('/dashboard').status_code == 200
+    with app.app_context():
+        assert identity_cache.get(employee) is not None
+        renamed = db.session.get(Employee, employee)
+        first_name, renamed.first_name = renamed.first_name, 'Renamed'
+        db.session.commit()
+        assert identity_cache.get(employee) is None
+
+    try:
+        assert 'Renamed' in client.get('/dashboard').get_data(as_text=True)
+    finally:
+        with app.app_context():
+            db.session.get(Employee, employee).first_name = first_name
+            db.session.commit()
+
+
+def test_rolled_back_change_keeps_the_copy(app_context, employee):
+    load_employee(employee)
+    db.session.get(Employee, employee).first_name = 'Never saved'
+    db.session.flush()
+    db.session.rollback()
+    assert identity_cache.get(employee).first_name != 'Never saved'
+
+
+def test_copies_expire_and_the_oldest_is_evicted(app_context, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('auth.time.monotonic', lambda: clock[0])
+    cache = IdentityCache(ttl=10, maxsize=2)
+    first, second, third = Employee.query.order_by(Employee.id).limit(3).all()
+
+    cache.put(first)
+    cache.put(second)
+    assert cache.get(first.id) is not None
+    # first was just used, so second is the least recently used one
+    cache.put(third)
+    assert cache.get(second.id) is None
+    assert cache.get(first.id).id == first.id
+
+    clock[0] += 11
+    assert cache.get(first.id) is None
+    assert cache.get(third.id) is None
+
+
+def test_zero_ttl_turns_the_cache_off(app_context):
+    cache = IdentityCache(ttl=0)
+    employee = Employee.query.first()
+    cache.put(employee)
+    assert cache.get(employee.id) is None
@@ -0,0 +1,44 @@
+from datetime import date
+import pytest
+import commit_hooks
+from app import db
+from cache import generations
+from commit_hooks import on_change, entries_written
+from models import Employee
+
+
+@pytest.fixture
+def subscriber():
+    seen = []
+    on_change(seen.append)
+    yield seen
+    commit_hooks._subscribers.remove(seen.append)
+
+
+def test_core_writes_reach_every_subscriber(app_context, employee, subscriber):
+    before = generations.employee_token(employee)
+    entries_written([(employee, date(2024, 1, 2))])
+    assert subscriber[0].entries == {(employee, date(2024, 1, 2))}
+    assert generations.employee_token(employee) != before
+
+
+def test_commits_are_published_once_and_rollbacks_never(app_context, employee, subscriber):
+    db.session.get(Employee, employee).phone = '555-0100'
+    db.session.rollback()
+    assert subscriber == []
+
+    db.session.get(Employee, employee).phone = '555-0101'
+    db.session.flush()
+    db.session.commit()
+    assert [changes.employees for changes in subscriber] == [{employee}]
+
+
+def test_failing_subscriber_does_not_stop_the_others(app_context, employee, subscriber):
+    def broken(changes):
+        raise RuntimeError('boom')
+    commit_hooks._subscribers.insert(0, broken)
+    try:
+        entries_written([(employee, date(2024, 1, 3))])
+    finally:
+        commit_hooks._subscribers.remove(broken)
+    assert len(subscriber) == 1
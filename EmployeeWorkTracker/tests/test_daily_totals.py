@@ -0,0 +1,96 @@
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import func
+from app import db
+from models import EmployeeDailyTotal, TimeEntry
+
+
+def stored_and_summed(employee_id, days):
+    """{day: (hours, entries)} from employee_daily_total and from SUM over time_entry"""
+    stored = {row.date: (round(row.hours, 4), row.entries_count) for row in EmployeeDailyTotal.query
+              .filter(EmployeeDailyTotal.employee_id == employee_id, EmployeeDailyTotal.date.in_(days))}
+    summed = {day: (round(hours, 4), count) for day, hours, count in db.session.query(
+        TimeEntry.date, func.sum(TimeEntry.hours_worked), func.count(TimeEntry.id))
+        .filter(TimeEntry.employee_id == employee_id, TimeEntry.date.in_(days))
+        .group_by(TimeEntry.date)}
+    return stored, summed
+
+
+def test_totals_follow_insert_edit_redate_and_delete(app_context, employee):
+    first, second = date.today() - timedelta(days=50), date.today() - timedelta(days=51)
+    days = [first, second]
+
+    entries = [TimeEntry(employee_id=employee, date=first, hours_worked=hours) for hours in (2.25, 3.5)]
+    db.session.add_all(entries)
+    db.session.commit()
+    stored, summed = stored_and_summed(employee, days)
+    assert stored == summed == {first: (5.75, 2)}
+
+    entries[0].hours_worked = 4.1
+    db.session.commit()
+    stored, summed = stored_and_summed(employee, days)
+    assert stored == summed == {first: (7.6, 2)}
+
+    # Re-dating moves the hours: the old day shrinks, the new one appears
+    entries[1].date = second
+    db.session.commit()
+    stored, summed = stored_and_summed(employee, days)
+    assert stored == summed == {first: (4.1, 1), second: (3.5, 1)}
+
+    # A day whose last entry is deleted loses its row instead of keeping zeros
+    db.session.delete(entries[0])
+    db.session.commit()
+    stored, summed = stored_and_summed(employee, days)
+    assert stored == summed == {second: (3.5, 1)}
+
+    db.session.delete(entries[1])
+    db.session.commit()
+    assert stored_and_summed(employee, days) == ({}, {})
+
+
+def test_rolled_back_changes_leave_totals_alone(app_context, employee):
+    day = date.today() - timedelta(days=52)
+    db.session.add(TimeEntry(employee_id=employee, date=day, hours_worked=6))
+    db.session.flush()
+    db.session.rollback()
+    assert stored_and_summed(employee, [day]) == ({}, {})
+
+
+@pytest.fixture
+def cli(app):
+    runner = app.test_cli_runner()
+    yield runner
+    # Leave the tables consistent for the tests that follow, whatever happened
+    runner.invoke(args=['rebuild-daily-totals'])
+
+
+def test_rebuild_command_reports_and_repairs_drift(app, cli, employee):
+    day = date.today() - timedelta(days=53)
+    with app.app_context():
+        db.session.add(TimeEntry(employee_id=employee, date=day, hours_worked=2))
+        db.session.commit()
+
+    result = cli.invoke(args=['rebuild-daily-totals', '--verify'])
+    assert result.exit_code == 0, result.output
+    assert '0 drifted day(s) found.' in result.output
+
+    # Drift the stored total behind the ORM's back
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(EmployeeDailyTotal.__table__.update()
+                               .where(EmployeeDailyTotal.employee_id == employee, EmployeeDailyTotal.date == day)
+                               .values(hours=9, entries_count=3))
+
+    result = cli.invoke(args=['rebuild-daily-totals', '--verify'])
+    assert result.exit_code == 1
+    assert f'employee={employee} date={day} stored=(9.0, 3) expected=(2.0, 1)' in result.output
+    with app.app_context():
+        assert EmployeeDailyTotal.query.filter_by(employee_id=employee, date=day).one().hours == 9
+
+    result = cli.invoke(args=['rebuild-daily-totals'])
+    assert result.exit_code == 0, result.output
+    assert '1 drifted day(s) found.' in result.output
+    with app.app_context():
+        assert EmployeeDailyTotal.find_drift() == []
+        assert stored_and_summed(employee, [day])[0] == {day: (2.0, 1)}
+        db.session.remove()
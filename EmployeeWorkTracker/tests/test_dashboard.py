@@ -0,0 +1,28 @@
+from datetime import date
+from app import db
+from models import TimeEntry
+from conftest import login
+
+
+def test_dashboard_shows_writes_this_process_never_saw(app, employee):
+    client = login(app, employee)
+    first = client.get('/dashboard')
+    assert first.status_code == 200
+    assert 'ETag' not in first.headers
+
+    # Core statements fire no session events, as if another worker had run them
+    entries = TimeEntry.__table__
+    with app.app_context():
+        with db.engine.begin() as connection:
+            entry_id = connection.execute(entries.insert().values(
+                employee_id=employee, date=date.today(), hours_worked=1.5, break_hours=0,
+                project='Written elsewhere', is_approved=False)).inserted_primary_key[0]
+    try:
+        second = client.get('/dashboard', headers={'If-None-Match': '*'})
+        assert second.status_code == 200
+        assert 'Written elsewhere' in second.get_data(as_text=True)
+    finally:
+        # It bypassed the daily totals too; leave no drift behind
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(entries.delete().where(entries.c.id == entry_id))
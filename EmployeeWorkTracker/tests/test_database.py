@@ -0,0 +1,86 @@
+"""Backend-specific paths; run on SQLite by default and on PostgreSQL with TEST_DATABASE_URL."""
+import logging
+import pytest
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.exc import IntegrityError
+from app import db
+from database import database_url_from_env, engine_options_from_env
+from models import Employee, TimeEntry, EmployeeDailyTotal
+
+
+def test_database_url_defaults_to_sqlite():
+    assert database_url_from_env({}).startswith('sqlite:///')
+
+
+def test_postgres_urls_use_the_declared_driver():
+    assert database_url_from_env({'DATABASE_URL': 'postgres://u:p@db/app'}) == 'postgresql+psycopg2://u:p@db/app'
+    assert database_url_from_env({'DATABASE_URL': 'postgresql://u:p@db/app'}) == 'postgresql+psycopg2://u:p@db/app'
+    assert database_url_from_env({'DATABASE_URL': 'postgresql+psycopg://db/app'}) == 'postgresql+psycopg://db/app'
+
+
+def test_pool_settings_apply_to_server_databases_only():
+    environ = {'DB_POOL_SIZE': '7', 'DB_MAX_OVERFLOW': '3', 'DB_STATEMENT_TIMEOUT_MS': '5000'}
+    options = engine_options_from_env('postgresql+psycopg2://db/app', environ)
+    assert options['pool_size'] == 7
+    assert options['max_overflow'] == 3
+    assert options['pool_pre_ping'] is True
+    assert options['connect_args'] == {'options': '-c statement_timeout=5000'}
+    assert engine_options_from_env('sqlite:///x.db', environ) == {}
+
+
+def test_schema_is_at_the_latest_version(app_context):
+    from migrations import current_version, LATEST_VERSION
+    with db.engine.connect() as conn:
+        assert current_version(conn) == LATEST_VERSION
+
+
+def test_search_matches_word_prefixes(app_context):
+    from search import ranked_employee_query
+    employee = Employee.query.filter(Employee.is_admin.is_(False)).order_by(Employee.id).first()
+    by_code = ranked_employee_query(employee.employee_id[:-1]).all()
+    assert employee in by_code
+    by_name = ranked_employee_query(f"{employee.first_name[:3]} {employee.last_name[:2]}").all()
+    assert employee in by_name
+    assert ranked_employee_query('zzzzqqq').all() == []
+
+
+def test_archived_entries_stay_readable(app_context):
+    from archive import archive_entries, entry_source, partitions
+    first_day = db.session.query(func.min(TimeEntry.date)).scalar()
+    cutoff = first_day + (db.session.query(func.max(TimeEntry.date)).scalar() - first_day) / 4
+    before = db.session.execute(select(func.count(), func.sum(TimeEntry.hours_worked))
+                                .where(TimeEntry.date < cutoff)).one()
+    db.session.commit()
+
+    moved = archive_entries(cutoff, batch_size=50)
+    assert sum(moved.values()) > 0
+    assert partitions(first_day, cutoff)
+
+    entries = entry_source(first_day, cutoff)
+    after = db.session.query(func.count(entries.id), func.sum(entries.hours_worked))\
+        .filter(entries.date < cutoff).one()
+    assert after[0] == before[0]
+    assert round(after[1], 2) == round(before[1], 2)
+    assert EmployeeDailyTotal.find_drift() == []
+
+
+def test_duplicate_open_sessions_are_logged_before_the_unique_index(caplog):
+    from migrations import _add_hot_path_indexes
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        # active_session as it was before version 2, without the unique index
+        TimeEntry.__table__.create(conn)
+        conn.execute(text("CREATE TABLE active_session (id INTEGER PRIMARY KEY, employee_id INTEGER NOT NULL, "
+                          "start_time DATETIME NOT NULL, description TEXT, project VARCHAR(100), "
+                          "created_at DATETIME)"))
+        conn.execute(text("INSERT INTO active_session (id, employee_id, start_time, project) VALUES "
+                          "(1, 5, '2024-03-04 08:00:00', 'Kept'), (2, 5, '2024-03-04 09:30:00', 'Late'), "
+                          "(3, 6, '2024-03-04 08:15:00', '')"))
+
+        with caplog.at_level(logging.WARNING, logger='migrations'):
+            _add_hot_path_indexes(conn)
+
+        assert conn.execute(text("SELECT id FROM active_session ORDER BY id")).scalars().all() == [1, 3]
+        assert "duplicate open session 2 of employee 5 started 2024-03-04 09:30:00 (project 'Late'" in caplog.text
+        with pytest.raises(IntegrityError):
+            conn.execute(text("INSERT INTO active_session (employee_id, start_time) VALUES (6, '2024-03-05')"))
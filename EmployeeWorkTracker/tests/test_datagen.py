@@ -0,0 +1,8 @@
+from models import TimeEntry
+
+
+def test_history_is_recorded_after_each_shift_ends(app_context):
+    # Night shifts end the next day; none may be recorded before they start or end
+    recorded_early = TimeEntry.query.filter(TimeEntry.created_at < TimeEntry.ended_at).count()
+    assert TimeEntry.query.filter(TimeEntry.end_time < TimeEntry.start_time).count()
+    assert recorded_early == 0
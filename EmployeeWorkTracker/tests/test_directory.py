@@ -0,0 +1,124 @@
+import re
+from urllib.parse import unquote
+import pytest
+from sqlalchemy import event, func
+from app import db
+from directory import (DepartmentFacet, LIST_ORDER, department_facet, format_employee_cursor,
+                       parse_employee_cursor, summaries, LIST_COLUMNS)
+from models import Employee
+
+
+def walk_directory(client, **args):
+    """Employee codes of every page, following the Next links"""
+    codes, cursors = [], []
+    while True:
+        response = client.get('/employees', query_string=args)
+        assert response.status_code == 200
+        page = response.get_data(as_text=True)
+        codes.extend(re.findall(r'ID: (\S+)</small>', page))
+        next_link = re.search(r'after=([^"&]+)', page)
+        if next_link is None:
+            return codes, cursors
+        args['after'] = unquote(next_link.group(1))
+        cursors.append(args['after'])
+
+
+def expected_codes(app, department=None):
+    with app.app_context():
+        query = db.session.query(Employee.employee_id).order_by(*LIST_ORDER)
+        if department:
+            query = query.filter(Employee.department == department)
+        codes = [code for code, in query]
+        db.session.remove()
+    return codes
+
+
+def test_keyset_pages_cover_the_list_once_in_order(app, admin_client, monkeypatch):
+    monkeypatch.setattr('routes.EMPLOYEE_PAGE_SIZE', 7)
+    codes, cursors = walk_directory(admin_client)
+    assert codes == expected_codes(app)
+    assert len(cursors) == (len(codes) - 1) // 7
+
+
+def test_keyset_pages_keep_the_department_filter(app, admin_client, monkeypatch):
+    monkeypatch.setattr('routes.EMPLOYEE_PAGE_SIZE', 3)
+    with app.app_context():
+        department = db.session.query(Employee.department).filter(Employee.department.isnot(None))\
+            .group_by(Employee.department).order_by(func.count().desc()).limit(1).scalar()
+    codes, cursors = walk_directory(admin_client, department=department)
+    assert codes == expected_codes(app, department)
+    assert cursors
+
+
+def test_cursor_round_trip_and_bad_cursors(app_context):
+    row = summaries(db.session.query(*LIST_COLUMNS).order_by(*LIST_ORDER).limit(1))[0]
+    assert parse_employee_cursor(format_employee_cursor(row)) == (row.first_name, row.last_name, row.id)
+    for bad in ('', 'not base64!', 'WzFd', format_employee_cursor(row)[:-4]):
+        assert parse_employee_cursor(bad) is None
+
+
+def test_bad_cursor_shows_the_first_page(app, admin_client, monkeypatch):
+    monkeypatch.setattr('routes.EMPLOYEE_PAGE_SIZE', 5)
+    response = admin_client.get('/employees', query_string={'after': 'garbage'})
+    assert re.findall(r'ID: (\S+)</small>', response.get_data(as_text=True)) == expected_codes(app)[:5]
+
+
+@pytest.fixture
+def statements(app_context):
+    issued = []
+
+    def count(conn, cursor, statement, *args):
+        issued.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    yield issued
+    event.remove(db.engine, 'before_cursor_execute', count)
+
+
+def test_facet_counts_are_cached_until_an_employee_changes(statements, employee):
+    department_facet.invalidate()
+    counts, total = department_facet.snapshot()
+    expected = dict(db.session.query(Employee.department, func.count(Employee.id))
+                    .filter(Employee.department.isnot(None)).group_by(Employee.department).all())
+    assert dict(counts) == {department: count for department, count in expected.items() if department}
+    assert total == Employee.query.count()
+
+    del statements[:]
+    assert department_facet.snapshot() == (counts, total)
+    assert statements == []
+
+    changed = db.session.get(Employee, employee)
+    department, changed.department = changed.department, 'Facet test'
+    db.session.commit()
+    try:
+        assert dict(department_facet.snapshot()[0])['Facet test'] == 1
+    finally:
+        changed.department = department
+        db.session.commit()
+    assert 'Facet test' not in dict(department_facet.snapshot()[0])
+
+
+def test_facet_read_during_an_invalidation_is_not_kept(statements):
+    facet = DepartmentFacet(ttl=60)
+
+    def invalidate_midway(conn, cursor, statement, *args):
+        facet.invalidate()
+    event.listen(db.engine, 'before_cursor_execute', invalidate_midway, once=True)
+    facet.snapshot()
+
+    del statements[:]
+    facet.snapshot()
+    assert len(statements) == 1
+
+
+def test_facet_expires_after_its_ttl(statements, monkeypatch):
+    clock = [500.0]
+    monkeypatch.setattr('directory.time.monotonic', lambda: clock[0])
+    facet = DepartmentFacet(ttl=60)
+    facet.snapshot()
+    del statements[:]
+    clock[0] += 59
+    facet.snapshot()
+    assert statements == []
+    clock[0] += 2
+    facet.snapshot()
+    assert len(statements) == 1
@@ -0,0 +1,34 @@
+import time
+from conftest import login
+from events import broker, stream_events
+
+
+def test_stream_ends_after_its_time_limit():
+    started = time.monotonic()
+    seq = broker.publish('clock_in', {'employee_id': 1})
+    frames = list(stream_events(seq - 1, max_seconds=0.2))
+    assert time.monotonic() - started < 2
+    assert frames[0].startswith('retry:')
+    assert any(frame.startswith(f'id: {seq}\nevent: clock_in') for frame in frames)
+
+
+def test_employee_stream_carries_only_their_own_events():
+    seq = broker.publish('clock_in', {'employee_id': 1})
+    broker.publish('clock_in', {'employee_id': 2})
+    broker.publish('entry_approved', {'employee_id': 1, 'entry_id': 7})
+    frames = list(stream_events(seq - 1, employee_id=1, max_seconds=0.2))
+    sent = [frame for frame in frames if frame.startswith('id:')]
+    assert [frame.split('\n')[1] for frame in sent] == ['event: clock_in', 'event: entry_approved']
+
+
+def test_employees_and_admins_can_subscribe(app, employee, admin_client):
+    configured = app.config['EVENT_STREAM_SECONDS']
+    app.config['EVENT_STREAM_SECONDS'] = 0.2
+    try:
+        for client in (login(app, employee), admin_client):
+            response = client.get('/events/stream')
+            assert response.status_code == 200
+            assert response.mimetype == 'text/event-stream'
+            response.close()
+    finally:
+        app.config['EVENT_STREAM_SECONDS'] = configured
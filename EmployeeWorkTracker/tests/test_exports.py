@@ -0,0 +1,89 @@
+import csv
+import io
+from datetime import date, timedelta
+import pytest
+import exports
+from app import db
+from models import Employee, EmployeeDailyTotal, Job
+from exports import EXPORT_COLUMNS
+from jobs import submit
+from conftest import login, run_queued_jobs
+
+EVERYTHING = {'start_date': '2000-01-01', 'end_date': (date.today() + timedelta(days=1)).isoformat()}
+
+
+def rows_in_totals(app, employee_id=None):
+    """Entries in EVERYTHING as the daily totals count them, archived years included"""
+    with app.app_context():
+        query = db.session.query(db.func.sum(EmployeeDailyTotal.entries_count))
+        if employee_id is not None:
+            query = query.filter(EmployeeDailyTotal.employee_id == employee_id)
+        count = query.scalar()
+        db.session.remove()
+    return count
+
+
+def read_csv(data):
+    rows = list(csv.reader(io.StringIO(data)))
+    assert rows[0] == [header for header, _ in EXPORT_COLUMNS]
+    return rows[1:]
+
+
+def test_admin_csv_streams_every_entry_in_chunks(app, admin_client, monkeypatch):
+    monkeypatch.setattr(exports, 'FETCH_SIZE', 50)
+    response = admin_client.get('/reports/export', query_string=dict(EVERYTHING, format='csv'))
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert 'attachment; filename="time_entries_2000-01-01_' in response.headers['Content-Disposition']
+
+    chunks = list(response.response)
+    assert len(chunks) > 2
+    rows = read_csv(b''.join(chunks).decode('utf-8'))
+    assert len(rows) == rows_in_totals(app)
+    approved = [header for header, _ in EXPORT_COLUMNS].index('Approved')
+    assert {row[approved] for row in rows} <= {'yes', 'no'}
+    dates = [row[5] for row in rows]
+    assert dates == sorted(dates)
+
+
+def test_employee_export_has_only_their_entries(app, employee):
+    with app.app_context():
+        code = db.session.get(Employee, employee).employee_id
+    response = login(app, employee).get('/reports/export', query_string=dict(EVERYTHING, format='csv'))
+    rows = read_csv(response.get_data(as_text=True))
+    assert rows and {row[0] for row in rows} == {code}
+    assert len(rows) == rows_in_totals(app, employee)
+
+
+@pytest.mark.parametrize('export_format', ['pdf', 'xlsx'])
+def test_unavailable_formats_go_back_to_the_report(admin_client, monkeypatch, export_format):
+    monkeypatch.setattr('routes.XLSX_AVAILABLE', False)
+    response = admin_client.get('/reports/export', query_string=dict(EVERYTHING, format=export_format))
+    assert response.status_code == 302
+    assert '/reports' in response.headers['Location']
+
+
+def test_xlsx_export_is_a_workbook(app, admin_client):
+    openpyxl = pytest.importorskip('openpyxl')
+    response = admin_client.get('/reports/export', query_string=dict(EVERYTHING, format='xlsx'))
+    workbook = openpyxl.load_workbook(io.BytesIO(response.get_data()), read_only=True)
+    rows = list(workbook['Time Entries'].iter_rows(values_only=True))
+    assert list(rows[0]) == [header for header, _ in EXPORT_COLUMNS]
+    assert len(rows) == rows_in_totals(app) + 1
+
+
+def test_export_job_writes_the_same_csv(app, admin_client):
+    run_queued_jobs(app)
+    expected = admin_client.get('/reports/export', query_string=dict(EVERYTHING, format='csv')).get_data()
+    with app.app_context():
+        job_id = submit('export_entries', dict(EVERYTHING, format='csv', scope=None)).id
+    run_queued_jobs(app)
+
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        assert job.status == Job.SUCCEEDED, job.error
+        assert job.to_dict()['result'] == {'rows': rows_in_totals(app)}
+    response = admin_client.get(f'/jobs/{job_id}/result')
+    assert response.status_code == 200
+    assert response.get_data() == expected
+    response.close()
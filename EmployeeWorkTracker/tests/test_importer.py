@@ -0,0 +1,79 @@
+import io
+import json
+from datetime import date, timedelta
+import pytest
+from app import db
+from models import Employee, EmployeeDailyTotal, TimeEntry
+from importer import import_entries
+
+
+@pytest.fixture
+def code(app_context, employee):
+    return db.session.get(Employee, employee).employee_id
+
+
+def test_csv_import_handles_overnight_breaks_and_bad_rows(code, employee):
+    day = date.today() - timedelta(days=30)
+    rows = [
+        'employee_id,date,start_time,end_time,break_hours,hours_worked,project',
+        f'{code},{day},22:00,06:00,,,Night',                # overnight, ends the next day
+        f'{code},{day},09:00,17:30,0.5,,Day',               # break taken off the shift
+        f'{code},{day},,,,1.25,Hours only',
+        f'NOBODY,{day},09:00,10:00,,,',
+        f'{code},{day:%d.%m.%Y},09:00,10:00,,,',
+        f'{code},{day},09:00,,,,',
+        f'{code},{day},09:00,10:00,2,,',
+        f'{code},{day},9am,10:00,,,',
+        f'{code},{day},,,,-1,',
+        f'{code},{day},,,,,',
+    ]
+    result = import_entries(io.StringIO('\n'.join(rows) + '\n'), 'csv', batch_size=2)
+
+    assert (result.rows_read, result.rows_inserted, result.error_count) == (10, 3, 7)
+    assert result.errors == [
+        (5, "unknown employee_id 'NOBODY'"),
+        (6, f"date must be YYYY-MM-DD, got '{day:%d.%m.%Y}'"),
+        (7, "start_time and end_time must be given together"),
+        (8, "break_hours is longer than the shift"),
+        (9, "start_time must be HH:MM, got '9am'"),
+        (10, "hours_worked cannot be negative"),
+        (11, "either start_time/end_time or hours_worked is required"),
+    ]
+
+    entries = {entry.project: entry for entry in TimeEntry.query.filter_by(employee_id=employee, date=day)}
+    night = entries['Night']
+    assert night.hours_worked == pytest.approx(8)
+    assert night.ended_at - night.started_at == timedelta(hours=8)
+    assert night.ended_at.date() == day + timedelta(days=1)
+    assert entries['Day'].hours_worked == pytest.approx(8)
+    assert entries['Hours only'].started_at is None
+
+    # The generated history is shorter, so the day holds only these; Core inserts still
+    # keep its total in step
+    total = EmployeeDailyTotal.query.filter_by(employee_id=employee, date=day).one()
+    assert (round(total.hours, 4), total.entries_count) == (17.25, 3)
+
+
+def test_jsonl_import_reports_line_numbers_of_bad_json(code, employee):
+    day = date.today() - timedelta(days=31)
+    lines = [
+        json.dumps({'employee_id': code, 'date': str(day), 'hours_worked': 2, 'is_approved': 'yes'}),
+        '',
+        '{"employee_id": ',
+        json.dumps(['not', 'an', 'object']),
+        json.dumps({'employee_id': code, 'date': str(day), 'start_time': '08:00:00', 'end_time': '12:00:00'}),
+    ]
+    result = import_entries(io.StringIO('\n'.join(lines)), 'jsonl')
+
+    assert (result.rows_read, result.rows_inserted) == (4, 2)
+    assert [line for line, _ in result.errors] == [3, 4]
+    assert result.errors[0][1].startswith('invalid JSON')
+    assert result.errors[1][1] == 'record must be an object'
+    approved = {entry.hours_worked: entry.is_approved
+                for entry in TimeEntry.query.filter_by(employee_id=employee, date=day)}
+    assert approved == {2.0: True, 4.0: False}
+
+
+def test_unknown_format_is_refused(app_context):
+    with pytest.raises(ValueError, match='Unsupported import format'):
+        import_entries(io.StringIO(''), 'xlsx')
@@ -0,0 +1,142 @@
+import os
+from datetime import datetime, timedelta
+import pytest
+import jobs
+from app import db
+from models import Job
+from jobs import JobError, JobKind, JobWorkerPool, claim_next, run_job, submit, _finish
+from conftest import run_queued_jobs
+
+
+def _succeed(context, params):
+    with context.open_result('result.txt', 'w') as f:
+        f.write('done')
+    return {'echo': params.get('value')}
+
+
+def _refuse(context, params):
+    raise JobError('Nothing to do.')
+
+
+def _crash(context, params):
+    raise RuntimeError('boom')
+
+
+@pytest.fixture
+def queue(app, monkeypatch):
+    """An empty queue with three test job kinds and no periodic tasks; removes the jobs it made"""
+    run_queued_jobs(app)
+    for kind, run in (('test_ok', _succeed), ('test_refused', _refuse), ('test_crash', _crash)):
+        monkeypatch.setitem(jobs.JOB_KINDS, kind, JobKind(run, ('value',), False, None, kind, False))
+    monkeypatch.setattr(jobs, 'PERIODIC_TASKS', [])
+    with app.app_context():
+        first_id = (db.session.query(db.func.max(Job.id)).scalar() or 0) + 1
+        yield app
+        db.session.rollback()
+        Job.query.filter(Job.id >= first_id).delete(synchronize_session=False)
+        db.session.commit()
+        db.session.remove()
+
+
+def run_next(app):
+    claimed = claim_next('test')
+    run_job(app, *claimed)
+    return db.session.get(Job, claimed[0])
+
+
+def test_jobs_record_success_refusal_and_crash(queue):
+    ids = [submit(kind, {'value': 7}).id for kind in ('test_ok', 'test_refused', 'test_crash')]
+
+    done, refused, crashed = (run_next(queue) for _ in ids)
+    assert [job.id for job in (done, refused, crashed)] == ids
+    assert done.status == Job.SUCCEEDED and done.to_dict()['result'] == {'echo': 7}
+    with open(os.path.join(queue.config['JOB_RESULT_DIR'], done.result_file)) as f:
+        assert f.read() == 'done'
+    assert (refused.status, refused.error) == (Job.FAILED, 'Nothing to do.')
+    assert crashed.status == Job.FAILED and 'unexpectedly' in crashed.error
+    assert claim_next('test') is None
+
+
+def test_job_of_a_dead_worker_is_retried_then_failed(queue, monkeypatch):
+    monkeypatch.setitem(queue.config, 'JOB_MAX_ATTEMPTS', 2)
+    pool = JobWorkerPool()
+    pool.app = queue
+    job_id = submit('test_ok').id
+
+    def die_while_running():
+        claimed = claim_next('dead')
+        # The worker stops sending heartbeats
+        db.session.execute(db.update(Job).where(Job.id == job_id)
+                           .values(heartbeat_at=datetime.utcnow() - timedelta(hours=1)))
+        db.session.commit()
+        return claimed
+
+    first = die_while_running()
+    pool.supervise()
+    db.session.expire_all()
+    assert db.session.get(Job, job_id).status == Job.QUEUED
+
+    second = die_while_running()
+    assert second[0] == job_id
+    # The first worker waking up late may not overwrite the second one's job
+    _finish(job_id, first[1], status=Job.SUCCEEDED)
+    db.session.expire_all()
+    assert db.session.get(Job, job_id).status == Job.RUNNING
+
+    pool.supervise()
+    db.session.expire_all()
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts) == (Job.FAILED, 2)
+    assert job.error == 'The worker running this job stopped responding.'
+
+
+def test_supervisor_drops_expired_jobs_and_their_files(queue):
+    pool = JobWorkerPool()
+    pool.app = queue
+    submit('test_ok')
+    job = run_next(queue)
+    job_id = job.id
+    path = os.path.join(queue.config['JOB_RESULT_DIR'], job.result_file)
+    job.finished_at = datetime.utcnow() - timedelta(days=queue.config['JOB_RETENTION_DAYS'] + 1)
+    db.session.commit()
+
+    pool.supervise()
+    db.session.expire_all()
+    assert db.session.get(Job, job_id) is None
+    assert not os.path.exists(path)
+
+
+def test_periodic_tasks_run_when_due(queue, monkeypatch):
+    calls = []
+
+    def sweep():
+        calls.append('sweep')
+
+    def broken():
+        calls.append('broken')
+        raise RuntimeError('boom')
+
+    def disabled():
+        calls.append('disabled')
+
+    monkeypatch.setattr(jobs, 'PERIODIC_TASKS', [('TEST_BROKEN_SECONDS', broken),
+                                                 ('TEST_SWEEP_SECONDS', sweep),
+                                                 ('TEST_DISABLED_SECONDS', disabled)])
+    for key, value in (('TEST_BROKEN_SECONDS', 60), ('TEST_SWEEP_SECONDS', 60), ('TEST_DISABLED_SECONDS', 0)):
+        monkeypatch.setitem(queue.config, key, value)
+    clock = [1000.0]
+    monkeypatch.setattr(jobs.time, 'monotonic', lambda: clock[0])
+    pool = JobWorkerPool()
+    pool.app = queue
+
+    # A failing task does not keep the next one from running
+    pool.run_periodic()
+    assert calls == ['broken', 'sweep']
+
+    clock[0] += 30
+    pool.run_periodic()
+    assert calls == ['broken', 'sweep']
+
+    clock[0] += 31
+    pool.run_periodic()
+    assert calls == ['broken', 'sweep', 'broken', 'sweep']
@@ -0,0 +1,93 @@
+import logging
+import pytest
+from metrics import Histogram, RequestMetrics, request_metrics, CONTENT_TYPE
+from conftest import login
+
+
+def samples(text):
+    """{'name{labels}': value} for every sample line of an exposition"""
+    parsed = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            parsed[name] = float(value)
+    return parsed
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    histogram = Histogram((1, 5))
+    for value in (0, 1, 3, 5, 9):
+        histogram.observe(value)
+    assert list(histogram.samples('x', 'endpoint="e"')) == [
+        'x_bucket{endpoint="e",le="1"} 2',
+        'x_bucket{endpoint="e",le="5"} 4',
+        'x_bucket{endpoint="e",le="+Inf"} 5',
+        'x_sum{endpoint="e"} 18',
+        'x_count{endpoint="e"} 5',
+    ]
+
+
+def test_labels_are_escaped():
+    class Stats:
+        sql_count, sql_seconds, template_seconds = 0, 0.0, 0.0
+    metrics = RequestMetrics()
+    metrics.observe('odd"end\\point', 'GET', 200, 0.01, Stats(), None)
+    assert 'endpoint="odd\\"end\\\\point"' in metrics.render()
+
+
+@pytest.fixture
+def fresh_metrics():
+    request_metrics.reset()
+    yield request_metrics
+    request_metrics.reset()
+
+
+def test_requests_are_recorded_per_endpoint(app, admin_client, fresh_metrics):
+    dashboards = [admin_client.get('/dashboard') for _ in range(2)]
+    admin_client.get('/no-such-page')
+    statements = sum(int(dashboard.headers['X-SQL-Statements']) for dashboard in dashboards)
+
+    response = admin_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == CONTENT_TYPE
+    figures = samples(response.get_data(as_text=True))
+
+    assert figures['ewt_http_requests_total{endpoint="dashboard",method="GET",status="200"}'] == 2
+    assert figures['ewt_http_requests_total{endpoint="unmatched",method="GET",status="404"}'] == 1
+    assert figures['ewt_http_request_duration_seconds_count{endpoint="dashboard"}'] == 2
+    assert figures['ewt_sql_statements_per_request_count{endpoint="dashboard"}'] == 2
+    # The same statements the query budget counted
+    assert figures['ewt_sql_statements_per_request_sum{endpoint="dashboard"}'] == statements
+    assert figures['ewt_http_response_size_bytes_sum{endpoint="dashboard"}'] == \
+        sum(len(dashboard.get_data()) for dashboard in dashboards)
+    assert figures['ewt_template_render_seconds_total{endpoint="dashboard"}'] > 0
+    assert figures['ewt_sql_duration_seconds_total{endpoint="dashboard"}'] > 0
+
+
+def test_streamed_responses_have_no_size(admin_client, fresh_metrics):
+    admin_client.get('/reports/export', query_string={'format': 'csv'}).close()
+    figures = samples(admin_client.get('/metrics').get_data(as_text=True))
+    assert figures['ewt_http_requests_total{endpoint="export_report",method="GET",status="200"}'] == 1
+    assert not any('http_response_size_bytes' in name and 'export_report' in name for name in figures)
+
+
+def test_metrics_need_an_admin_or_the_token(app, employee, admin_client, monkeypatch):
+    assert app.test_client().get('/metrics').status_code == 403
+    assert login(app, employee).get('/metrics').status_code == 403
+    assert admin_client.get('/metrics').status_code == 200
+
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'scrape-secret')
+    scraper = app.test_client()
+    assert scraper.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+    assert scraper.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    # With a token set the scraper is the only way in
+    assert admin_client.get('/metrics').status_code == 403
+
+
+def test_slow_requests_are_logged_with_their_sql(app, admin_client, monkeypatch, caplog):
+    monkeypatch.setitem(app.config, 'SLOW_REQUEST_SECONDS', 0)
+    with caplog.at_level(logging.WARNING, logger='metrics'):
+        admin_client.get('/dashboard')
+    message = next(record.getMessage() for record in caplog.records if record.name == 'metrics')
+    assert message.startswith('Slow request GET /dashboard (dashboard)')
+    assert 'SELECT' in message
@@ -0,0 +1,37 @@
+import pytest
+from app import db
+from models import Employee
+from query_budget import query_budget, QueryBudgetExceeded
+from main import app as flask_app
+
+
+# Registered before the first request, as Flask requires
+@flask_app.route('/_test/lazy_employees')
+@query_budget(5)
+def lazy_entry_counts():
+    # One lazy load of time_entries per employee
+    employees = Employee.query.order_by(Employee.id).limit(20).all()
+    return ', '.join(str(len(employee.time_entries)) for employee in employees)
+
+
+@pytest.mark.parametrize('path', ['/dashboard', '/reports', '/admin', '/employees'])
+def test_admin_pages_stay_within_budget(app, admin_client, path):
+    response = admin_client.get(path)
+    assert response.status_code == 200
+    view = app.view_functions[path.strip('/')]
+    budget = getattr(view, 'query_budget', app.config['SQL_QUERY_BUDGET'])
+    assert int(response.headers['X-SQL-Statements']) <= budget
+
+
+def test_employee_dashboard_stays_within_budget(app, employee):
+    from conftest import login
+    response = login(app, employee).get('/dashboard')
+    assert response.status_code == 200
+    assert int(response.headers['X-SQL-Statements']) <= app.config['SQL_QUERY_BUDGET']
+
+
+def test_n_plus_one_trips_the_guard(app, admin_client):
+    with pytest.raises(QueryBudgetExceeded, match='lazy_entry_counts issued'):
+        admin_client.get('/_test/lazy_employees')
+    with app.app_context():
+        db.session.remove()
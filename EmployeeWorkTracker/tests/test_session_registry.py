@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from app import db
+from models import ActiveSession, Employee, TimeEntry
+from session_registry import active_sessions
+from timeclock import clock_in, clock_out
+
+
+@pytest.fixture
+def stale_registry(app_context, monkeypatch):
+    """This process's registry, loaded now and never resynced during the test"""
+    monkeypatch.setattr(active_sessions, 'sync_interval', None)
+    active_sessions.rebuild()
+    db.session.rollback()
+    return active_sessions
+
+
+def test_clock_out_sees_session_opened_by_another_worker(stale_registry, employee):
+    started = datetime.utcnow() - timedelta(hours=2)
+    # Core statements fire no session events, as if another process had run them
+    with db.engine.begin() as connection:
+        connection.execute(ActiveSession.__table__.insert().values(
+            employee_id=employee, start_time=started, description='', project=''))
+
+    # The copy only learns of it on its next resync, but the punch reads the table
+    assert not stale_registry.is_clocked_in(employee)
+    result = clock_out(db.session.get(Employee, employee))
+
+    assert result['hours_worked'] == pytest.approx(2, abs=0.01)
+    assert db.session.get(TimeEntry, result['entry_id']).employee_id == employee
+    assert not ActiveSession.query.filter_by(employee_id=employee).count()
+
+
+def test_clock_in_after_another_worker_closed_the_session(stale_registry, employee):
+    clock_in(db.session.get(Employee, employee))
+    with db.engine.begin() as connection:
+        connection.execute(ActiveSession.__table__.delete().where(ActiveSession.employee_id == employee))
+
+    result = clock_in(db.session.get(Employee, employee), project='retry')
+
+    assert stale_registry.get(employee).id == result['session_id']
+    clock_out(db.session.get(Employee, employee))
+    assert not stale_registry.is_clocked_in(employee)
+
+
+def test_clocked_in_check_issues_no_sql(stale_registry, employee):
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        assert not stale_registry.is_clocked_in(employee)
+        assert stale_registry.get(employee) is None
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert statements == []
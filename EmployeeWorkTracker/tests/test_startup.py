@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_touches_no_files(tmp_path):
+    # A database in a missing directory fails loudly if the import connects
+    env = dict(os.environ, LOG_LEVEL='WARNING', JOB_RESULT_DIR=str(tmp_path / 'job_results'),
+               DATABASE_URL=f"sqlite:///{tmp_path / 'missing' / 'startup.db'}")
+    subprocess.run([sys.executable, '-c', 'import main'], cwd=ROOT, env=env, check=True)
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,121 @@
+"""Clock-in and clock-out, shared by the web views and the JSON API.
+
+Both functions commit, keep the in-memory session registry in step and
+publish the live event, so every way of punching behaves the same. They
+return the event payload: plain values that stay readable after the
+commit without reloading anything.
+"""
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import ActiveSession, TimeEntry
+from durations import as_utc, utc_now, hours, entry_values
+from session_registry import active_sessions
+from events import broker
+
+
+class PunchError(Exception):
+    """A punch that does not fit the employee's current state"""
+    code = 'invalid_punch'
+
+
+class AlreadyClockedIn(PunchError):
+    code = 'already_clocked_in'
+
+
+class NotClockedIn(PunchError):
+    code = 'not_clocked_in'
+
+
+def clock_in(employee, description='', project='', start_time=None):
+    """Open a work session for ``employee``.
+
+    ``start_time`` (naive UTC) backdates the session, e.g. for punches a
+    badge reader stored while offline.
+    """
+    # A stale copy may still list a session another worker closed, so a hit is confirmed;
+    # a miss goes ahead and the unique index on employee_id catches one opened elsewhere
+    if active_sessions.is_clocked_in(employee.id) and active_sessions.refresh(employee.id) is not None:
+        raise AlreadyClockedIn('You already have an active session running.')
+
+    session = ActiveSession(
+        employee_id=employee.id,
+        start_time=start_time or datetime.utcnow(),
+        description=description,
+        project=project
+    )
+
+    db.session.add(session)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # A concurrent request or another worker started a session first
+        # (unique employee_id), so this registry copy is stale
+        db.session.rollback()
+        active_sessions.rebuild()
+        raise AlreadyClockedIn('You already have an active session running.')
+
+    # Built before the commit expires the objects, which would reload them
+    payload = {
+        'employee_id': employee.id,
+        'employee_name': employee.full_name,
+        'initials': employee.first_name[0] + employee.last_name[0],
+        'department': employee.department,
+        'session_id': session.id,
+        'start_time': session.start_time.isoformat(),
+        'project': session.project,
+    }
+    db.session.commit()
+
+    broker.publish('clock_in', payload)
+    return payload
+
+
+def clock_out(employee, end_time=None):
+    """Close the employee's open session, recording it as one TimeEntry per local day it touched"""
+    # Read from the table, not the registry: another worker may have opened or closed it
+    active_session = ActiveSession.query.filter_by(employee_id=employee.id).first()
+    if active_session is None:
+        active_sessions.discard(employee.id)
+        raise NotClockedIn('No active session found.')
+
+    started_at = as_utc(active_session.start_time)
+    if end_time is None:
+        # The session may have been opened by a worker whose clock runs ahead of this one
+        ended_at = max(utc_now(), started_at)
+    else:
+        ended_at = as_utc(end_time)
+        if ended_at < started_at:
+            raise PunchError('Clock-out is earlier than the start of the session.')
+
+    time_entries = [
+        TimeEntry(
+            employee_id=employee.id,
+            description=active_session.description,
+            project=active_session.project,
+            **values
+        )
+        for values in entry_values(started_at, ended_at)
+    ]
+
+    db.session.add_all(time_entries)
+    db.session.delete(active_session)
+    db.session.flush()
+
+    first, last = time_entries[0], time_entries[-1]
+    payload = {
+        'employee_id': employee.id,
+        'employee_name': employee.full_name,
+        'entry_id': first.id,
+        'entry_ids': [entry.id for entry in time_entries],
+        'date': first.date.isoformat(),
+        'start_time': first.start_time.isoformat(),
+        'end_time': last.end_time.isoformat(),
+        'started_at': started_at.isoformat(),
+        'ended_at': ended_at.isoformat(),
+        'hours_worked': hours(started_at, ended_at),
+    }
+    db.session.commit()
+
+    broker.publish('clock_out', payload)
+    return payload